@@ -0,0 +1,330 @@
+################################
+# bench.py
+# ------------------------------
+# Benchmark suite for Money Timer's hot paths: MoneyTimer.update,
+# ClockFace drawing, history load/save and HistoryWindow construction.
+# Runs against a real Tk (e.g. under xvfb-run) when a display is
+# available, otherwise against headless.FakeRoot.
+#
+# Each case is timed in a few rounds, each right after a short run of a
+# calibration loop, and compared against the baseline as the median over
+# the rounds of its time in calibration units. A baseline stored on one
+# machine thus holds on a faster or slower one, and on a machine whose
+# speed drifts during the run.
+#
+# Usage:
+#   python bench.py                  run and compare against the baseline
+#   python bench.py --save-baseline  run and store results as the baseline
+#   python bench.py --sizes 10,1000  limit synthetic history sizes
+################################
+
+# imports
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from datetime import date
+from time import perf_counter
+
+from headless import make_root
+
+
+# files
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# defaults
+DEFAULT_SIZES = [10, 1000, 100000, 1000000]
+MIN_TIME = 0.5  # s spent per case, at least
+ROUNDS = 5      # calibrated rounds per case, each of at least one call
+CAL_REPS = 9    # calibration loop runs before each round
+MAX_REPS = 20000
+TOLERANCE = 0.25 # fraction slower/larger than baseline before failing
+SPREAD_FACTOR = 3 # the time tolerance widens to this many times a case's spread
+
+
+########
+# make_history: builds a synthetic newest-first history in HISTORY_FORMAT
+#   Params:
+#     n    : Number of days.
+#     seed : Random seed, fixed so runs are reproducible.
+#   Returns: List of history entries.
+def make_history(n, seed = 0):
+  from money_timer import MoneyTimer
+  rng = random.Random(seed)
+  newest = max(date(2026, 1, 1).toordinal(), n + 1)
+  rate = MoneyTimer.DEFAULT_SETTINGS["hourlyRate"]
+  history = []
+  for i in range(n):
+    d = date.fromordinal(newest - i)
+    wday = MoneyTimer.DAYS[d.weekday()]
+    goal = MoneyTimer.DEFAULT_SETTINGS[wday]
+    if goal > 0 or rng.random() < 0.1:
+      secSoFar = max(0.0, rng.gauss(8 * 3600, 3600)) // 0.5 * 0.5
+    else:
+      secSoFar = 0.0
+    earnings = secSoFar / 3600 * rate * MoneyTimer.PERCENT_EARN
+    pct = secSoFar / (goal * 3600) if goal != 0 else 1.0
+    history.append({"year": d.year,
+                    "mon" : d.month,
+                    "day" : d.day,
+                    "wday": wday,
+                    "secSoFar": secSoFar,
+                    "earnings": (earnings * 100 // 1) / 100,
+                    "percent" : (pct * 10000 // 1) / 100})
+  return history
+
+########
+# time_calls: times calls of op
+#   Params:
+#     op      : Zero-argument callable.
+#     minReps : Fewest calls.
+#     minTime : Fewest seconds, unless maxReps calls come first.
+#     maxReps : Most calls.
+#   Returns: Sorted list of seconds per call.
+def time_calls(op, minReps, minTime = 0.0, maxReps = MAX_REPS):
+  samples = []
+  total = 0.0
+  while len(samples) < maxReps and (len(samples) < minReps or total < minTime):
+    start = perf_counter()
+    op()
+    elapsed = perf_counter() - start
+    samples.append(elapsed)
+    total += elapsed
+  samples.sort()
+  return samples
+
+########
+# measure: times repeated calls of op in ROUNDS calibrated rounds, and its
+# peak traced memory
+#   Params:
+#     op      : Zero-argument callable.
+#     minTime : Minimum total seconds to spend timing op.
+#   Returns: Dict of ops, p50 and p99 (seconds), peak (bytes), rel (median
+#            over the rounds of op's median time over the calibration loop's)
+#            and spread (median absolute deviation of those ratios, over rel).
+def measure(op, minTime = MIN_TIME):
+  samples = []
+  rels = []
+  for i in range(ROUNDS):
+    unit = time_calls(calibrate, CAL_REPS)[CAL_REPS // 2]
+    roundSamples = time_calls(op, 1, minTime / ROUNDS, MAX_REPS // ROUNDS)
+    rels.append(roundSamples[len(roundSamples) // 2] / unit)
+    samples.extend(roundSamples)
+  total = sum(samples)
+  rels.sort()
+  rel = rels[ROUNDS // 2]
+  deviations = sorted(abs(r - rel) for r in rels)
+
+  tracemalloc.start()
+  base = tracemalloc.get_traced_memory()[0]
+  op()
+  peak = tracemalloc.get_traced_memory()[1] - base
+  tracemalloc.stop()
+
+  samples.sort()
+  return {"ops" : len(samples) / total,
+          "p50" : samples[len(samples) // 2],
+          "p99" : samples[min(len(samples) - 1, len(samples) * 99 // 100)],
+          "peak": peak,
+          "rel" : rel,
+          "spread": deviations[ROUNDS // 2] / rel}
+
+########
+# calibrate: a fixed mix of the interpreter work the cases do (calls, dict
+# lookups, float math, string formatting), timed to scale the cases by how
+# fast this machine is at the time
+def calibrate():
+  counts = {}
+  total = 0.0
+  for i in range(2000):
+    key = "k%d" % (i & 63)
+    counts[key] = counts.get(key, 0) + 1
+    total += divmod(i * 0.75, 7.0)[1]
+  return total
+
+########
+# run: builds the app objects and measures every case
+#   Params:
+#     sizes : Synthetic history sizes for the history cases.
+#     fake  : Passed to headless.make_root.
+#   Returns: (mode, dict of case name -> measure results)
+def run(sizes, fake = None):
+  root, isFake = make_root(fake)
+  from money_timer import MoneyTimer
+  from clockface import ClockFace
+
+  tmpDir = tempfile.mkdtemp(prefix = "money_timer_bench_")
+  MoneyTimer.SETTINGS_FILE = os.path.join(tmpDir, "settings.json")
+  MoneyTimer.HISTORY_FILE  = os.path.join(tmpDir, "history.json")
+  MoneyTimer.HISTORY_DB = os.path.join(tmpDir, "history.db")
+  MoneyTimer.HISTORY_BLOCKS = os.path.join(tmpDir, "history.mthb")
+  MoneyTimer.INTERVALS_FILE = os.path.join(tmpDir, "intervals.bin")
+  MoneyTimer.STATS_FILE = os.path.join(tmpDir, "stats.json")
+  MoneyTimer.COLUMNS_DIR = os.path.join(tmpDir, "columns")
+  MoneyTimer.SYNC_FILE = os.path.join(tmpDir, "sync.json")
+  results = {}
+
+  def report(name, res):
+    results[name] = res
+    print("{:<28}{:>14.1f}{:>12.3f}{:>12.3f}{:>12.1f}".format(name,
+                                                              res["ops"],
+                                                              res["p50"] * 1000,
+                                                              res["p99"] * 1000,
+                                                              res["peak"] / 1024))
+    sys.stdout.flush()
+
+  print("mode: {}".format("fake canvas" if isFake else "Tk display"))
+  print("{:<28}{:>14}{:>12}{:>12}{:>12}".format("case", "ops/sec", "p50 ms", "p99 ms", "peak KiB"))
+
+  # main timer
+  timer = MoneyTimer(root)
+  timer.setupWindow.inputVar.set("") # blank start time validates as 'now'
+  timer.setupWindow.destroy()
+  def update():
+    timer.update()
+    timer.scheduler.after_cancel(timer.nextUpdate)
+  report("update", measure(update))
+
+  # clock face
+  face = ClockFace(root, size = 100, smooth = True)
+  report("clock_tick", measure(face._tick))
+  report("clock_init_face", measure(face._init_face))
+  sizes_ = [100, 150]
+  def resize():
+    face._configVars["size"] = sizes_[0]
+    sizes_.reverse()
+    face._resize()
+  report("clock_resize", measure(resize))
+  minuteFace = ClockFace(root, size = 100, minute_ticks = True)
+  def resize_minutes():
+    minuteFace._configVars["size"] = sizes_[0]
+    sizes_.reverse()
+    minuteFace._resize()
+  report("clock_resize_minutes", measure(resize_minutes))
+
+  from imagecache import ImageCache
+  artFace = ClockFace(root, size = 100, bg = ImageCache.for_widget(root).get("art.gif"))
+  def resize_art():
+    artFace._configVars["size"] = sizes_[0]
+    sizes_.reverse()
+    artFace._resize()
+  report("clock_resize_bg", measure(resize_art))
+
+  # history
+  from history import HistoryTable
+  for n in sizes:
+    history = make_history(n)
+    with open(MoneyTimer.HISTORY_FILE, "w") as f:
+      json.dump(history, f)
+    report("load_history[{}]".format(n), measure(timer.load_history))
+
+    timer.history = HistoryTable.from_records(history)
+    def save_history():
+      timer.save_history()
+      del timer.history[timer.history.find(timer.startDate)] # keep the size fixed across repetitions
+    report("save_history[{}]".format(n), measure(save_history))
+
+    def open_history():
+      MoneyTimer.HistoryWindow(timer).destroy()
+    report("history_window[{}]".format(n), measure(open_history))
+
+    timer.note_history_change() # history was swapped out wholesale above
+    def reopen_history():
+      timer.note_history_change(timer.startDate, timer.startDate)
+      timer.on_history_click()
+      timer.historyWindow.hide()
+    reopen_history() # the first reopen re-renders everything; time the steady state
+    report("history_reopen[{}]".format(n), measure(reopen_history))
+
+    def update_live_row():
+      timer.update() # patches the open window's live row
+      timer.scheduler.after_cancel(timer.nextUpdate)
+    timer.on_history_click()
+    report("update_history_open[{}]".format(n), measure(update_live_row))
+    timer.historyWindow.hide()
+
+  root.destroy()
+  return "fake" if isFake else "tk", results
+
+########
+# compare: checks results against the stored baseline for the same mode. A
+# case's time counts in calibration units (rel, see measure), and may exceed
+# the baseline's by the tolerance or by SPREAD_FACTOR times the larger of
+# the two runs' spreads, whichever is more, so cases that are noisy on this
+# machine don't fail an unchanged tree
+#   Params:
+#     mode      : "fake" or "tk".
+#     results   : Output of run.
+#     tolerance : Allowed fractional regression.
+#   Returns: List of failure descriptions, empty if none.
+def compare(mode, results, tolerance = TOLERANCE):
+  try:
+    with open(BASELINE_FILE, "r") as f:
+      baseline = json.load(f).get(mode, {})
+  except (OSError, ValueError):
+    return ["no baseline stored in {}".format(BASELINE_FILE)]
+
+  failures = []
+  for name, res in results.items():
+    if name not in baseline:
+      continue
+    base = baseline[name]
+    if "rel" not in base:
+      return ["baseline in {} predates calibrated rounds; store it again with --save-baseline".format(BASELINE_FILE)]
+    allowed = max(tolerance, SPREAD_FACTOR * max(res["spread"], base["spread"]))
+    if res["rel"] > base["rel"] * (1 + allowed):
+      failures.append("{}: {:.4g}x calibration, baseline {:.4g}x (+{:.0f}% allowed)".format(name, res["rel"],
+                                                                                   base["rel"],
+                                                                                   allowed * 100))
+    if res["peak"] > base["peak"] * (1 + tolerance) + 4096:
+      failures.append("{}: peak {:.1f} KiB, baseline {:.1f} KiB".format(name,
+                                                                      res["peak"] / 1024,
+                                                                      base["peak"] / 1024))
+  return failures
+
+########
+# save_baseline: merges results into the stored baseline for a mode
+def save_baseline(mode, results):
+  try:
+    with open(BASELINE_FILE, "r") as f:
+      baseline = json.load(f)
+  except (OSError, ValueError):
+    baseline = {}
+  baseline.setdefault(mode, {}).update(results)
+  with open(BASELINE_FILE, "w") as f:
+    json.dump(baseline, f, indent = 1, sort_keys = True)
+
+########
+# main: parses arguments, runs, and compares or stores the baseline
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Money Timer benchmarks")
+  parser.add_argument("--sizes", default = ",".join(str(n) for n in DEFAULT_SIZES),
+                      help = "comma separated synthetic history sizes in days")
+  parser.add_argument("--fake", action = "store_true",
+                      help = "use the fake canvas even if a display is available")
+  parser.add_argument("--save-baseline", action = "store_true",
+                      help = "store this run as the baseline instead of comparing")
+  parser.add_argument("--tolerance", type = float, default = TOLERANCE,
+                      help = "allowed fractional regression against the baseline")
+  args = parser.parse_args(argv)
+
+  # assets are loaded relative to the working directory
+  os.chdir(os.path.dirname(os.path.abspath(__file__)))
+  sizes = [int(s) for s in args.sizes.split(",") if s]
+  mode, results = run(sizes, True if args.fake else None)
+
+  if args.save_baseline:
+    save_baseline(mode, results)
+    print("baseline saved to {}".format(BASELINE_FILE))
+    return 0
+
+  failures = compare(mode, results, args.tolerance)
+  for failure in failures:
+    print("REGRESSION " + failure)
+  return 1 if failures else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
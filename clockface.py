@@ -8,8 +8,26 @@
 
 # imports
 from tkinter import *
-from time import localtime
 from math import *
+from timesource import SystemClock, TkScheduler
+from imagecache import ImageCache
+
+
+########
+# Precomputes where evenly spaced marks meet the edge of a square face of
+# half-size 1, clockwise from 12; shared by every face and size.
+#   Params:
+#     n : Number of marks.
+#   Returns: List of (x, y, nx, ny): the point on the edge and the unit normal
+#            of a mark pointing at it from the center.
+def _square_marks(n):
+  ret = []
+  for i in range(n):
+    theta = 2 * pi * i / n
+    dx, dy = sin(theta), -cos(theta)
+    k = 1 / max(abs(dx), abs(dy))
+    ret.append((dx * k, dy * k, -dy, dx))
+  return ret
 
 
 ################
@@ -17,6 +35,7 @@ from math import *
 # Has some support for basic Tkinter methods, but not all.
 #   Configurable Parameters:
 #     background  : Either a color or a Tkinter-compatible PhotoImage or BitmapImage.
+#                   PhotoImages loaded from a file are scaled to cover the face.
 #     handcolor   : Color of clock hands.
 #     markcolor   : Color of hour marks/numbers.
 #     marks       : Type of hour marks to use.
@@ -28,6 +47,7 @@ from math import *
 #     smooth      : Flag indicating whether hands should update on <1s intervals.
 #     wedge_size  : Percentage of radius wedges should occupy. TODO: Implement this.
 #     update_rate : When smooth enabled, the amount of updates per second.
+#     minute_ticks: Flag adding a tick for every minute, with hour marks emphasized.
 class ClockFace:
 
   # tick mark types
@@ -48,7 +68,8 @@ class ClockFace:
                     "size"       : 300,
                     "smooth"     : False,
                     "wedge_size" : 0.5,
-                    "update_rate" : 10}
+                    "update_rate" : 10,
+                    "minute_ticks": False}
 
   # default colors for non-configurable parameters
   BG_COLOR_WITH_IMAGE = "#000000"
@@ -59,6 +80,12 @@ class ClockFace:
   _STEP_12 = 2 * pi / 12
   _STEP_60 = 2 * pi / 60
   _TICK_SIZE = 0.8
+  _MARKS_60 = _square_marks(60)
+  # tick mark styles: (positions in minutes, inner end as a fraction of the
+  # distance to the edge, width as a fraction of size)
+  _QUARTER_MARKS = ((0, 15, 30, 45), _TICK_SIZE, 0.02)
+  _HOUR_MARKS    = (tuple(i for i in range(5, 60, 5) if i % 15 != 0), _TICK_SIZE, 0.01)
+  _MINUTE_MARKS  = (tuple(i for i in range(60) if i % 5 != 0), 0.9, 0.005)
 
   _FONTS = {ARABIC: "Helvetica",
             ROMAN:  "Times New Roman"}
@@ -67,8 +94,10 @@ class ClockFace:
   # Initializes canvas, sets config if given as parameters.
   # See class description for configurable parameters.
   #   Params:
-  #     master : Reference to parent Tkinter object.
-  def __init__(self, master = None, **kwargs):
+  #     master    : Reference to parent Tkinter object.
+  #     clock     : Object providing localtime(); defaults to the system clock.
+  #     scheduler : Object providing after(); defaults to the canvas' event loop.
+  def __init__(self, master = None, clock = None, scheduler = None, **kwargs):
 
     self._configVars = {} # copy over default config
     for k, v in ClockFace.DEFAULT_CONFIG.items():
@@ -81,9 +110,12 @@ class ClockFace:
                           width = self._configVars["size"],
                           height = self._configVars["size"])
 
+    self._clock = clock if clock != None else SystemClock()
+    self._scheduler = scheduler if scheduler != None else TkScheduler(self._canvas)
     self._mid = self._configVars["size"] / 2 + ClockFace._OFFSET
     self._bgImg = None
     self._bgImgId = None
+    self._bgFile = None
     self._ms = 0
 
     self.config(**kwargs) # now config based on passed variables
@@ -118,13 +150,15 @@ class ClockFace:
             self._canvas.delete(self._bgImgId)
             self._bgImg = None
             self._bgImgId = None
+            self._bgFile = None
           self._canvas.config(bg = val)
           self._configVars["background"] = val
         elif isinstance(val, PhotoImage): # image bg
           self._canvas.config(bg = ClockFace.BG_COLOR_WITH_IMAGE) # border in case img not big enough
           if self._bgImgId != None:
             self._canvas.delete(self._bgImgId)
-          self._bgImg = val
+          self._bgFile = val.cget("file") or None
+          self._bgImg = self._scaled_background(val)
           self._bgImgId = self._canvas.create_image(self._mid,
                                                     self._mid,
                                                     image = self._bgImg)
@@ -195,6 +229,14 @@ class ClockFace:
         else:
           raise TypeError("Option 'wedge_size' must be of type 'int' or 'float'.")
 
+      # a tick per minute
+      elif key == "minute_ticks":
+        if isinstance(val, bool):
+          self._configVars["minute_ticks"] = val
+          redraw = True
+        else:
+          raise TypeError("Option 'minute_ticks' must be of type 'bool'.")
+
       # update rate for smooth movement
       elif key == "update_rate":
         if isinstance(val, float) or isinstance(val, int):
@@ -243,80 +285,40 @@ class ClockFace:
   # TODO: implement wedges.
   def _init_face(self):
     self._canvas.delete("all")
+    self._mid = self._configVars["size"] / 2 + ClockFace._OFFSET
     self._bgImgId = self._canvas.create_image(self._mid,
                                               self._mid,
                                               image = self._bgImg)
-    self._mid = self._configVars["size"] / 2 + ClockFace._OFFSET
 
     self._hrLen = self._configVars["size"] * 0.2
     self._minLen = self._configVars["size"] * 0.3
     self._secLen = self._configVars["size"] * 0.4
-    self._time = localtime()
-
-    tickSize = self._configVars["size"] / sqrt(2) # has to be big enough to cover the diagonal
-    sideStep = self._configVars["size"] / 2 * tan(pi / 6)
-    for i in range(12):
-      if i < 3:
-        dy = -self._configVars["size"] / 2
-        dx = (i % 3 - 1) * sideStep
-      elif i >= 3 and i < 6:
-        dx = self._configVars["size"] / 2
-        dy = (i % 3 - 1) * sideStep
-      elif i >= 6 and i < 9:
-        dy = self._configVars["size"] / 2
-        dx = -(i % 3 - 1) * sideStep
-      elif i >= 9:
-        dx = -self._configVars["size"] / 2
-        dy = -(i % 3 - 1) * sideStep
-
-      hr = (i - 1) % 12
-      hr += 12 if (hr <= 0) else 0
-
-      if self._configVars["marks"] == ClockFace.TICKS:
-        start = (self._mid + 0.8 * dx, self._mid + 0.8 * dy)
-        end   = (self._mid + dx, self._mid + dy)
-        if i % 3 != 1:
-          newTick = self._canvas.create_line(start[0],
-                                     start[1],
-                                     end[0],
-                                     end[1],
-                                     width = self._configVars["size"] * 0.01,
-                                     fill = self._configVars["markcolor"],
-                                     # capstyle = ROUND,
-                                     tags = "fg",
-                                     smooth = True)
-        else:
-          newTick = self._canvas.create_line(start[0],
-                                     start[1],
-                                     end[0],
-                                     end[1],
-                                     width = self._configVars["size"] * 0.02,
-                                     fill = self._configVars["markcolor"],
-                                     # capstyle = ROUND,
-                                     tags = "fg",
-                                     smooth = True)
-
-      elif self._configVars["marks"] in (ClockFace.ARABIC, ClockFace.ROMAN):
-        center = (self._mid + 0.9 * dx, self._mid + 0.9 * dy)
-        showText = self._roman_num(hr) if self._configVars["marks"] == ClockFace.ROMAN else int(hr)
-        showFont = (ClockFace._FONTS[self._configVars["marks"]], -self._configVars["size"] // 10)
-        if hr != 8:
-          newTick = self._canvas.create_text(center[0],
-                                             center[1],
-                                             text = showText,
-                                             font = showFont,
-                                             fill = self._configVars["markcolor"])
-        else:
-          newTick = self._canvas.create_text(center[0] + self._configVars["size"] / 20,
-                                             center[1],
-                                             text = showText,
-                                             font = showFont,
-                                             fill = self._configVars["markcolor"])
-
-      else:
-        raise ValueError("Unexpected value '{}' for 'marks' parameter.".format(self._configVars["marks"]))
-
-
+    self._time = self._clock.localtime()
+
+    size = self._configVars["size"]
+    marks = self._configVars["marks"]
+    color = self._configVars["markcolor"]
+    if marks == ClockFace.TICKS:
+      styles = [ClockFace._QUARTER_MARKS, ClockFace._HOUR_MARKS]
+    elif marks in (ClockFace.ARABIC, ClockFace.ROMAN):
+      styles = []
+      font = (ClockFace._FONTS[marks], -size // 10)
+      for hr in range(1, 13):
+        x, y, nx, ny = ClockFace._MARKS_60[5 * hr % 60]
+        cx = self._mid + 0.45 * size * x + (size / 20 if hr == 8 else 0)
+        self._canvas.create_text(cx, self._mid + 0.45 * size * y,
+                                 text = self._roman_num(hr) if marks == ClockFace.ROMAN else hr,
+                                 font = font,
+                                 fill = color)
+    else:
+      raise ValueError("Unexpected value '{}' for 'marks' parameter.".format(marks))
+    if self._configVars["minute_ticks"]:
+      styles.append(ClockFace._MINUTE_MARKS)
+    for positions, inner, width in styles: # one item per style, however many marks
+      self._canvas.create_polygon(self._marks_polygon(positions, inner, max(1.0, size * width)),
+                                  fill = color,
+                                  outline = "",
+                                  tags = "fg")
 
     hrAng, minAng, secAng = self._get_hand_angles()
     coords = self._get_line_coords(self._mid,self._mid, self._hrLen, hrAng)
@@ -351,6 +353,30 @@ class ClockFace:
                                      smooth = True)
 
 
+  ########
+  # Helper function to get the outline of a set of tick marks as one polygon.
+  # A canvas line is a single connected polyline, so each mark is a quad
+  # instead, and consecutive quads are joined by a path that is walked there
+  # and back again, which encloses no area and so is never filled.
+  #   Params:
+  #     positions : Positions of the marks, in minutes clockwise from 12.
+  #     inner     : Inner end of the marks, as a fraction of the distance to the edge.
+  #     width     : Width of the marks in pixels.
+  #   Returns: Flat list of polygon coordinates.
+  def _marks_polygon(self, positions, inner, width):
+    half, mid, w = self._configVars["size"] / 2, self._mid, width / 2
+    coords = []
+    for i in positions:
+      x, y, nx, ny = ClockFace._MARKS_60[i]
+      ix, iy = mid + half * inner * x, mid + half * inner * y
+      ox, oy = mid + half * x, mid + half * y
+      coords += (ix + w * nx, iy + w * ny, ox + w * nx, oy + w * ny,
+                 ox - w * nx, oy - w * ny, ix - w * nx, iy - w * ny,
+                 ix + w * nx, iy + w * ny)
+    for k in range(len(positions) - 2, -1, -1): # back along the joins
+      coords += coords[10 * k:10 * k + 2]
+    return coords
+
   ########
   # Helper function to get angles of hands based on current time.
   #   Returns: Hour, minute, and second hand angles, in that order.
@@ -421,22 +447,32 @@ class ClockFace:
   ########
   # Resizes the clockface based on current configuration and redraws face.
   def _resize(self):
-    self._canvas.delete("all")
     self._canvas.config(width = self._configVars["size"],
                         height = self._configVars["size"])
-    self._mid = self._configVars["size"] / 2
-
-    self._bgImgId = self._canvas.create_image(self._mid,
-                                              self._mid,
-                                              image = self._bgImg)
+    self._bgImg = self._scaled_background(self._bgImg)
     self._init_face()
 
+  ########
+  # Gets the background image scaled to the current size. Only images decoded
+  # from a file can be scaled; the decoded and scaled versions are shared
+  # through the root window's ImageCache.
+  #   Params:
+  #     img : Image to fall back to if it can't be scaled.
+  #   Returns: Image to draw as the background.
+  def _scaled_background(self, img):
+    if self._bgFile == None:
+      return img
+    try:
+      return ImageCache.for_widget(self._canvas).get(self._bgFile, self._configVars["size"])
+    except (OSError, TclError): # file went away; keep what we have
+      return img
+
   ########
   # Updates hands and wedges based on current time. TODO: implement wedges.
   # Runs once per second if 'smooth' disabled.
   # Otherwise runs 'update_rate' times per second.
   def _tick(self):
-    newTime = localtime()
+    newTime = self._clock.localtime()
     if newTime.tm_sec != self._time.tm_sec:
       self._ms = 0
     else:
@@ -450,7 +486,7 @@ class ClockFace:
     coords = self._get_line_coords(self._mid, self._mid, self._secLen, secAng)
     self._canvas.coords(self._secHand, coords[0], coords[1], coords[2], coords[3])
 
-    self._canvas.after(1000 // self._configVars["update_rate"], self._tick)
+    self._scheduler.after(1000 // self._configVars["update_rate"], self._tick)
 
   ########
   # Determines if given string is a valid Tkinter hex string.
@@ -551,9 +587,9 @@ class ClockFace:
 if __name__ == "__main__":
   root = Tk()
   root.title("ClockFace [Test Suite]")
-  cf = ClockFace(root, smooth = True, update_rate = 10)
-  photo = PhotoImage(file = "art.gif")
-  photo2 = PhotoImage(file = "art2.gif")
+  cf = ClockFace(root, smooth = True, update_rate = 10, minute_ticks = True)
+  photo = ImageCache.for_widget(root).get("art.gif")
+  photo2 = ImageCache.for_widget(root).get("art2.gif")
   cf2 = ClockFace(root, bg = photo2, size = 400, handcolor = "#000000", marks = ClockFace.ARABIC)
   root.after(5000, lambda: cf.config(size = cf.cget("size") + 50, bg = photo, handcolor = "#00FF00", marks = ClockFace.ROMAN, markcolor = "#FFFFFF"))
   cf.grid(row = 0, column = 0)
@@ -0,0 +1,207 @@
+################################
+# export.py
+# ------------------------------
+# Exports history to CSV or JSON lines, optionally limited to a date range
+# and to some weekdays. Reads any history backend, told apart by the file's
+# contents: records are streamed from a JSON history file (and its journal)
+# or a SQLite database straight to the output, so memory stays flat however
+# large the history is; a compressed block file is decoded only from the
+# --since year on, but those years are held in memory. The npy format
+# instead writes a directory of column files (see npycolumns), which needs
+# the days in date order and so holds their values in memory, about 32
+# bytes per day. Needs neither Tk nor a display, e.g. for cron jobs.
+#
+# Usage:
+#   python export.py money_timer_history.json --format csv --since 2024-01-01 --wday Mon,Fri
+#   python export.py money_timer_history.db --format npy --output columns/
+#   python export.py --format jsonl     the history the settings file's historyBackend names
+################################
+
+# imports
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date
+
+import history
+from npycolumns import NpyColumns
+
+FORMATS = ("csv", "jsonl", "npy")
+CSV_COLUMNS = ("date", "wday", "duration", "secSoFar", "earnings", "percent")
+# as MoneyTimer's files, which aren't imported here to keep Tk out
+SETTINGS_FILE = "money_timer_settings.json"
+BACKEND_FILES = {"json"  : "money_timer_history.json",
+                 "sqlite": "money_timer_history.db",
+                 "gzip"  : "money_timer_history.mthb",
+                 "lzma"  : "money_timer_history.mthb"}
+SQLITE_MAGIC = b"SQLite format 3\0"
+
+
+########
+# Parses a YYYY-MM-DD date into a (year, mon, day) tuple.
+def parse_date(s):
+  d = date.fromisoformat(s)
+  return (d.year, d.month, d.day)
+
+########
+# Gets the history file the settings file's historyBackend names, for when
+# none is given.
+def default_history():
+  try:
+    with open(SETTINGS_FILE, "r") as f:
+      backend = json.load(f).get("historyBackend", "json")
+  except (OSError, ValueError, AttributeError):
+    backend = "json"
+  return BACKEND_FILES.get(backend, BACKEND_FILES["json"])
+
+########
+# Tells a history file's backend from its first bytes.
+#   Returns: "sqlite", "blocks" or "json"; a missing file is "json", whose
+#            journal may still hold days.
+def detect_backend(path):
+  from historyblocks import MAGIC
+  try:
+    with open(path, "rb") as f:
+      head = f.read(len(SQLITE_MAGIC))
+  except OSError:
+    return "json"
+  if head.startswith(SQLITE_MAGIC):
+    return "sqlite"
+  if head.startswith(MAGIC):
+    return "blocks"
+  return "json"
+
+########
+# Reads the records of a history in any backend, newest first, limited to
+# a date range where the backend can skip the rest cheaply.
+#   Params:
+#     path         : History file.
+#     since, until : Optional inclusive (year, mon, day) bounds.
+#     onBad        : Optional function(entry, reason) for records that can't
+#                    be read; JSON history only.
+#   Returns: Generator of HistoryRecords.
+def read_records(path, since = None, until = None, onBad = None):
+  backend = detect_backend(path)
+  if backend == "sqlite":
+    from historydb import SqliteHistoryStore
+    store = SqliteHistoryStore(path)
+    try:
+      yield from store.days(since, until, newestFirst = True)
+    finally:
+      store.close()
+  elif backend == "blocks":
+    from historyblocks import BlockHistoryStore
+    yield from BlockHistoryStore(path).recent(since)
+  else:
+    yield from history.stream_history(path, onBad)
+
+########
+# Filters records by date range and weekday.
+#   Params:
+#     records : Iterable of HistoryRecords.
+#     since   : Optional first (year, mon, day) to include.
+#     until   : Optional last (year, mon, day) to include.
+#     wdays   : Optional collection of wday names to include.
+#   Returns: Generator of HistoryRecords.
+def filter_records(records, since = None, until = None, wdays = None):
+  for rec in records:
+    day = (rec.year, rec.mon, rec.day)
+    if (since == None or day >= since) and (until == None or day <= until) and \
+       (wdays == None or rec.wday in wdays):
+      yield rec
+
+########
+# Writes records as CSV, with duration and earnings formatted as in the
+# history view.
+#   Params:
+#     records : Iterable of HistoryRecords.
+#     out     : Text file to write.
+#   Returns: Number of records written.
+def write_csv(records, out):
+  writer = csv.writer(out, lineterminator = "\n")
+  writer.writerow(CSV_COLUMNS)
+  count = 0
+  for rec in records:
+    writer.writerow(("{}-{:02d}-{:02d}".format(rec.year, rec.mon, rec.day),
+                     rec.wday,
+                     history.format_duration(rec.secSoFar),
+                     rec.secSoFar,
+                     history.format_earnings(rec.earnings),
+                     rec.percent))
+    count += 1
+  return count
+
+########
+# Writes records as JSON lines, one history record object per line.
+#   Params:
+#     records : Iterable of HistoryRecords.
+#     out     : Text file to write.
+#   Returns: Number of records written.
+def write_jsonl(records, out):
+  count = 0
+  for rec in records:
+    out.write(history.record_json(rec))
+    out.write("\n")
+    count += 1
+  return count
+
+########
+# Writes the daily records as .npy column files; summaries are left out.
+#   Params:
+#     records   : Iterable of HistoryRecords.
+#     directory : Directory for the column files.
+#   Returns: Number of days written.
+def write_npy(records, directory):
+  columns = NpyColumns(directory)
+  columns.export(records)
+  return columns.rows
+
+########
+# main: command line entry point
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Export Money Timer history as CSV, JSON lines or .npy columns")
+  parser.add_argument("history", nargs = "?", default = None,
+                      help = "history file: JSON, SQLite or compressed blocks (default: "
+                             "the one the settings' historyBackend names)")
+  parser.add_argument("--format", choices = FORMATS, default = "csv")
+  parser.add_argument("--output", default = "-", help = "file to write, - for stdout; a directory for npy")
+  parser.add_argument("--since", type = parse_date, help = "first day, YYYY-MM-DD")
+  parser.add_argument("--until", type = parse_date, help = "last day, YYYY-MM-DD")
+  parser.add_argument("--wday", help = "comma separated weekdays, e.g. Mon,Tues")
+  args = parser.parse_args(argv)
+  if args.format == "npy" and args.output == "-":
+    parser.error("--format npy needs an --output directory")
+  if args.history == None:
+    args.history = default_history()
+
+  wdays = None
+  if args.wday:
+    wdays = set(args.wday.split(","))
+    unknown = wdays - set(history.DAYS)
+    if unknown:
+      parser.error("unknown weekday(s): {}; use {}".format(", ".join(sorted(unknown)),
+                                                          ",".join(history.DAYS)))
+
+  bad = [0]
+  def on_bad(entry, reason):
+    bad[0] += 1
+  records = filter_records(read_records(args.history, args.since, args.until, on_bad),
+                           args.since, args.until, wdays)
+  write = write_csv if args.format == "csv" else write_jsonl
+  if args.format == "npy":
+    count = write_npy(records, args.output)
+  elif args.output == "-":
+    count = write(records, sys.stdout)
+  else:
+    with open(args.output, "w", newline = "") as out:
+      count = write(records, out)
+  if bad[0]:
+    sys.stderr.write("skipped {} unreadable records\n".format(bad[0]))
+  if args.output != "-":
+    sys.stderr.write("exported {} records to {}\n".format(count, args.output))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
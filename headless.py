@@ -0,0 +1,305 @@
+################################
+# headless.py
+# ------------------------------
+# A stand-in Tcl interpreter so MoneyTimer and ClockFace can be built and
+# driven without a display (benchmarks, simulations, soak runs).
+# Widgets are the real tkinter classes; only the interpreter underneath
+# is fake. Canvas items, widget options, variables and after handles are
+# tracked so callers can inspect them.
+################################
+
+# imports
+import struct
+import tkinter
+from tkinter import TclError
+
+
+################
+# FakeTcl: minimal replacement for the _tkinter app object.
+#   Members:
+#     commands : registered Python callbacks by Tcl command name
+#     options  : widget/image options by path or image name
+#     items    : canvas items by canvas path, each a dict of id -> [type, coords]
+#     afters   : pending after handles, id -> (delay ms, command name)
+#     idles    : pending after idle handles, id -> command name
+#   Methods:
+#     call          : dispatches a Tcl command
+#     run_after     : runs a pending after/idle handle's callback
+#     canvas_items  : returns number of items on a canvas
+class FakeTcl:
+
+  # Tcl commands that create a widget
+  WIDGET_COMMANDS = ("button", "canvas", "checkbutton", "entry", "frame",
+                     "label", "labelframe", "listbox", "menu", "radiobutton",
+                     "scale", "scrollbar", "spinbox", "text", "toplevel")
+
+  ########
+  # Sets up empty interpreter state.
+  def __init__(self):
+    self.commands = {}
+    self.options = {}
+    self.items = {}
+    self.afters = {}
+    self.idles = {}
+    self._vars = {}
+    self._traces = {}
+    self._nextItem = 0
+    self._nextAfter = 0
+
+  ################
+  # _tkinter app interface
+  ################
+
+  def call(self, *args):
+    if len(args) == 1 and isinstance(args[0], tuple):
+      args = args[0]
+    args = tuple(a if isinstance(a, (str, int, float, tuple)) else str(a) for a in args)
+    if len(args) == 0:
+      return ""
+    cmd = args[0]
+
+    if cmd == "after":
+      return self._after(args[1:])
+    if cmd == "image":
+      return self._image(args[1:])
+    if cmd == "info" and len(args) == 3 and args[1] == "exists":
+      return 1 if args[2] in self._vars else 0
+    if cmd == "trace":
+      if len(args) == 5 and args[1] == "variable":
+        self._traces.setdefault(args[2], []).append(args[4])
+      return ""
+    if cmd == "destroy":
+      for path in args[1:]:
+        self.options.pop(path, None)
+        self.items.pop(path, None)
+      return ""
+    if cmd in FakeTcl.WIDGET_COMMANDS:
+      self.options[args[1]] = self._pairs(args[2:])
+      if cmd == "canvas":
+        self.items[args[1]] = {}
+      return ""
+    if isinstance(cmd, str) and cmd in self.options:
+      return self._widget(cmd, args[1:])
+    return ""
+
+  def createcommand(self, name, func):
+    self.commands[name] = func
+
+  def deletecommand(self, name):
+    self.commands.pop(name, None)
+
+  def getint(self, v):
+    return int(v)
+
+  def getdouble(self, v):
+    return float(v)
+
+  def getboolean(self, v):
+    if isinstance(v, str):
+      return v.lower() in ("1", "true", "yes", "on")
+    return bool(v)
+
+  def splitlist(self, v):
+    if isinstance(v, tuple):
+      return v
+    if v == "" or v is None:
+      return ()
+    return tuple(str(v).split())
+
+  def split(self, v):
+    return self.splitlist(v)
+
+  def wantobjects(self, *args):
+    return 1
+
+  def globalsetvar(self, name, value):
+    self._vars[name] = value
+    for cbname in self._traces.get(name, ()):
+      if cbname in self.commands:
+        self.commands[cbname](name, "", "w")
+
+  setvar = globalsetvar
+
+  def globalgetvar(self, name):
+    return self._vars.get(name, "")
+
+  getvar = globalgetvar
+
+  def globalunsetvar(self, name):
+    self._vars.pop(name, None)
+    self._traces.pop(name, None)
+
+  unsetvar = globalunsetvar
+
+  def mainloop(self, n = 0):
+    pass
+
+  def dooneevent(self, flags = 0):
+    return 0
+
+  def quit(self):
+    pass
+
+  ################
+  # Inspection helpers
+  ################
+
+  ########
+  # Runs a pending after or after idle callback.
+  #   Params:
+  #     afterId : Handle returned by 'after'.
+  def run_after(self, afterId):
+    if afterId in self.afters:
+      name = self.afters.pop(afterId)[1]
+    elif afterId in self.idles:
+      name = self.idles.pop(afterId)
+    else:
+      raise TclError("event \"{}\" doesn't exist".format(afterId))
+    self.commands[name]()
+
+  ########
+  # Counts items on a canvas.
+  #   Params:
+  #     path : Canvas widget path, i.e. str(canvas).
+  #   Returns: Number of live canvas items.
+  def canvas_items(self, path):
+    return len(self.items.get(path, ()))
+
+  ################
+  # Private dispatch
+  ################
+
+  def _pairs(self, args):
+    ret = {}
+    for i in range(0, len(args) - 1, 2):
+      if isinstance(args[i], str) and args[i].startswith("-"):
+        ret[args[i][1:]] = args[i + 1]
+    return ret
+
+  def _after(self, args):
+    if args[0] == "info":
+      if len(args) == 1:
+        return tuple(self.afters) + tuple(self.idles)
+      if args[1] in self.afters:
+        return (self.afters[args[1]][1], "timer")
+      if args[1] in self.idles:
+        return (self.idles[args[1]], "idle")
+      raise TclError("event \"{}\" doesn't exist".format(args[1]))
+    if args[0] == "cancel":
+      self.afters.pop(args[1], None)
+      self.idles.pop(args[1], None)
+      return ""
+    self._nextAfter += 1
+    afterId = "after#{}".format(self._nextAfter)
+    if args[0] == "idle":
+      self.idles[afterId] = args[1]
+    elif len(args) > 1:
+      self.afters[afterId] = (int(args[0]), args[1])
+    else:
+      return ""
+    return afterId
+
+  def _image(self, args):
+    if args[0] == "create":
+      opts = self._pairs(args[3:])
+      if "file" in opts and "width" not in opts:
+        opts["width"], opts["height"] = self._gif_size(opts["file"])
+      self.options[args[2]] = opts
+      return args[2]
+    if args[0] == "delete":
+      for name in args[1:]:
+        self.options.pop(name, None)
+      return ""
+    if args[0] in ("width", "height"):
+      return self.options.get(args[1], {}).get(args[0], 0)
+    return ""
+
+  def _gif_size(self, path):
+    try:
+      with open(path, "rb") as f:
+        return struct.unpack("<HH", f.read(10)[6:10])
+    except (OSError, struct.error):
+      raise TclError("couldn't open \"{}\"".format(path))
+
+  def _widget(self, path, args):
+    if len(args) == 0:
+      return ""
+    sub = args[0]
+    opts = self.options[path]
+    if sub == "copy": # photo image copy with -zoom/-subsample
+      src = self.options.get(args[1], {})
+      w, h = src.get("width", 0), src.get("height", 0)
+      copyOpts = dict(zip(args[2::3], zip(args[3::3], args[4::3])))
+      if "-zoom" in copyOpts:
+        w, h = w * int(copyOpts["-zoom"][0]), h * int(copyOpts["-zoom"][1])
+      if "-subsample" in copyOpts:
+        x, y = int(copyOpts["-subsample"][0]), int(copyOpts["-subsample"][1])
+        w, h = -(-w // x), -(-h // y)
+      opts["width"], opts["height"] = w, h
+      return ""
+    if sub == "configure":
+      opts.update(self._pairs(args[1:]))
+      return ""
+    if sub == "cget":
+      return opts.get(args[1][1:], "")
+    if path in self.items:
+      items = self.items[path]
+      if sub == "create":
+        self._nextItem += 1
+        coords = [a for a in args[2:] if isinstance(a, (int, float))]
+        items[self._nextItem] = [args[1], coords]
+        return self._nextItem
+      if sub == "coords":
+        item = items.get(int(args[1])) if str(args[1]).isdigit() else None
+        if item is None:
+          return ""
+        if len(args) > 2:
+          item[1] = list(args[2:])
+          return ""
+        return tuple(item[1])
+      if sub == "delete":
+        for tag in args[1:]:
+          if tag == "all":
+            items.clear()
+          elif str(tag).isdigit():
+            items.pop(int(tag), None)
+        return ""
+      if sub == "find" and len(args) > 1 and args[1] == "all":
+        return tuple(items)
+    return ""
+# FakeTcl
+################
+
+
+################
+# FakeRoot: a tkinter.Tk backed by FakeTcl instead of a real interpreter.
+# Becomes the default root so masterless PhotoImages and variables work.
+class FakeRoot(tkinter.Tk):
+
+  ########
+  # Initializes root state without creating a Tcl interpreter.
+  def __init__(self, *args, **kwargs):
+    self.master = None
+    self.children = {}
+    self._tkloaded = True
+    self._tclCommands = None
+    self.tk = FakeTcl()
+    if tkinter._support_default_root and tkinter._default_root is None:
+      tkinter._default_root = self
+# FakeRoot
+################
+
+
+########
+# Creates a real Tk root if a display is available, otherwise a FakeRoot.
+#   Params:
+#     fake : True forces a FakeRoot, False forces a real Tk, None picks.
+#   Returns: (root, isFake)
+def make_root(fake = None):
+  if not fake:
+    try:
+      return tkinter.Tk(), False
+    except TclError:
+      if fake is False:
+        raise
+  return FakeRoot(), True
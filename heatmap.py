@@ -0,0 +1,191 @@
+################################
+# heatmap.py
+# ------------------------------
+# Year-at-a-glance calendar heatmap of history: one strip per year, one
+# column per week and one row per weekday, newest year on top. All cells
+# are pixels of a single PhotoImage, so any number of years is one canvas
+# item. A full draw writes each weekday row of a year as one pixel row
+# tiled down the cell height; newly saved days only repaint their own cells.
+################################
+
+# imports
+from datetime import date, timedelta
+from tkinter import Canvas, PhotoImage
+
+from history import DAYS, WEEK, month_end
+
+# values colored per day
+HOURS   = "hours"
+PERCENT = "percent"
+
+
+################
+# CalendarHeatmap: calendar heatmap of a HistoryTable; derivative of Canvas
+#   Class members:
+#     CELL       : cell pitch in pixels, including the gap below and right of it
+#     YEAR_GAP   : extra pixels between year strips
+#     LEVELS     : number of color steps
+#     FULL_SCALE : value per metric that gets the strongest color
+#   Members:
+#     metric : HOURS or PERCENT
+#     image  : PhotoImage holding the cells
+#     years  : years drawn, newest first
+#   Methods:
+#     draw        : redraws everything from a table
+#     update_days : repaints the days of a date range
+#     day_at      : date of the cell under a canvas point
+#     color_of    : color of a value
+class CalendarHeatmap(Canvas):
+
+  CELL = 9
+  YEAR_GAP = 4
+  LEVELS = 16
+  FULL_SCALE = {HOURS: 10.0, PERCENT: 100.0}
+
+  ########
+  # Creates an empty heatmap.
+  #   Params:
+  #     master     : Parent widget.
+  #     metric     : HOURS or PERCENT.
+  #     emptyColor : Color of days without a record.
+  #     gapColor   : Color between cells, and of the canvas.
+  #     lowColor   : Color of the smallest nonzero value.
+  #     highColor  : Color of FULL_SCALE and up.
+  #     kwargs     : Passed to Canvas.
+  def __init__(self, master, metric = PERCENT, emptyColor = "#EEEEEE", gapColor = "#FFFFFF",
+               lowColor = "#CCEECC", highColor = "#006600", **kwargs):
+    Canvas.__init__(self, master, highlightthickness = 0, background = gapColor, **kwargs)
+    self.metric = metric
+    self.emptyColor = emptyColor
+    self.gapColor = gapColor
+    self.image = None
+    self.years = []
+    self._item = None
+    self._colors = [emptyColor] + [_blend(lowColor, highColor, i / (CalendarHeatmap.LEVELS - 1))
+                                   for i in range(CalendarHeatmap.LEVELS)]
+
+  ########
+  # Gets the color of a value of the heatmap's metric.
+  def color_of(self, value):
+    if value <= 0:
+      return self._colors[0]
+    step = int(value / CalendarHeatmap.FULL_SCALE[self.metric] * (CalendarHeatmap.LEVELS - 1))
+    return self._colors[1 + min(step, CalendarHeatmap.LEVELS - 1)]
+
+  ########
+  # Redraws the whole heatmap.
+  #   Params:
+  #     table : HistoryTable.
+  def draw(self, table):
+    years = sorted(set(table._cols["year"]), reverse = True) if len(table) > 0 else []
+    cell = CalendarHeatmap.CELL
+    width = 54 * cell # a year touches at most 54 Monday-to-Sunday weeks
+    height = max(1, len(years) * (7 * cell + CalendarHeatmap.YEAR_GAP))
+    if self.image == None or self.image.width() != width or self.image.height() != height:
+      self.image = PhotoImage(master = self, width = width, height = height)
+      if self._item != None:
+        self.itemconfig(self._item, image = self.image)
+    else:
+      self.image.blank()
+    if self._item == None:
+      self._item = self.create_image(0, 0, anchor = "nw", image = self.image)
+    self.years = years
+    self.config(scrollregion = (0, 0, width, height), width = width,
+                height = min(height, 3 * (7 * cell + CalendarHeatmap.YEAR_GAP)))
+
+    # pixels of one row of a cell and the gap after it, by cell color
+    cells = {color: (color + " ") * (cell - 1) + self.gapColor + " " for color in self._colors}
+    cells[None] = (self.gapColor + " ") * cell
+    for year in years:
+      # a week summary dated late in December can cover the first days of the year
+      colors = self._day_colors(table, (year - 1, 12, 26), (year, 12, 31))
+      first = date(year, 1, 1).toordinal()
+      offset = date(year, 1, 1).weekday()
+      rows = [[None] * 54 for i in range(7)]
+      for i in range(date(year, 12, 31).toordinal() - first + 1):
+        rows[(i + offset) % 7][(i + offset) // 7] = colors.get(first + i, self.emptyColor)
+      top = self._top(year)
+      for wday, row in enumerate(rows):
+        # one pixel row per row of cells, tiled down the cell height
+        pixels = "".join(cells[color] for color in row)
+        y = top + wday * cell
+        self.image.put("{" + pixels + "}", to = (0, y, width, y + cell - 1))
+
+  ########
+  # Repaints the days of a date range, redrawing everything instead if the
+  # range reaches a year not drawn yet.
+  #   Params:
+  #     table      : HistoryTable.
+  #     start, end : Inclusive (year, mon, day) tuples.
+  def update_days(self, table, start, end):
+    if self.image == None or start == None or end == None or \
+       start[0] not in self.years or end[0] not in self.years:
+      self.draw(table)
+      return
+    colors = self._day_colors(table, start, end)
+    cell = CalendarHeatmap.CELL
+    day, last = date(*start), date(*end)
+    while day <= last:
+      x, y = self._cell_xy(day)
+      self.image.put(colors.get(day.toordinal(), self.emptyColor), to = (x, y, x + cell - 1, y + cell - 1))
+      day += timedelta(days = 1)
+
+  ########
+  # Gets the date of the cell under a canvas point, or None.
+  #   Params:
+  #     x, y : Canvas coordinates.
+  def day_at(self, x, y):
+    cell = CalendarHeatmap.CELL
+    strip = 7 * cell + CalendarHeatmap.YEAR_GAP
+    yearIndex, rest = int(y // strip), y % strip
+    if x < 0 or y < 0 or yearIndex >= len(self.years) or rest >= 7 * cell:
+      return None
+    year = self.years[yearIndex]
+    first = date(year, 1, 1)
+    ordinal = int(x // cell) * 7 + int(rest // cell) - first.weekday()
+    if ordinal < 0 or ordinal > (date(year, 12, 31) - first).days:
+      return None
+    return first + timedelta(days = ordinal)
+
+  ########
+  # Gets colors for the days with records in a date range, spreading
+  # weekly and monthly summaries over the days they cover.
+  #   Returns: Dict of date ordinal -> color.
+  def _day_colors(self, table, start, end):
+    lo, hi = table.span(start, end)
+    ret = {}
+    for year, mon, day, wday, sec, earnings, percent in table.iter_rows(lo, hi):
+      first = date(year, mon, day)
+      if wday in DAYS:
+        days = 1
+      elif wday == WEEK:
+        days = 7
+      else:
+        days = (month_end(first) - first).days + 1
+      if self.metric == HOURS:
+        value = sec / 3600 / days
+      else:
+        value = percent
+      color = self.color_of(value)
+      for i in range(first.toordinal(), first.toordinal() + days):
+        ret[i] = color
+    return ret
+
+  def _top(self, year):
+    return self.years.index(year) * (7 * CalendarHeatmap.CELL + CalendarHeatmap.YEAR_GAP)
+
+  def _cell_xy(self, day):
+    cell = CalendarHeatmap.CELL
+    first = date(day.year, 1, 1)
+    column = ((day - first).days + first.weekday()) // 7
+    return column * cell, self._top(day.year) + day.weekday() * cell
+# CalendarHeatmap
+################
+
+
+########
+# Mixes two "#RRGGBB" colors; t = 0 gives a, t = 1 gives b.
+def _blend(a, b, t):
+  ca = [int(a[i:i + 2], 16) for i in (1, 3, 5)]
+  cb = [int(b[i:i + 2], 16) for i in (1, 3, 5)]
+  return "#" + "".join("{:02X}".format(int(round(x + (y - x) * t))) for x, y in zip(ca, cb))
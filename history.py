@@ -0,0 +1,973 @@
+################################
+# history.py
+# ------------------------------
+# Compact in-memory representation of Money Timer's daily history.
+# Kept free of tkinter so command line tools can use it headless.
+################################
+
+# imports
+import os
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import date
+try:
+  import fcntl
+except ImportError: # no advisory locks on this platform; writers aren't serialized
+  fcntl = None
+
+
+# record schema, shared with MoneyTimer
+DAYS = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun"]
+HISTORY_FORMAT = {"year": int,
+                  "mon" : int,
+                  "day" : int,
+                  "wday": str,
+                  "secSoFar": float,
+                  "earnings": float,
+                  "percent" : float}
+FIELDS = tuple(HISTORY_FORMAT.keys())
+# optional per-day breakdown by rate band, e.g.
+# {"regular": {"secSoFar": 28800.0, "earnings": 109.9}, "overtime": {...}}
+BANDS = "bands"
+# wday values of the weekly and monthly summary records retention makes;
+# their date is the period's first day
+WEEK = "Week"
+MONTH = "Month"
+
+# weekday names are stored as small ints; unknown names are appended
+_WDAY_NAMES = list(DAYS)
+_WDAY_INDEX = {name: i for i, name in enumerate(_WDAY_NAMES)}
+
+
+########
+# Interns a weekday name.
+#   Params:
+#     name : Weekday string as stored in the history file.
+#   Returns: Small int standing for the name.
+def wday_index(name):
+  i = _WDAY_INDEX.get(name)
+  if i == None:
+    i = len(_WDAY_NAMES)
+    _WDAY_NAMES.append(name)
+    _WDAY_INDEX[name] = i
+  return i
+
+########
+# Packs a date into one sortable int, e.g. (2024, 3, 9) -> 20240309.
+def date_key(year, mon, day):
+  return year * 10000 + mon * 100 + day
+
+########
+# Gets the Monday of a date's week.
+def week_start(d):
+  return date.fromordinal(d.toordinal() - d.weekday())
+
+########
+# Gets the last day of a date's month.
+def month_end(d):
+  if d.month == 12:
+    return date(d.year, 12, 31)
+  return date.fromordinal(date(d.year, d.month + 1, 1).toordinal() - 1)
+
+########
+# Clips a percent value to 2 decimals, the precision shown and stored.
+def clip_percent(pct):
+  return (pct * 100 // 1) / 100
+
+########
+# Formats seconds worked as H:MM:SS, as shown in the history view.
+def format_duration(sec):
+  return "{}:{:02d}:{:02d}".format(int(sec // 3600), int(sec % 3600 // 60), int(sec % 60))
+
+########
+# Formats dollars to cents, without the sign.
+def format_earnings(earnings):
+  return "{:.2f}".format(earnings)
+
+########
+# Formats a record as a line of the history view.
+#   Params:
+#     row : (year, mon, day, wday, secSoFar, earnings, percent) tuple.
+#   Returns: Text ending in a newline.
+def format_row(row):
+  year, mon, day, wday, secSoFar, earnings, percent = row
+  return "{}-{:02d}-{:02d} {:<5}\t{}\t${:<7}\t{:.1f}%\n".format(year, mon, day, wday,
+                                                            format_duration(secSoFar),
+                                                            format_earnings(earnings),
+                                                            percent)
+
+
+################
+# HistoryRecord: one day of history. Fields are those of HISTORY_FORMAT plus
+# the optional bands breakdown (None if not recorded), and can be read as
+# attributes or, like the dicts they replace, by key.
+class HistoryRecord:
+
+  __slots__ = FIELDS + (BANDS,)
+
+  def __init__(self, year, mon, day, wday, secSoFar, earnings, percent, bands = None):
+    self.year = year
+    self.mon = mon
+    self.day = day
+    self.wday = wday
+    self.secSoFar = secSoFar
+    self.earnings = earnings
+    self.percent = percent
+    self.bands = bands
+
+  ########
+  # Builds a record from a dict in HISTORY_FORMAT.
+  @staticmethod
+  def from_dict(d):
+    return HistoryRecord(d["year"], d["mon"], d["day"], d["wday"],
+                         d["secSoFar"], d["earnings"], d["percent"], d.get(BANDS))
+
+  ########
+  # Converts to a dict in HISTORY_FORMAT, with bands only if recorded.
+  def to_dict(self):
+    d = {key: getattr(self, key) for key in FIELDS}
+    if self.bands != None:
+      d[BANDS] = self.bands
+    return d
+
+  def get(self, key, default = None):
+    return getattr(self, key, default) if key in HistoryRecord.__slots__ else default
+
+  def __getitem__(self, key):
+    try:
+      return getattr(self, key)
+    except AttributeError:
+      raise KeyError(key)
+
+  def __setitem__(self, key, val):
+    if key not in HistoryRecord.__slots__:
+      raise KeyError(key)
+    setattr(self, key, val)
+
+  def __eq__(self, other):
+    if isinstance(other, HistoryRecord):
+      return all(getattr(self, k) == getattr(other, k) for k in HistoryRecord.__slots__)
+    return NotImplemented
+
+  def __repr__(self):
+    return "HistoryRecord({})".format(", ".join("{}={!r}".format(k, getattr(self, k)) for k in FIELDS))
+# HistoryRecord
+################
+
+
+################
+# HistoryTable: struct-of-arrays container of history records, one typed
+# array per field (about 29 bytes per day instead of a 7-key dict).
+# Behaves as a sequence of HistoryRecords, which are built on access.
+# Days are kept newest first; a bisectable date index is built on the first
+# date lookup and kept up to date by later changes. The few days with a
+# bands breakdown keep it in a dict keyed by date_key.
+#   Methods:
+#     from_records : builds a table from dicts or HistoryRecords
+#     insert       : inserts a record at an index
+#     append       : appends a record
+#     put          : adds a record in date order, replacing that day's record
+#     merge        : adds a record unless that day already has a better one
+#     find         : index of a date, or -1
+#     get          : record for a date, or None
+#     span         : index range covering a date range
+#     between      : new table of the days in a date range
+#     last_days    : new table of the days in the last n calendar days
+#     sort         : restores newest-first order
+#     record       : returns the record at an index
+#     bands_of     : returns the bands breakdown of a date, if any
+#     iter_rows    : yields each record as a plain tuple, in FIELDS order
+#     iter_dicts   : yields each record as a dict
+#     nbytes       : bytes used by the column buffers
+class HistoryTable:
+
+  # array typecodes per column
+  TYPECODES = {"year": "H",
+               "mon" : "B",
+               "day" : "B",
+               "wday": "H",
+               "secSoFar": "d",
+               "earnings": "d",
+               "percent" : "d"}
+
+  def __init__(self):
+    self._cols = {key: array(code) for key, code in HistoryTable.TYPECODES.items()}
+    self._keys = None # negated date_keys, ascending; None until first needed
+    self._bands = {}  # date_key -> bands breakdown
+
+  ########
+  # Builds a table from an iterable of dicts or HistoryRecords.
+  @staticmethod
+  def from_records(records):
+    table = HistoryTable()
+    c = table._cols
+    year, mon, day, wday = c["year"].append, c["mon"].append, c["day"].append, c["wday"].append
+    secSoFar, earnings, percent = c["secSoFar"].append, c["earnings"].append, c["percent"].append
+    for rec in records:
+      year(rec["year"])
+      mon(rec["mon"])
+      day(rec["day"])
+      wday(_WDAY_INDEX.get(rec["wday"]) if rec["wday"] in _WDAY_INDEX else wday_index(rec["wday"]))
+      secSoFar(rec["secSoFar"])
+      earnings(rec["earnings"])
+      percent((rec["percent"] * 100 // 1) / 100)
+    return table
+
+  ########
+  # Inserts a record; percent is clipped to 2 decimals on the way in.
+  #   Params:
+  #     i   : Index to insert before.
+  #     rec : Dict in HISTORY_FORMAT or HistoryRecord.
+  def insert(self, i, rec):
+    self._put_bands(rec)
+    if self._keys != None:
+      self._keys.insert(i, -date_key(rec["year"], rec["mon"], rec["day"]))
+      self._check_order(i)
+    c = self._cols
+    c["year"].insert(i, rec["year"])
+    c["mon"].insert(i, rec["mon"])
+    c["day"].insert(i, rec["day"])
+    c["wday"].insert(i, wday_index(rec["wday"]))
+    c["secSoFar"].insert(i, rec["secSoFar"])
+    c["earnings"].insert(i, rec["earnings"])
+    c["percent"].insert(i, clip_percent(rec["percent"]))
+
+  def append(self, rec):
+    self._put_bands(rec)
+    if self._keys != None:
+      self._keys.append(-date_key(rec["year"], rec["mon"], rec["day"]))
+      self._check_order(len(self._keys) - 1)
+    c = self._cols
+    c["year"].append(rec["year"])
+    c["mon"].append(rec["mon"])
+    c["day"].append(rec["day"])
+    c["wday"].append(wday_index(rec["wday"]))
+    c["secSoFar"].append(rec["secSoFar"])
+    c["earnings"].append(rec["earnings"])
+    c["percent"].append((rec["percent"] * 100 // 1) / 100)
+
+  ########
+  # Adds a record at its place in date order. An existing record for the
+  # same day is replaced.
+  #   Params:
+  #     rec : Dict in HISTORY_FORMAT or HistoryRecord.
+  #   Returns: Index of the record.
+  def put(self, rec):
+    keys = self._index()
+    key = -date_key(rec["year"], rec["mon"], rec["day"])
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+      del self[i]
+    self.insert(i, rec)
+    return i
+
+  ########
+  # Adds a record unless the table already has a better one for that day.
+  # The record with more time wins, then more earnings, then higher percent,
+  # so merging the same records in any order gives the same table.
+  #   Params:
+  #     rec : Dict in HISTORY_FORMAT or HistoryRecord.
+  #   Returns: True if rec was added.
+  def merge(self, rec):
+    i = self.find((rec["year"], rec["mon"], rec["day"]))
+    if i >= 0:
+      c = self._cols
+      if (c["secSoFar"][i], c["earnings"][i], c["percent"][i]) >= \
+         (rec["secSoFar"], rec["earnings"], clip_percent(rec["percent"])):
+        return False
+    self.put(rec)
+    return True
+
+  ########
+  # Finds a day.
+  #   Params:
+  #     day : (year, mon, day) tuple or datetime.date.
+  #   Returns: Index of the day's record, or -1.
+  def find(self, day):
+    keys = self._index()
+    key = -_day_key(day)
+    i = bisect_left(keys, key)
+    return i if i < len(keys) and keys[i] == key else -1
+
+  def get(self, day):
+    i = self.find(day)
+    return self.record(i) if i >= 0 else None
+
+  ########
+  # Locates a date range.
+  #   Params:
+  #     start, end : Inclusive bounds as (year, mon, day) or datetime.date;
+  #                  None leaves that side open.
+  #   Returns: (lo, hi) such that self[lo:hi] are the days in range, newest first.
+  def span(self, start = None, end = None):
+    keys = self._index()
+    lo = 0 if end == None else bisect_left(keys, -_day_key(end))
+    hi = len(keys) if start == None else bisect_right(keys, -_day_key(start))
+    return lo, max(lo, hi)
+
+  ########
+  # Copies out the days in a date range; see span.
+  #   Returns: New HistoryTable.
+  def between(self, start = None, end = None):
+    lo, hi = self.span(start, end)
+    table = HistoryTable()
+    for key, col in self._cols.items():
+      table._cols[key] = col[lo:hi]
+    table._keys = self._keys[lo:hi]
+    if self._bands and hi > lo:
+      newest, oldest = -table._keys[0], -table._keys[-1]
+      table._bands = {k: b for k, b in self._bands.items() if oldest <= k <= newest}
+    return table
+
+  ########
+  # Copies out the days from n - 1 days before a day up to that day.
+  #   Params:
+  #     n     : Number of calendar days.
+  #     today : Last day as (year, mon, day) or datetime.date; defaults to today.
+  #   Returns: New HistoryTable.
+  def last_days(self, n, today = None):
+    if today == None:
+      today = date.today()
+    elif not isinstance(today, date):
+      today = date(*today)
+    return self.between(date.fromordinal(today.toordinal() - n + 1), today)
+
+  ########
+  # Puts the days in newest-first order, keeping the relative order of
+  # records for the same day.
+  def sort(self):
+    c = self._cols
+    keys = [-date_key(y, m, d) for y, m, d in zip(c["year"], c["mon"], c["day"])]
+    order = sorted(range(len(keys)), key = keys.__getitem__)
+    for key, col in c.items():
+      c[key] = array(col.typecode, [col[i] for i in order])
+    self._keys = array("l", [keys[i] for i in order])
+
+  ########
+  # Returns the date index, building it (and sorting the table if it is
+  # out of order) on first use.
+  def _index(self):
+    if self._keys == None:
+      c = self._cols
+      keys = array("l", map(_neg_key, c["year"], c["mon"], c["day"]))
+      if any(a > b for a, b in zip(keys, keys[1:])):
+        self.sort()
+      else:
+        self._keys = keys
+    return self._keys
+
+  ########
+  # Drops the date index if a change at index i broke the date order; the
+  # next lookup then re-sorts.
+  def _check_order(self, i):
+    keys = self._keys
+    if (i > 0 and keys[i - 1] > keys[i]) or (i + 1 < len(keys) and keys[i] > keys[i + 1]):
+      self._keys = None
+
+  def record(self, i):
+    c = self._cols
+    bands = None
+    if self._bands:
+      bands = self._bands.get(date_key(c["year"][i], c["mon"][i], c["day"][i]))
+    return HistoryRecord(c["year"][i], c["mon"][i], c["day"][i],
+                         _WDAY_NAMES[c["wday"][i]],
+                         c["secSoFar"][i], c["earnings"][i], c["percent"][i], bands)
+
+  ########
+  # Gets the bands breakdown of a (year, mon, day), or None.
+  def bands_of(self, year, mon, day):
+    return self._bands.get(date_key(year, mon, day)) if self._bands else None
+
+  def _put_bands(self, rec):
+    bands = rec.get(BANDS)
+    key = date_key(rec["year"], rec["mon"], rec["day"])
+    if bands != None:
+      self._bands[key] = bands
+    elif self._bands:
+      self._bands.pop(key, None)
+
+  ########
+  # Yields records as plain tuples in FIELDS order, optionally only those
+  # in the index range [lo, hi).
+  def iter_rows(self, lo = 0, hi = None):
+    c = self._cols
+    names = _WDAY_NAMES
+    cols = (c[key] for key in FIELDS)
+    if lo != 0 or hi != None:
+      cols = (col[lo:hi] for col in cols)
+    for y, m, d, w, sec, earn, pct in zip(*cols):
+      yield y, m, d, names[w], sec, earn, pct
+
+  def iter_dicts(self):
+    for row in self.iter_rows():
+      d = dict(zip(FIELDS, row))
+      if self._bands:
+        bands = self._bands.get(date_key(row[0], row[1], row[2]))
+        if bands != None:
+          d[BANDS] = bands
+      yield d
+
+  def nbytes(self):
+    return sum(col.itemsize * len(col) for col in self._cols.values())
+
+  ################
+  # Sequence protocol
+  ################
+
+  def __len__(self):
+    return len(self._cols["year"])
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self.record(j) for j in range(*i.indices(len(self)))]
+    if i < 0:
+      i += len(self)
+    if i < 0 or i >= len(self):
+      raise IndexError("history index out of range")
+    return self.record(i)
+
+  def __delitem__(self, i):
+    if self._bands:
+      c = self._cols
+      for j in (range(*i.indices(len(self))) if isinstance(i, slice) else (i,)):
+        self._bands.pop(date_key(c["year"][j], c["mon"][j], c["day"][j]), None)
+    for col in self._cols.values():
+      del col[i]
+    if self._keys != None:
+      del self._keys[i]
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.record(i)
+# HistoryTable
+################
+
+def _neg_key(year, mon, day):
+  return -(year * 10000 + mon * 100 + day)
+
+def _skip_key(key):
+  pass
+
+########
+# date_key of a (year, mon, day) tuple or datetime.date.
+def _day_key(day):
+  if isinstance(day, date):
+    return date_key(day.year, day.month, day.day)
+  return date_key(day[0], day[1], day[2])
+
+
+# streaming reader settings
+_READ_CHUNK = 1 << 16  # characters read at a time
+_MAX_RECORD = 1 << 16  # a record that can't be parsed within this many is corrupt
+_WHOLE_FILE = 1 << 20  # files up to this size are decoded in one call, if intact
+_SKIP_SEP = re.compile(r"[\s,]*")
+_NEXT_RECORD = re.compile(r"\}\s*,\s*(?=\{)")
+
+########
+# Builds the validator for decoded entries once, from HISTORY_FORMAT, as a
+# single generated function with one unrolled type test per field.
+# Ints are accepted for float fields, as other writers may emit 0 for 0.0.
+#   Returns: Function taking a decoded entry and returning a tuple of its
+#            fields in the format's order, or None if it doesn't match.
+def compile_validator(fmt = HISTORY_FORMAT):
+  names = {}
+  fetch = []
+  tests = []
+  for i, (key, t) in enumerate(fmt.items()):
+    names["t{}".format(i)] = t
+    fetch.append("e[{!r}]".format(key))
+    if t is float:
+      tests.append("(type(r[{0}]) is t{0} or type(r[{0}]) is int)".format(i))
+    else:
+      tests.append("type(r[{0}]) is t{0}".format(i))
+  src = ("def validate(e):\n"
+         "  try:\n"
+         "    r = ({},)\n"
+         "  except (KeyError, TypeError, IndexError):\n"
+         "    return None\n"
+         "  return r if {} else None\n").format(", ".join(fetch), " and ".join(tests))
+  exec(compile(src, "<history validator>", "exec"), names)
+  return names["validate"]
+
+_validate = compile_validator()
+
+########
+# Gets the quarantine file for a history file, where unreadable records go.
+def quarantine_path(path):
+  return os.path.splitext(path)[0] + ".quarantine.jsonl"
+
+########
+# Streams raw entries out of a JSON array history file, decoding one record
+# at a time from a bounded buffer. Text that can't be decoded is passed to
+# onBad and skipped up to the start of the next record.
+#   Params:
+#     path  : History file.
+#     onBad : Optional function(rawText, reason).
+#   Returns: Generator of decoded entries (not yet validated).
+def iter_history_file(path, onBad = None):
+  import json
+  scan = json.JSONDecoder().scan_once
+  with open(path, "r") as f:
+    chunk = min(_READ_CHUNK, os.fstat(f.fileno()).st_size + 1)
+    buf = f.read(chunk).lstrip()
+    eof = False
+    if not buf.startswith("["):
+      if buf and onBad != None:
+        onBad(buf[:_MAX_RECORD], "not a JSON array")
+      return
+    pos = 1
+    while True:
+      if buf.startswith(", ", pos): # what this module writes
+        pos += 2
+      else:
+        pos = _SKIP_SEP.match(buf, pos).end()
+      if pos >= len(buf) or (not eof and len(buf) - pos < _MAX_RECORD):
+        more = "" if eof else f.read(chunk)
+        if more:
+          buf = buf[pos:] + more
+          pos = 0
+          continue
+        eof = True
+        if pos >= len(buf): # truncated before ']'
+          return
+      if buf[pos] == "]":
+        return
+      try:
+        entry, pos = scan(buf, pos)
+      except (StopIteration, ValueError):
+        m = _NEXT_RECORD.search(buf, pos)
+        end = m.end() if m != None else len(buf)
+        if onBad != None:
+          onBad(buf[pos:end].rstrip(", \t\r\n"), "unparseable")
+        pos = end
+        continue
+      yield entry
+
+########
+# Loads a history file into a table in a single streaming pass. Bad records
+# are appended to the quarantine file, unless it already holds them from an
+# earlier load, and skipped; the rest are kept.
+# Small intact files are decoded in one json.loads call, which is quicker
+# than streaming when the whole file fits in a few buffers anyway.
+#   Params:
+#     path           : History file.
+#     skipDate       : Optional (year, mon, day) whose record is left out.
+#     quarantineFile : Where bad records go; defaults to quarantine_path(path).
+#   Returns: (HistoryTable, number of bad records)
+def load_history_file(path, skipDate = None, quarantineFile = None):
+  quarantine = _Quarantine(quarantineFile or quarantine_path(path))
+  on_bad = quarantine.add
+  table = HistoryTable()
+  entries = None
+  if os.path.getsize(path) <= _WHOLE_FILE:
+    import json
+    with open(path, "r") as f:
+      try:
+        entries = json.loads(f.read())
+      except ValueError:
+        pass
+    if type(entries) is not list:
+      entries = None
+  if entries == None:
+    entries = iter_history_file(path, on_bad)
+  append_entries(table, entries, on_bad)
+  quarantine.flush()
+  if skipDate != None:
+    i = table.find(skipDate)
+    if i >= 0:
+      del table[i]
+  return table, quarantine.count
+
+########
+# Validates decoded entries and appends the good ones to a table.
+#   Params:
+#     table   : HistoryTable to append to.
+#     entries : Iterable of decoded JSON entries.
+#     onBad   : Optional function(entry, reason) for entries that don't validate.
+def append_entries(table, entries, onBad = None):
+  c = table._cols
+  year, mon, day, wday = c["year"].append, c["mon"].append, c["day"].append, c["wday"].append
+  secSoFar, earnings, percent = c["secSoFar"].append, c["earnings"].append, c["percent"].append
+  index = _WDAY_INDEX
+  validate = _validate
+  # the date index is built on the way when starting from empty
+  keys = array("l") if len(table) == 0 else None
+  key = keys.append if keys != None else _skip_key
+  table._keys = None
+  for entry in entries:
+    row = validate(entry)
+    if row == None:
+      if onBad != None:
+        onBad(entry, "invalid fields")
+      continue
+    y, m, d, w, sec, earn, pct = row
+    if BANDS in entry and type(entry[BANDS]) is dict:
+      table._bands[y * 10000 + m * 100 + d] = entry[BANDS]
+    year(y)
+    mon(m)
+    day(d)
+    key(-(y * 10000 + m * 100 + d))
+    wday(index[w] if w in index else wday_index(w))
+    secSoFar(sec)
+    earnings(earn)
+    percent((pct * 100 // 1) / 100)
+  if keys != None and keys.tolist() == sorted(keys):
+    table._keys = keys
+
+
+################
+# _Quarantine: appends bad records to a quarantine file as JSON lines, each
+# only once: lines the file already holds are not written again, so loading
+# the same damaged history at every startup leaves a single copy.
+#   Class members:
+#     BATCH : records held before they are written, bounding memory
+#   Members:
+#     path  : quarantine file; os.devnull to discard
+#     count : bad records added, whether or not already quarantined
+#   Methods:
+#     add   : adds a bad record; usable as an onBad callback
+#     flush : writes the records held
+class _Quarantine:
+
+  BATCH = 64
+
+  def __init__(self, path):
+    self.path = path
+    self.count = 0
+    self._bad = []
+    self._seen = None # lines in the file, read when first needed
+
+  def add(self, raw, reason):
+    self._bad.append((raw, reason))
+    self.count += 1
+    if len(self._bad) >= _Quarantine.BATCH:
+      self.flush()
+
+  def flush(self):
+    if len(self._bad) == 0:
+      return
+    import json
+    if self._seen == None:
+      self._seen = set()
+      if self.path != os.devnull and os.path.exists(self.path):
+        with open(self.path, "r") as f:
+          self._seen.update(f)
+    lines = []
+    for raw, reason in self._bad:
+      line = json.dumps({"reason": reason, "record": raw}) + "\n"
+      if line not in self._seen:
+        self._seen.add(line)
+        lines.append(line)
+    del self._bad[:]
+    if lines:
+      with open(self.path, "a") as f:
+        f.writelines(lines)
+# _Quarantine
+################
+
+########
+# Streams the records of a history file merged with its journal, as
+# JsonHistoryStore.load would see them, without building a table: memory
+# is bounded by the read buffer and the (small) journal, not the file.
+# Journal records go in by date among the file's newest-first records;
+# where both have a day, the better record is kept as in HistoryTable.merge.
+#   Params:
+#     path  : JSON history file.
+#     onBad : Optional function(entry, reason) for records that can't be read.
+#   Returns: Generator of HistoryRecords.
+def stream_history(path, onBad = None):
+  pending = {}
+  for rec in HistoryJournal(path).read(onBad):
+    key = date_key(rec.year, rec.mon, rec.day)
+    pending[key] = _better(pending.get(key), rec)
+  order = sorted(pending, reverse = True)
+  j = 0
+  if os.path.exists(path):
+    validate = _validate
+    for entry in iter_history_file(path, onBad):
+      row = validate(entry)
+      if row == None:
+        if onBad != None:
+          onBad(entry, "invalid fields")
+        continue
+      key = date_key(row[0], row[1], row[2])
+      while j < len(order) and order[j] > key: # journal days newer than this one
+        if order[j] in pending:
+          yield pending.pop(order[j])
+        j += 1
+      bands = entry.get(BANDS)
+      rec = HistoryRecord(*row[:6], clip_percent(row[6]), bands if type(bands) is dict else None)
+      journaled = pending.pop(key, None)
+      yield rec if journaled == None else _better(rec, journaled)
+  for key in order:
+    if key in pending:
+      yield pending.pop(key)
+
+########
+# Picks a or b, whichever HistoryTable.merge would keep with a in the table.
+def _better(a, b):
+  if a == None or (b.secSoFar, b.earnings, b.percent) > (a.secSoFar, a.earnings, a.percent):
+    return b
+  return a
+
+# JSON object layout of a record, matching json.dumps of the equivalent dict
+_RECORD_JSON = ('{"year": %d, "mon": %d, "day": %d, "wday": %s, '
+                '"secSoFar": %r, "earnings": %r, "percent": %r}')
+_WRITE_CHUNK = 4096 # records formatted per write
+
+########
+# Formats a record as a JSON object.
+#   Params:
+#     rec : HistoryRecord or dict in HISTORY_FORMAT.
+#   Returns: JSON text.
+def record_json(rec):
+  text = _RECORD_JSON % (rec["year"], rec["mon"], rec["day"], _json_str(rec["wday"]),
+                         float(rec["secSoFar"]), float(rec["earnings"]), float(rec["percent"]))
+  bands = rec.get(BANDS)
+  return text if bands == None else _with_bands(text, bands)
+
+########
+# Adds a bands breakdown to a formatted record.
+def _with_bands(text, bands):
+  import json
+  return '{}, "{}": {}}}'.format(text[:-1], BANDS, json.dumps(bands))
+
+########
+# Writes a table to a JSON array file, formatting a chunk of rows at a time.
+#   Params:
+#     path  : File to write.
+#     table : HistoryTable.
+def write_history_file(path, table):
+  with open(path, "w") as f:
+    f.write("[")
+    chunk = []
+    sep = ""
+    for text in iter_json(table):
+      chunk.append(text)
+      if len(chunk) == _WRITE_CHUNK:
+        f.write(sep + ", ".join(chunk))
+        chunk = []
+        sep = ", "
+    if chunk:
+      f.write(sep + ", ".join(chunk))
+    f.write("]")
+
+########
+# Formats a table's records as JSON objects.
+#   Params:
+#     table  : HistoryTable.
+#     lo, hi : Optional index range.
+#   Returns: Generator of JSON texts, one per record.
+def iter_json(table, lo = 0, hi = None):
+  bands = table._bands
+  for y, m, d, w, sec, earn, pct in table.iter_rows(lo, hi):
+    text = _RECORD_JSON % (y, m, d, _json_str(w), sec, earn, pct)
+    if bands and date_key(y, m, d) in bands:
+      text = _with_bands(text, bands[date_key(y, m, d)])
+    yield text
+
+########
+# JSON-quotes a string, memoized since only a few weekday names occur.
+_JSON_STRS = {}
+def _json_str(s):
+  if s not in _JSON_STRS:
+    import json
+    _JSON_STRS[s] = json.dumps(s)
+  return _JSON_STRS[s]
+
+
+################
+# HistoryJournal: append-only log of saved days kept next to a history file,
+# so concurrent writers can each commit a day without rewriting the file.
+# Appends and folds are serialized with an fcntl lock on a separate lock file.
+#   Members:
+#     path     : journal file, one JSON record per line
+#     lockPath : lock file
+#   Methods:
+#     lock       : context manager holding the lock
+#     append     : adds a record
+#     read       : reads the journal into a HistoryTable, in file order
+#     merge_into : merges the journal into a table with HistoryTable.merge,
+#                  quarantining lines that can't be read; for folds
+#     clear      : empties the journal once folded into the history file
+class HistoryJournal:
+
+  ########
+  #   Params:
+  #     historyPath : History file the journal belongs to.
+  def __init__(self, historyPath):
+    self.path = historyPath + ".journal"
+    self.lockPath = historyPath + ".lock"
+    self._quarantinePath = quarantine_path(historyPath)
+
+  @contextmanager
+  def lock(self, exclusive = True):
+    if fcntl == None:
+      yield
+      return
+    with open(self.lockPath, "a+") as f:
+      fcntl.lockf(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+      try:
+        yield
+      finally:
+        fcntl.lockf(f, fcntl.LOCK_UN)
+
+  def append(self, rec):
+    line = record_json(rec) + "\n"
+    with self.lock():
+      with open(self.path, "a") as f:
+        f.write(line)
+
+  ########
+  # Reads the journal. Needs no lock: a last line still being written is
+  # left for next time. Other lines that don't decode are skipped; they
+  # stay in the journal until a fold quarantines them (see merge_into), so
+  # reading never writes anything.
+  #   Params:
+  #     onBad : Optional function(entry, reason) for lines that can't be read.
+  #   Returns: HistoryTable in the order the days were appended.
+  def read(self, onBad = None):
+    table = HistoryTable()
+    if not os.path.exists(self.path):
+      return table
+    import json
+    def entries(f):
+      for line in f:
+        if not line.endswith("\n"): # append in progress
+          break
+        if line.strip():
+          try:
+            yield json.loads(line)
+          except ValueError:
+            if onBad != None:
+              onBad(line.rstrip("\n"), "unparseable")
+    with open(self.path, "r") as f:
+      append_entries(table, entries(f), onBad)
+    return table
+
+  ########
+  # Merges the journal into a table; see HistoryTable.merge. Called to fold
+  # the journal, just before clearing it, so its unreadable lines go to the
+  # history file's quarantine file here, once.
+  #   Returns: The journal's records, as a HistoryTable.
+  def merge_into(self, table):
+    quarantine = _Quarantine(self._quarantinePath)
+    journal = self.read(quarantine.add)
+    quarantine.flush()
+    for rec in journal:
+      table.merge(rec)
+    return journal
+
+  def clear(self):
+    if os.path.exists(self.path):
+      open(self.path, "w").close()
+# HistoryJournal
+################
+
+
+################
+# JournaledHistoryStore: base for stores that keep history in one file plus
+# a HistoryJournal. Saving a day only appends to the journal, an O(1) write
+# that concurrent instances can't lose to each other; reads merge the
+# journal in, and once it grows past FOLD_AFTER records a read folds it into
+# the file. Subclasses implement _read and _write of the file itself; _write
+# must replace the file atomically, which lets reads go without the lock.
+#   Class members:
+#     FOLD_AFTER : journal length at which loading folds it into the file
+#   Members:
+#     path    : history file
+#     journal : HistoryJournal beside it
+#   Methods:
+#     load     : reads the file and journal into a HistoryTable
+#     save_day : appends a day's record to the journal
+#     rewrite  : replaces the whole history, folding in the journal
+#     close    : nothing to release
+class JournaledHistoryStore:
+
+  FOLD_AFTER = 32
+
+  def __init__(self, path):
+    self.path = path
+    self.journal = HistoryJournal(path)
+
+  ########
+  # Reads the history; a missing file is an empty history.
+  #   Params:
+  #     skipDate : Optional (year, mon, day) whose record is left out.
+  #   Returns: HistoryTable, newest first.
+  def load(self, skipDate = None):
+    # journal first: a fold replaces the file before clearing the journal,
+    # so whichever side of a fold each read lands on, no day is missed
+    pending = self.journal.read()
+    table = self._read()
+    for rec in pending:
+      table.merge(rec)
+    if len(pending) >= JournaledHistoryStore.FOLD_AFTER:
+      with self.journal.lock():
+        table = self._read() # again, as others may have written meanwhile
+        self._write(table, self.journal.merge_into(table))
+        self.journal.clear()
+    if skipDate != None:
+      i = table.find(skipDate)
+      if i >= 0:
+        del table[i]
+    return table
+
+  ########
+  # Records a day by appending it to the journal.
+  #   Params:
+  #     rec   : Dict in HISTORY_FORMAT.
+  #     table : Loaded history without rec's day, or None to load it here.
+  #   Returns: The table, now including rec.
+  def save_day(self, rec, table = None):
+    if table == None:
+      table = self.load((rec["year"], rec["mon"], rec["day"]))
+    self.journal.append(rec)
+    table.put(rec)
+    return table
+
+  ########
+  # Replaces the history with a table, e.g. after compaction. Days other
+  # writers have journaled meanwhile are merged into the table first.
+  def rewrite(self, table):
+    with self.journal.lock():
+      self.journal.merge_into(table)
+      self._write(table, None)
+      self.journal.clear()
+
+  def close(self):
+    pass
+
+  ########
+  # Reads the history file, without the journal.
+  def _read(self):
+    raise NotImplementedError
+
+  ########
+  # Writes the history file.
+  #   Params:
+  #     table   : Whole history.
+  #     changed : HistoryTable of the records changed since the last _read,
+  #               or None if anything may have changed.
+  def _write(self, table, changed):
+    raise NotImplementedError
+# JournaledHistoryStore
+################
+
+
+################
+# JsonHistoryStore: keeps history in a JSON array file plus a journal.
+class JsonHistoryStore(JournaledHistoryStore):
+
+  def _read(self):
+    if not os.path.exists(self.path):
+      return HistoryTable()
+    return load_history_file(self.path)[0]
+
+  def _write(self, table, changed):
+    write_history_file(self.path + ".tmp", table)
+    os.replace(self.path + ".tmp", self.path)
+# JsonHistoryStore
+################
@@ -0,0 +1,181 @@
+################################
+# historyblocks.py
+# ------------------------------
+# Compressed, block-framed history file. Records are grouped into one
+# block per calendar year, newest year first, and each block is compressed
+# on its own with gzip or lzma behind a small fixed header. Readers stop
+# at the first block older than they need without reading the rest, and
+# writes recompress only the years that changed.
+#
+# Layout:
+#   MAGIC
+#   per block: codec (1 byte, b"g" or b"x"), year (u16), record count (u32),
+#              payload length (u32), then the compressed JSON array text
+################################
+
+# imports
+import os
+import struct
+
+from history import HistoryTable, JournaledHistoryStore, JsonHistoryStore, append_entries, iter_json
+
+MAGIC = b"MTHB\x01"
+CODECS = {"gzip": b"g", "lzma": b"x"}
+_BLOCK = struct.Struct("<cHII")
+
+
+########
+# Compresses a block payload.
+def _compress(codec, data):
+  if codec == b"g":
+    import gzip
+    return gzip.compress(data, mtime = 0)
+  import lzma
+  return lzma.compress(data)
+
+########
+# Decompresses a block payload.
+def _decompress(codec, data):
+  if codec == b"g":
+    import gzip
+    return gzip.decompress(data)
+  if codec == b"x":
+    import lzma
+    return lzma.decompress(data)
+  raise ValueError("unknown block codec {!r}".format(codec))
+
+########
+# Reads the blocks of a file, newest year first.
+#   Params:
+#     path  : Block file.
+#     since : Optional year; reading stops at the first older block.
+#   Returns: Generator of (codec, year, count, compressed payload).
+def iter_blocks(path, since = None):
+  with open(path, "rb") as f:
+    if f.read(len(MAGIC)) != MAGIC:
+      raise ValueError("{} is not a block history file".format(path))
+    while True:
+      header = f.read(_BLOCK.size)
+      if len(header) < _BLOCK.size: # end of file, or a block cut short
+        return
+      codec, year, count, length = _BLOCK.unpack(header)
+      if since != None and year < since:
+        return
+      payload = f.read(length)
+      if len(payload) < length:
+        return
+      yield codec, year, count, payload
+
+########
+# Loads the records of a block file.
+#   Params:
+#     path   : Block file.
+#     since  : Optional (year, mon, day); only blocks that can hold days on or
+#              after it are decoded, and older days are dropped.
+#     blocks : Optional dict filled with year -> (codec, count, payload), for
+#              write_block_file to reuse.
+#   Returns: HistoryTable, newest first.
+def read_block_file(path, since = None, blocks = None):
+  import json
+  table = HistoryTable()
+  for codec, year, count, payload in iter_blocks(path, since[0] if since != None else None):
+    append_entries(table, json.loads(_decompress(codec, payload).decode("utf-8")))
+    if blocks != None:
+      blocks[year] = (codec, count, payload)
+  if since != None:
+    table = table.between(since, None)
+  return table
+
+########
+# Writes a table as a block file, replacing the old file only once the new
+# one is complete.
+#   Params:
+#     path   : Block file.
+#     table  : HistoryTable.
+#     codec  : "gzip" or "lzma", used for blocks that are (re)compressed.
+#     blocks : Optional dict of year -> (codec, count, payload) from the last
+#              read or write; those years' payloads are reused as they are.
+#              Updated to describe the written file.
+def write_block_file(path, table, codec = "gzip", blocks = None):
+  codec = CODECS[codec]
+  if blocks == None:
+    blocks = {}
+  years = sorted(set(table._cols["year"]), reverse = True)
+  written = {}
+  tmpPath = path + ".tmp"
+  with open(tmpPath, "wb") as f:
+    f.write(MAGIC)
+    for year in years:
+      lo, hi = table.span((year, 1, 1), (year, 12, 31))
+      block = blocks.get(year)
+      if block == None or block[1] != hi - lo:
+        text = "[" + ", ".join(iter_json(table, lo, hi)) + "]"
+        block = (codec, hi - lo, _compress(codec, text.encode("utf-8")))
+      f.write(_BLOCK.pack(block[0], year, block[1], len(block[2])))
+      f.write(block[2])
+      written[year] = block
+  os.replace(tmpPath, path)
+  blocks.clear()
+  blocks.update(written)
+
+
+################
+# BlockHistoryStore: history kept in a compressed block file plus a journal
+# (see history.JournaledHistoryStore). Folding the journal in recompresses
+# only the years it touched.
+#   Members:
+#     codec : "gzip" or "lzma" for newly written blocks
+#   Methods:
+#     recent : reads only the days since a date
+class BlockHistoryStore(JournaledHistoryStore):
+
+  ########
+  # Opens a block file, creating it from a JSON history file if it doesn't
+  # exist yet.
+  #   Params:
+  #     path       : Block file.
+  #     codec      : "gzip" or "lzma".
+  #     importFrom : Optional JSON history file; its journal comes along.
+  def __init__(self, path, codec = "gzip", importFrom = None):
+    if codec not in CODECS:
+      raise ValueError("unknown codec {!r}".format(codec))
+    JournaledHistoryStore.__init__(self, path)
+    self.codec = codec
+    self._blocks = {} # payloads of the file as last read or written
+    if not os.path.exists(path) and importFrom != None:
+      table = JsonHistoryStore(importFrom).load() # file and journal
+      if len(table) > 0:
+        with self.journal.lock():
+          write_block_file(path, table, codec, self._blocks)
+
+  ########
+  # Reads the days on or after a date, decompressing only the blocks they
+  # can be in. Unlike load, never folds the journal, so it writes nothing.
+  #   Params:
+  #     since : (year, mon, day), or None for all days.
+  #   Returns: HistoryTable, newest first.
+  def recent(self, since):
+    pending = self.journal.read() # before the file, as in load
+    table = HistoryTable()
+    if os.path.exists(self.path):
+      table = read_block_file(self.path, since)
+    for rec in pending:
+      if since == None or (rec.year, rec.mon, rec.day) >= tuple(since):
+        table.merge(rec)
+    return table
+
+  def _read(self):
+    self._blocks.clear()
+    if not os.path.exists(self.path):
+      return HistoryTable()
+    return read_block_file(self.path, blocks = self._blocks)
+
+  def _write(self, table, changed):
+    if changed == None:
+      self._blocks.clear()
+    else:
+      for rec in changed:
+        self._blocks.pop(rec.year, None)
+    write_block_file(self.path, table, self.codec, self._blocks)
+# BlockHistoryStore
+################
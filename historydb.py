@@ -0,0 +1,183 @@
+################################
+# historydb.py
+# ------------------------------
+# Optional SQLite history backend. Days are rows keyed by (year, mon, day)
+# with a weekday index, so saving a day is a single upsert and range or
+# aggregate questions run in SQLite instead of over a loaded list.
+################################
+
+# imports
+import json
+import os
+
+from history import HistoryRecord, HistoryTable, JsonHistoryStore, FIELDS, BANDS, date_key
+
+
+_SCHEMA = ("CREATE TABLE IF NOT EXISTS history ("
+           "  year     INTEGER NOT NULL,"
+           "  mon      INTEGER NOT NULL,"
+           "  day      INTEGER NOT NULL,"
+           "  wday     TEXT    NOT NULL,"
+           "  secSoFar REAL    NOT NULL,"
+           "  earnings REAL    NOT NULL,"
+           "  percent  REAL    NOT NULL,"
+           "  bands    TEXT," # JSON breakdown by rate band, if recorded
+           "  PRIMARY KEY (year, mon, day)"
+           ") WITHOUT ROWID",
+           "CREATE INDEX IF NOT EXISTS history_wday ON history (wday, year, mon, day)")
+
+_UPSERT = ("INSERT INTO history (year, mon, day, wday, secSoFar, earnings, percent, bands) "
+           "VALUES (:year, :mon, :day, :wday, :secSoFar, :earnings, :percent, :bands) "
+           "ON CONFLICT (year, mon, day) DO UPDATE SET "
+           "wday = excluded.wday, secSoFar = excluded.secSoFar, "
+           "earnings = excluded.earnings, percent = excluded.percent, bands = excluded.bands "
+           # same rule as HistoryTable.merge, so concurrent instances agree on the day
+           "WHERE (excluded.secSoFar, excluded.earnings, excluded.percent) > "
+           "(history.secSoFar, history.earnings, history.percent)")
+
+########
+# Gets the upsert parameters of a record, with bands as JSON text.
+def _params(rec):
+  params = {key: rec[key] for key in FIELDS}
+  bands = rec.get(BANDS)
+  params[BANDS] = json.dumps(bands) if bands != None else None
+  return params
+
+
+################
+# SqliteHistoryStore: history kept in an SQLite database in WAL mode.
+# Has the same load/save_day/close interface as history.JsonHistoryStore.
+#   Members:
+#     path : database file
+#   Methods:
+#     load     : reads all days into a HistoryTable
+#     save_day : upserts one day
+#     rewrite  : replaces all days in one transaction
+#     days     : yields the days matching a date range and/or weekday
+#     totals   : aggregates the days matching a date range and/or weekday
+#     close    : closes the connection
+class SqliteHistoryStore:
+
+  ########
+  # Opens (creating if needed) the database.
+  #   Params:
+  #     path       : Database file.
+  #     importFrom : JSON history file copied in, with its journal, if the
+  #                  database is empty.
+  def __init__(self, path, importFrom = None):
+    import sqlite3
+    self.path = path
+    self._db = sqlite3.connect(path)
+    self._db.row_factory = sqlite3.Row
+    self._db.execute("PRAGMA journal_mode = WAL")
+    self._db.execute("PRAGMA synchronous = NORMAL")
+    for stmt in _SCHEMA:
+      self._db.execute(stmt)
+    self._db.commit()
+
+    if importFrom != None:
+      if self._db.execute("SELECT 1 FROM history LIMIT 1").fetchone() == None:
+        table = JsonHistoryStore(importFrom).load() # file and journal
+        with self._db:
+          self._db.executemany(_UPSERT, map(_params, table.iter_dicts()))
+
+  ########
+  # Reads all days.
+  #   Params:
+  #     skipDate : Optional (year, mon, day) whose record is left out.
+  #   Returns: HistoryTable, newest first.
+  def load(self, skipDate = None):
+    where, params = self._where(None, None, None)
+    if skipDate != None:
+      where = "WHERE (year, mon, day) != (?, ?, ?)"
+      params = list(skipDate)
+    cur = self._db.execute("SELECT {} FROM history {} ORDER BY year DESC, mon DESC, day DESC".format(", ".join(FIELDS), where),
+                           params)
+    table = HistoryTable.from_records(cur)
+    for year, mon, day, bands in self._db.execute("SELECT year, mon, day, bands FROM history "
+                                                  "WHERE bands IS NOT NULL"):
+      if table.find((year, mon, day)) >= 0:
+        table._bands[date_key(year, mon, day)] = json.loads(bands)
+    return table
+
+  ########
+  # Records a day with a single upsert. If the database already has a
+  # better record for the day (see HistoryTable.merge), it is kept, and
+  # the table gets that record instead of rec.
+  #   Params:
+  #     rec   : Dict in HISTORY_FORMAT.
+  #     table : Loaded history without rec's day, or None to load it here.
+  #   Returns: The table, now including the day's stored record.
+  def save_day(self, rec, table = None):
+    day = (rec["year"], rec["mon"], rec["day"])
+    if table == None:
+      table = self.load(day)
+    with self._db:
+      changed = self._db.execute(_UPSERT, _params(rec)).rowcount > 0
+    if changed:
+      table.put(rec)
+    else: # another instance saved a better record; read it back
+      for kept in self.days(day, day):
+        table.put(kept)
+    return table
+
+  ########
+  # Replaces all days with the contents of a table, e.g. after compaction.
+  def rewrite(self, table):
+    with self._db:
+      self._db.execute("DELETE FROM history")
+      self._db.executemany(_UPSERT, map(_params, table.iter_dicts()))
+
+  ########
+  # Yields the days in a date range and/or on a weekday, oldest first.
+  #   Params:
+  #     start, end  : Optional inclusive (year, mon, day) bounds.
+  #     wday        : Optional weekday name, e.g. "Fri".
+  #     newestFirst : True for newest first instead, as history is shown.
+  #   Returns: Generator of HistoryRecords.
+  def days(self, start = None, end = None, wday = None, newestFirst = False):
+    where, params = self._where(start, end, wday)
+    order = "year DESC, mon DESC, day DESC" if newestFirst else "year, mon, day"
+    cur = self._db.execute("SELECT {}, bands FROM history {} ORDER BY {}".format(", ".join(FIELDS), where, order),
+                           params)
+    for row in cur:
+      bands = row[BANDS]
+      yield HistoryRecord(*row[:len(FIELDS)], bands = json.loads(bands) if bands != None else None)
+
+  ########
+  # Aggregates the days in a date range and/or on a weekday.
+  #   Params:
+  #     start, end : Optional inclusive (year, mon, day) bounds.
+  #     wday       : Optional weekday name, e.g. "Fri".
+  #   Returns: Dict with days, secSoFar, earnings and average percent.
+  def totals(self, start = None, end = None, wday = None):
+    where, params = self._where(start, end, wday)
+    row = self._db.execute("SELECT COUNT(*), TOTAL(secSoFar), TOTAL(earnings), AVG(percent) "
+                           "FROM history {}".format(where), params).fetchone()
+    return {"days": row[0],
+            "secSoFar": row[1],
+            "earnings": row[2],
+            "percent": row[3] if row[3] != None else 0.0}
+
+  def close(self):
+    self._db.close()
+
+  ########
+  # Builds a WHERE clause the (year, mon, day) and wday indexes can serve.
+  def _where(self, start, end, wday):
+    clauses = []
+    params = []
+    if wday != None:
+      clauses.append("wday = ?")
+      params.append(wday)
+    if start != None:
+      clauses.append("(year, mon, day) >= (?, ?, ?)")
+      params.extend(start)
+    if end != None:
+      clauses.append("(year, mon, day) <= (?, ?, ?)")
+      params.extend(end)
+    if len(clauses) == 0:
+      return "", params
+    return "WHERE " + " AND ".join(clauses), params
+# SqliteHistoryStore
+################
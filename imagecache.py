@@ -0,0 +1,122 @@
+################################
+# imagecache.py
+# ------------------------------
+# Decoded and scaled PhotoImage cache. Each file is decoded once per Tk
+# interpreter; scaled variants are made with zoom/subsample on demand and
+# kept in a small LRU alongside the originals.
+################################
+
+# imports
+import os
+from collections import OrderedDict
+from tkinter import PhotoImage
+
+
+################
+# ImageCache: LRU cache of PhotoImages keyed by (path, mtime, size).
+#   Class members:
+#     DEFAULT_CAPACITY : number of images kept before evicting
+#     MAX_FACTOR       : largest zoom/subsample factor used when scaling
+#   Members:
+#     master   : widget the images are created for
+#     capacity : number of images kept before evicting
+#   Methods:
+#     for_widget : returns the cache shared by a widget's root window
+#     get        : returns a decoded, optionally scaled image
+#     clear      : drops all cached images
+class ImageCache:
+
+  DEFAULT_CAPACITY = 32
+  MAX_FACTOR = 8
+
+  ########
+  # Initializes an empty cache.
+  #   Params:
+  #     master   : Widget the images are created for.
+  #     capacity : Number of images kept before evicting.
+  def __init__(self, master, capacity = DEFAULT_CAPACITY):
+    self.master = master
+    self.capacity = capacity
+    self._images = OrderedDict()
+
+  ########
+  # Returns the cache shared by everything under a widget's root window,
+  # creating it on first use. PhotoImages belong to one interpreter, so
+  # each root gets its own cache.
+  #   Params:
+  #     widget : Any widget.
+  #   Returns: ImageCache for the widget's root.
+  @staticmethod
+  def for_widget(widget):
+    root = widget._root()
+    cache = getattr(root, "_imageCache", None)
+    if cache == None:
+      cache = ImageCache(root)
+      root._imageCache = cache
+    return cache
+
+  ########
+  # Returns a decoded image, scaled if a size is given. Changing the file on
+  # disk changes its mtime and therefore its key.
+  #   Params:
+  #     path : Image file path.
+  #     size : None for the original; an int to cover a size x size square;
+  #            or a (width, height) tuple to cover that box.
+  #   Returns: PhotoImage.
+  def get(self, path, size = None):
+    path = os.path.abspath(path)
+    if isinstance(size, (int, float)):
+      size = (int(size), int(size))
+    key = (path, os.stat(path).st_mtime_ns, size)
+
+    img = self._images.get(key)
+    if img != None:
+      self._images.move_to_end(key)
+      return img
+
+    if size == None:
+      img = PhotoImage(master = self.master, file = path)
+    else:
+      img = scale_image(self.get(path), size)
+    self._images[key] = img
+    while len(self._images) > self.capacity:
+      self._images.popitem(last = False)
+    return img
+
+  def clear(self):
+    self._images.clear()
+# ImageCache
+################
+
+
+########
+# Scales an image so it covers a box, using the smallest zoom/subsample
+# factors (up to ImageCache.MAX_FACTOR) that reach the box size.
+#   Params:
+#     img  : Source PhotoImage.
+#     size : (width, height) the result must cover.
+#   Returns: New PhotoImage, or img itself if no scaling is needed.
+def scale_image(img, size):
+  w, h = img.width(), img.height()
+  if w <= 0 or h <= 0:
+    return img
+  ratio = max(size[0] / w, size[1] / h)
+
+  best = None
+  for sub in range(1, ImageCache.MAX_FACTOR + 1):
+    zoom = min(ImageCache.MAX_FACTOR, max(1, -(-ratio * sub // 1)))
+    if zoom / sub >= ratio and (best == None or zoom / sub < best[0] / best[1]):
+      best = (int(zoom), sub)
+  if ratio < 1 and int(1 / ratio) > ImageCache.MAX_FACTOR: # plain subsample shrinks further
+    best = (1, int(1 / ratio))
+  if best == None: # needs more than MAX_FACTOR
+    best = (ImageCache.MAX_FACTOR, 1)
+
+  zoom, sub = best
+  if zoom == sub:
+    return img
+  if sub > 1: # subsample first so zooming never builds an oversized image
+    img = img.subsample(sub)
+  if zoom > 1:
+    img = img.zoom(zoom)
+  return img
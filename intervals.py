@@ -0,0 +1,265 @@
+################################
+# intervals.py
+# ------------------------------
+# Log of work intervals (from start/unpause to pause/exit) with wall-clock
+# and monotonic endpoints. Intervals are appended to a binary file as four
+# doubles each and queried through an interval tree, so questions like
+# "time worked between 10:00 and 14:00 over the last quarter" don't need
+# the daily history at all.
+#
+# Usage, to answer such a question from MoneyTimer's log:
+#   python intervals.py [money_timer_intervals.bin] --from 10:00 --to 14:00 [--days 91]
+#                       [--until YYYY-MM-DD]
+################################
+
+# imports
+import argparse
+import os
+import struct
+import sys
+from array import array
+from datetime import date, timedelta
+from time import mktime
+
+DEFAULT_DAYS = 91 # about a quarter
+
+
+################
+# IntervalLog: work intervals, oldest first.
+#   Class members:
+#     RECORD : binary layout of one interval in the log file
+#   Members:
+#     path       : log file intervals are appended to; None to keep them in memory
+#     wallStarts, wallEnds, monoStarts, monoEnds : endpoint arrays
+#     openAt     : (wall, mono) of the interval in progress, or None
+#   Methods:
+#     load           : reads a log file
+#     begin          : starts an interval
+#     end            : ends the interval in progress and appends it to the file
+#     tree           : IntervalTree over the wall-clock endpoints
+#     worked_between : seconds worked within a wall-clock span
+#     worked_daily   : seconds worked within the same time-of-day window over a range of days
+class IntervalLog:
+
+  RECORD = struct.Struct("<4d") # wallStart, wallEnd, monoStart, monoEnd
+
+  def __init__(self, path = None):
+    self.path = path
+    self.wallStarts, self.wallEnds = array("d"), array("d")
+    self.monoStarts, self.monoEnds = array("d"), array("d")
+    self.openAt = None
+    self._tree = None
+
+  ########
+  # Reads a log file. A partly written last record is ignored.
+  #   Params:
+  #     path : Log file; a missing file is an empty log.
+  #   Returns: IntervalLog appending to the same file.
+  @staticmethod
+  def load(path):
+    log = IntervalLog(path)
+    if not os.path.exists(path):
+      return log
+    with open(path, "rb") as f:
+      data = f.read()
+    size = IntervalLog.RECORD.size
+    flat = array("d")
+    flat.frombytes(data[:len(data) - len(data) % size])
+    if struct.pack("=d", 1.0) != struct.pack("<d", 1.0): # big-endian host
+      flat.byteswap()
+    log.wallStarts, log.wallEnds = flat[0::4], flat[1::4]
+    log.monoStarts, log.monoEnds = flat[2::4], flat[3::4]
+    return log
+
+  def __len__(self):
+    return len(self.wallStarts)
+
+  ########
+  # Starts an interval. Does nothing if one is already in progress.
+  #   Params:
+  #     wall : Wall-clock time in seconds since the epoch.
+  #     mono : Monotonic clock reading at the same moment.
+  def begin(self, wall, mono):
+    if self.openAt == None:
+      self.openAt = (wall, mono)
+
+  ########
+  # Ends the interval in progress and appends it to the log file.
+  #   Params:
+  #     wall : Wall-clock time in seconds since the epoch.
+  #     mono : Monotonic clock reading at the same moment.
+  #   Returns: True if an interval was recorded.
+  def end(self, wall, mono):
+    if self.openAt == None:
+      return False
+    wallStart, monoStart = self.openAt
+    self.openAt = None
+    self.wallStarts.append(wallStart)
+    self.wallEnds.append(wall)
+    self.monoStarts.append(monoStart)
+    self.monoEnds.append(mono)
+    self._tree = None
+    if self.path != None:
+      with open(self.path, "ab") as f:
+        f.write(IntervalLog.RECORD.pack(wallStart, wall, monoStart, mono))
+    return True
+
+  ########
+  # Gets the interval tree over the wall-clock endpoints, building it on
+  # first use after a change.
+  def tree(self):
+    if self._tree == None:
+      self._tree = IntervalTree(self.wallStarts, self.wallEnds)
+    return self._tree
+
+  ########
+  # Seconds worked within a wall-clock span.
+  #   Params:
+  #     start, end : Span in seconds since the epoch.
+  def worked_between(self, start, end):
+    return self.tree().covered(start, end)
+
+  ########
+  # Seconds worked within the same local time-of-day window on each of a
+  # range of days, e.g. 10:00 to 14:00 every day of the last quarter.
+  #   Params:
+  #     firstDay, lastDay : Inclusive datetime.date range.
+  #     fromSec, toSec    : Window as seconds after local midnight.
+  #   Returns: Total seconds.
+  def worked_daily(self, firstDay, lastDay, fromSec, toSec):
+    tree = self.tree()
+    total = 0.0
+    day = firstDay
+    while day <= lastDay:
+      midnight = mktime((day.year, day.month, day.day, 0, 0, 0, 0, 0, -1))
+      total += tree.covered(midnight + fromSec, midnight + toSec)
+      day += timedelta(days = 1)
+    return total
+# IntervalLog
+################
+
+
+################
+# IntervalTree: static interval tree over half-open [start, end) intervals.
+# Intervals are sorted by start and the sorted arrays are read as an implicit
+# balanced binary tree (each range's midpoint is its root) augmented with
+# the largest end in every subtree, so an overlap query visits O(log n + k)
+# nodes for k hits.
+#   Members:
+#     starts, ends : sorted interval endpoints
+#     order        : original index of each sorted interval
+#   Methods:
+#     overlapping : yields sorted indices of intervals overlapping a span
+#     covered     : total overlap of all intervals with a span
+class IntervalTree:
+
+  def __init__(self, starts, ends):
+    n = len(starts)
+    if all(starts[i] <= starts[i + 1] for i in range(n - 1)):
+      self.order = range(n)
+      self.starts, self.ends = array("d", starts), array("d", ends)
+    else:
+      self.order = sorted(range(n), key = starts.__getitem__)
+      self.starts = array("d", (starts[i] for i in self.order))
+      self.ends = array("d", (ends[i] for i in self.order))
+
+    # maxEnd[mid] = largest end in the subtree rooted at mid; children first
+    self._maxEnd = array("d", self.ends)
+    ranges = []
+    stack = [(0, n)]
+    while stack:
+      lo, hi = stack.pop()
+      if lo < hi:
+        mid = (lo + hi) // 2
+        ranges.append((lo, mid, hi))
+        stack.append((lo, mid))
+        stack.append((mid + 1, hi))
+    maxEnd = self._maxEnd
+    for lo, mid, hi in reversed(ranges):
+      if lo < mid:
+        left = maxEnd[(lo + mid) // 2]
+        if left > maxEnd[mid]:
+          maxEnd[mid] = left
+      if mid + 1 < hi:
+        right = maxEnd[(mid + 1 + hi) // 2]
+        if right > maxEnd[mid]:
+          maxEnd[mid] = right
+
+  def __len__(self):
+    return len(self.starts)
+
+  ########
+  # Yields the (sorted) indices of intervals overlapping [start, end).
+  def overlapping(self, start, end):
+    starts, ends, maxEnd = self.starts, self.ends, self._maxEnd
+    stack = [(0, len(starts))]
+    while stack:
+      lo, hi = stack.pop()
+      if lo >= hi:
+        continue
+      mid = (lo + hi) // 2
+      if maxEnd[mid] <= start: # nothing here reaches the span
+        continue
+      if starts[mid] < end:
+        stack.append((mid + 1, hi))
+        if ends[mid] > start:
+          yield mid
+      stack.append((lo, mid))
+
+  ########
+  # Sums the overlap of every interval with [start, end).
+  def covered(self, start, end):
+    starts, ends = self.starts, self.ends
+    total = 0.0
+    for i in self.overlapping(start, end):
+      total += min(ends[i], end) - max(starts[i], start)
+    return total
+# IntervalTree
+################
+
+
+########
+# Parses hh:mm or h:mm as seconds after midnight; 24:00 is the end of the day.
+def parse_time_of_day(s):
+  try:
+    hr, mins = s.split(":")
+    sec = int(hr) * 3600 + int(mins) * 60
+  except ValueError:
+    raise argparse.ArgumentTypeError("not a time of day: {!r}".format(s))
+  if len(mins) != 2 or not 0 <= int(mins) < 60 or not 0 <= sec <= 86400:
+    raise argparse.ArgumentTypeError("not a time of day: {!r}".format(s))
+  return sec
+
+########
+# main: reports time worked within a time-of-day window over a range of days
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Time worked within the same hours of each day, "
+                                                 "from Money Timer's interval log")
+  parser.add_argument("log", nargs = "?", default = "money_timer_intervals.bin", help = "interval log file")
+  parser.add_argument("--from", dest = "fromSec", type = parse_time_of_day, required = True,
+                      help = "start of the window, hh:mm")
+  parser.add_argument("--to", dest = "toSec", type = parse_time_of_day, required = True,
+                      help = "end of the window, hh:mm")
+  parser.add_argument("--days", type = int, default = DEFAULT_DAYS, help = "number of days, ending with --until")
+  parser.add_argument("--until", type = date.fromisoformat, default = date.today(),
+                      help = "last day, YYYY-MM-DD; default today")
+  args = parser.parse_args(argv)
+  if args.toSec <= args.fromSec:
+    parser.error("--to must be after --from")
+  if args.days < 1:
+    parser.error("--days must be at least 1")
+  if not os.path.exists(args.log):
+    parser.error("no interval log at {}".format(args.log))
+
+  log = IntervalLog.load(args.log)
+  first = args.until - timedelta(days = args.days - 1)
+  total = log.worked_daily(first, args.until, args.fromSec, args.toSec)
+  window = "{:02d}:{:02d}-{:02d}:{:02d}".format(args.fromSec // 3600, args.fromSec % 3600 // 60,
+                                                args.toSec // 3600, args.toSec % 3600 // 60)
+  print("{} to {}, {} each day: {:.2f} hrs worked, {:.2f} hrs a day over {} days ({} intervals logged)".format(
+        first.isoformat(), args.until.isoformat(), window, total / 3600, total / 3600 / args.days,
+        args.days, len(log)))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
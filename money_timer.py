@@ -1,7 +1,15 @@
 from tkinter import *
 from time import *
+from datetime import date, timedelta
+from array import array
+from bisect import bisect_left, bisect_right
 from clockface import ClockFace
-import json
+from imagecache import ImageCache
+import history
+import rates
+from profiling import Profiler, StartupTimer
+from timesource import SystemClock, TkScheduler
+import os
 
 
 
@@ -9,11 +17,16 @@ import json
 # MoneyTimer: main interface, initiates all other dialogs;
 # derivative of tkinter.Frame
 #   Class members:
-#     SETTINGS_FILE   HISTORY_FILE    DEFAULT_HOURLY_RATE
+#     SETTINGS_FILE   HISTORY_FILE    HISTORY_DB      HISTORY_BLOCKS
+#     INTERVALS_FILE  STATS_FILE      COLUMNS_DIR     SYNC_FILE
+#     ASSET_DIR
+#     DEFAULT_HOURLY_RATE
 #     PERCENT_EARN    BAR_WIDTH       BAR_HEIGHT      
 #     BAR_FILL_COLOR  BAR_LINE_COLOR  BAR_BG_COLOR
 #     BAR_TEXT_COLOR  BAR_TEXT_FONT   AFTER_TIME
-#     AFTER_TIME_SEC  DAYS            DEFAULT_SETTINGS
+#     AFTER_TIME_SEC  COMPACT_DELAY   COMPACT_INTERVAL
+#     HISTORY_CHANGES_KEPT
+#     DAYS            DEFAULT_SETTINGS
 #     HISTORY_FORMAT
 #   Subclasses:
 #     SetupWindow     SettingsWindow  HistoryWindow
@@ -23,28 +36,72 @@ import json
 #     timeLabel   : Label displaying time and earnings
 #     pauseButton : Button for toggling pause of time update
 #     secSoFar    : Stores time in seconds that have been clocked
+#     dayRates    : today's rate schedule as a rates.DayRates
+#     intervalLog : intervals.IntervalLog appending each work interval to INTERVALS_FILE,
+#                   opened by the first mark_interval; query it with python intervals.py
+#     dayStats    : sketches.DayStats of past days, loaded on first use by get_day_stats
+#     columns     : npycolumns.NpyColumns mirroring history if the columnsExport setting
+#                   is on, opened on first save
+#     historySync : sync.HistorySync pushing history changes to syncUrl, or None
+#     compactor   : retention.Compactor at work on history, or None
+#     compactTask : scheduled next compaction step, or None
+#     profiler    : Profiler writing reports next to SETTINGS_FILE
+#     clock       : source of localtime(); SystemClock unless injected
+#     history     : past days as a history.HistoryTable, loaded on first use by get_history
+#     historySince: (year, mon, day) history was loaded from, or None if it holds every day
+#     historyStore: where history is kept, chosen by the historyBackend setting
+#     historyVersion : bumped on every change to history
+#     historyChanges : (version, start, end) date spans of recent history changes
+#     settingsVersion: bumped on every change to settings
+#     settingsWindow : SettingsWindow once first opened, hidden while not in use
+#     historyWindow  : HistoryWindow once first opened, hidden while not in use
+#     scheduler   : source of after()/after_cancel(); TkScheduler unless injected
 #   Methods:
-#     __init__           : initializes GUI elements, loads settings, creates SetupWindow
+#     __init__           : initializes GUI elements, creates SetupWindow
+#     init_settings      : loads settings and schedules lunch events; run after first paint
+#     get_icon           : gets an icon from the shared ImageCache, decoding it on first use
+#     load_icons         : puts icons on the menubar and pause button; called after first paint
 #     setup              : initializes a SetupWindow
 #     complete_setup     : takes return of SetupWindow and begins updates
 #     auto_pause         : helper fcn for auto lunch break events
 #     auto_unpause       :   "                               "
 #     toggle_pause       : toggles whether to track time or not
+#     mark_interval      : begins or ends a logged work interval
 #     update             : main update, updates members and display elements
+#     make_day_rates     : compiles today's rate schedule from settings
 #     make_lunch_events  : creates lunch events if needed and deletes previous lunch events
 #     on_settings_click  : opens SettingsWindow window allowing configuration
 #     configure_settings : configures settings from SettingsWindow return
 #     load_settings      : loads settings from file, filling in gaps with defaults
 #     save_settings      : saves settings to file for use on next startup
 #     on_history_click   : opens HistoryWindow window
+#     get_history        : returns history, loading it, or just its recent days, if not yet loaded
+#     recent_history_start  : first day of the history read at startup
+#     note_history_change   : records that the days in a date span changed
+#     history_changes_since : date spans changed since a historyVersion
+#     get_history_store  : opens the JSON or SQLite history store on first use
+#     get_day_stats      : returns dayStats, loading or building it on first use
+#     get_history_sync   : starts pushing history to the syncUrl setting, if any
+#     toggle_profiling   : starts/stops cProfile and tracemalloc capture
 #     load_history       : loads history from file, ignoring current day
+#     today_row          : the current day so far, as it would be saved
 #     save_history       : saves history to file for use on next startup
+#     sync_columns       : brings the .npy history columns up to date
+#     compact_history    : one background step of rolling old history into summaries
+#     backup_history     : keeps a copy of history before each compaction
 #     destroy            : modified to save settings and history
 class MoneyTimer(Frame):
 
   # files
   SETTINGS_FILE = "money_timer_settings.json"
   HISTORY_FILE  = "money_timer_history.json"
+  HISTORY_DB    = "money_timer_history.db"
+  HISTORY_BLOCKS = "money_timer_history.mthb"
+  INTERVALS_FILE = "money_timer_intervals.bin"
+  STATS_FILE    = "money_timer_stats.json"
+  COLUMNS_DIR   = None # history as .npy columns (see npycolumns); None for <HISTORY_FILE stem>.columns
+  SYNC_FILE     = "money_timer_sync.json" # changes not yet pushed to syncUrl, see sync
+  ASSET_DIR     = os.path.dirname(os.path.abspath(__file__)) # icons and clock art
   # constants
   DEFAULT_HOURLY_RATE = 21.5 # $/hr
   PERCENT_EARN = 0.71
@@ -57,7 +114,11 @@ class MoneyTimer(Frame):
   BAR_TEXT_FONT = ("Arial", -BAR_HEIGHT * 3 // 5)
   AFTER_TIME = 500 # ms
   AFTER_TIME_SEC = AFTER_TIME / 1000 # s
-  DAYS = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun"]
+  COMPACT_DELAY = 10000  # ms after setup before history compaction starts
+  COMPACT_INTERVAL = 100 # ms between compaction steps
+  HISTORY_CHANGES_KEPT = 64 # changes remembered for refreshing a hidden HistoryWindow
+  RECENT_HISTORY_DAYS = 31  # days of history read at startup, if the store can read just those
+  DAYS = history.DAYS
 
   CREDITS_TEXT = \
 """\
@@ -80,14 +141,23 @@ Mateo Zlatar\
                       "Thurs": 8.0,
                       "Fri"  : 8.0,
                       "Sat"  : 0.0,
-                      "Sun"  : 0.0}
-  HISTORY_FORMAT = {"year": int,
-                    "mon" : int,
-                    "day" : int,
-                    "wday": str,
-                    "secSoFar": float,
-                    "earnings": float,
-                    "percent" : float}
+                      "Sun"  : 0.0,
+                      "historyBackend": "json", # or "sqlite", or "gzip"/"lzma" for a compressed block file
+                      "syncUrl": "", # collector to push history changes to, see sync.py; "" to not sync
+                      "columnsExport": False, # mirror history as .npy columns, see sync_columns
+                      # see rates.NEUTRAL_SCHEDULE; takeHome is [[gross $ that day, fraction kept], ...]
+                      "rateSchedule": {"overtimeMultiplier": 1.0,
+                                       "weekendMultiplier" : 1.0,
+                                       "weekendDays"       : ["Sat", "Sun"],
+                                       "takeHome"          : [[0.0, PERCENT_EARN]]},
+                      # as retention.DEFAULT_POLICY: days older than dailyDays are rolled into one
+                      # summary per week, and older than weeklyDays into one per month; 0 keeps
+                      # a tier forever, so compaction is off unless turned on here, e.g. with
+                      # 180 and 730. It starts COMPACT_DELAY after setup, and each one that
+                      # changes anything first keeps the history it started from in
+                      # money_timer_history.pre-compaction.<time>.json (see backup_history)
+                      "retention": {"dailyDays": 0, "weeklyDays": 0}}
+  HISTORY_FORMAT = history.HISTORY_FORMAT
 
 
   ################
@@ -175,7 +245,7 @@ Mateo Zlatar\
 
       # calculate time if valid time entered
       if len(s) != 0:
-        currTime = localtime()
+        currTime = self.master.clock.localtime()
         self.secSoFar = (currTime.tm_hour - intHr) * 3600
         self.secSoFar += (currTime.tm_min - intMin) * 60
         self.secSoFar += currTime.tm_sec
@@ -200,23 +270,28 @@ Mateo Zlatar\
   ################
 
   ################
-  # SettingsWindow: allows for configuration of settings
+  # SettingsWindow: allows for configuration of settings; built once, then hidden
+  # and shown again, reloading entries only if settings changed or edits were cancelled
   #   Members:
+  #     version        : master.settingsVersion the entries reflect, or None after a cancel
   #     autoLunchBreak : contains variables and GUI elements for automatic lunch break settings
   #     lowerFrame     : contains goals, rate, and confim/cancel GUI elements
   #     goals          : contains variables and GUI elements for daily goal settings
   #     hourlyRate     : contains variables and GUI elements for hourly rate setting
-  #     confirmButton  : Button to commit setting changes; destroys window if entries valid
-  #     cancel         : Button to cancel setting changes; destroys window
+  #     confirmButton  : Button to commit setting changes; hides window if entries valid
+  #     cancel         : Button to cancel setting changes; hides window
   #   Methods:
   #     __init__                : calls create_widgets, then loads current settings
   #     create_widgets          : creates all GUI elements
   #     load_settings           : loads current settings
+  #     show                    : reloads entries if needed and shows the window
+  #     hide                    : hides the window for reuse, discarding unconfirmed edits
   #     toggle_auto_lunch_break : toggles automatic lunch break setting
+  #     suggest_goals           : fills goal entries with typical hours from history
   #     clip_time_entries       : clips time entries to 5 chars
   #     clip_goal_entries       : clips daily goal entries to 4 chars
   #     clip_rate_entry         : clips rate entry to 6 chars
-  #     on_confirm_click        : validates entries, calls master.configure, destroys window
+  #     on_confirm_click        : validates entries, calls master.configure, hides window
   #     parse_time              : parses a string into hours and minutes if valid; else returns None
   class SettingsWindow(Toplevel):
 
@@ -228,6 +303,8 @@ Mateo Zlatar\
       self.title("Settings [Money Timer]")
       self.lift()
 
+      self.protocol("WM_DELETE_WINDOW", self.hide)
+
       self.create_widgets()
       self.load_settings()
 
@@ -300,6 +377,10 @@ Mateo Zlatar\
       self.goals["invalidLabel"] = Label(self.goals["mainFrame"],
                                          foreground = "#FF0000",
                                          text = "Invalid input.")
+      self.goals["suggestButton"] = Button(self.goals["mainFrame"],
+                                           text = "Suggest from history",
+                                           command = self.suggest_goals)
+      self.goals["suggestButton"].pack(side = "bottom", fill = X)
 
       self.goals["mainFrame"].pack(side = "left")
 
@@ -333,7 +414,7 @@ Mateo Zlatar\
       self.confirmButton.pack(side = "top", fill = X)
       self.cancelButton = Button(self.confirmCancelFrame,
                                  text = "Cancel",
-                                 command = self.destroy)
+                                 command = self.hide)
       self.cancelButton.pack(side = "top", fill = X)
       self.confirmCancelFrame.pack(side = "top")
 
@@ -358,6 +439,25 @@ Mateo Zlatar\
       self.hourlyRate["var"].set(str(settings["hourlyRate"]))
       for day in MoneyTimer.DAYS:
         self.goals[day]["var"].set(str(settings[day]))
+      self.version = self.master.settingsVersion
+
+    ########
+    # show: shows the window again, reloading entries if they are out of date
+    def show(self):
+      if self.version != self.master.settingsVersion:
+        self.load_settings()
+      self.deiconify()
+      self.lift()
+
+    ########
+    # hide: hides the window; unconfirmed edits are dropped on the next show
+    def hide(self):
+      self.autoLunchBreak["invalidLabel"].pack_forget()
+      self.hourlyRate["invalidLabel"].pack_forget()
+      self.goals["invalidLabel"].pack_forget()
+      self.withdraw()
+      self.version = None
+      self.master.settingsOpen = False
 
     ########
     # toggle_auto_lunch_break: toggles states of lunch break entries
@@ -369,6 +469,14 @@ Mateo Zlatar\
         self.autoLunchBreak["startTimeEntry"].config(state = DISABLED)
         self.autoLunchBreak["stopTimeEntry"].config(state = DISABLED)
 
+    ########
+    # suggest_goals: fills in each day's goal with its typical (median) hours worked,
+    # for days with enough history
+    def suggest_goals(self):
+      for day, hours in self.master.get_day_stats().suggest_goals().items():
+        if hours != None:
+          self.goals[day]["var"].set(str(hours))
+
     ########
     # clip_time_entries: limits max input size of times entries
     def clip_time_entries(self, *args):
@@ -447,7 +555,7 @@ Mateo Zlatar\
 
       if inputsValid:
         self.master.configure_settings(ret)
-        self.destroy()
+        self.hide()
 
     ########
     # parse_time: parses a string into hours and minutes, if valid; else, returns None
@@ -473,22 +581,67 @@ Mateo Zlatar\
     # destroy: augmented to modify bool in parent
     def destroy(self):
       self.master.settingsOpen = False
+      self.master.settingsWindow = None
       super().destroy()
   # SettingsWindow
   ################
 
   ################
-  # HistoryWindow: displays log of daily stats;
-  # derivative of Toplevel
+  # HistoryWindow: displays log of daily stats under a live row for the day in
+  # progress; built once, then hidden and shown again, re-rendering only the days
+  # that changed since it was last shown; derivative of Toplevel
+  #   Class members:
+  #     CHUNK_ROWS : lines formatted and inserted at a time
   #   Members:
+  #     chartBar : Frame of buttons showing and hiding the charts
+  #     heatmap : CalendarHeatmap of history once first shown, then kept in step with text
+  #     heatmapShown : whether the heatmap is packed
+  #     trendChart : TrendChart of daily earnings and hours once first shown, then kept
+  #                  in step with text
+  #     trendShown : whether the trend chart is packed
+  #     text    : Text with the live row, then one line per day, newest first
+  #     today   : live row as last rendered, or None
+  #     keys    : negated history.date_key of each line, as in HistoryTable
+  #     version : master.historyVersion the text reflects, or None
   #   Methods:
-  #     __init__ : creates display
-  #     destroy  : updates bool of parent, then destroys
+  #     __init__    : creates display
+  #     show        : refreshes and shows the window
+  #     hide        : hides the window for reuse
+  #     refresh     : applies history changes made since version
+  #     update_today: re-renders the live row if its text changed
+  #     toggle_heatmap    : shows or hides the heatmap, building it on first use
+  #     toggle_trend      : shows or hides the trend chart, building it on first use
+  #     on_heatmap_motion : shows the day under the pointer
+  #     on_heatmap_click  : switches the heatmap between goal percent and hours
+  #     render_span : re-renders the lines of a date range
+  #     destroy     : updates parent, then destroys
   class HistoryWindow(Toplevel):
 
+    CHUNK_ROWS = 64
+
     def __init__(self, root):
       Toplevel.__init__(self, root)
       self.title("History [Money Timer]")
+      self.protocol("WM_DELETE_WINDOW", self.hide)
+
+      # charts, each built the first time it is shown
+      self.chartBar = Frame(self)
+      self.heatmapButton = Button(self.chartBar,
+                                  text = "Calendar",
+                                  relief = GROOVE,
+                                  command = self.toggle_heatmap)
+      self.heatmapButton.pack(side = "left", fill = X, expand = 1)
+      self.trendButton = Button(self.chartBar,
+                                text = "Trend",
+                                relief = GROOVE,
+                                command = self.toggle_trend)
+      self.trendButton.pack(side = "left", fill = X, expand = 1)
+      self.chartBar.pack(side = "top", fill = X)
+      self.heatmap = None
+      self.heatmapShown = False
+      self.trendChart = None
+      self.trendShown = False
+
       self.scrollbar = Scrollbar(self)
       self.scrollbar.pack(side = "right", fill = Y)
       self.text = Text(self,
@@ -496,76 +649,209 @@ Mateo Zlatar\
                        yscrollcommand = self.scrollbar.set)
       self.text.pack(side = "right", fill = Y)
       self.scrollbar.config(command = self.text.yview)
-      if len(self.master.history) > 0:
-        for entry in self.master.history:
-          monStr  = str(entry["mon"]) if entry["mon"] >= 10 else "0" + str(entry["mon"])
-          dayStr  = str(entry["day"]) if entry["day"] >= 10 else "0" + str(entry["day"])
-          wDayStr = entry["wday"] + " "*(5-len(entry["wday"])) if 5 - len(entry["wday"]) > 0 else entry["wday"]
-          intHr   = int(entry["secSoFar"] // 3600)
-          intMin  = int(entry["secSoFar"] % 3600 // 60)
-          intSec  = int(entry["secSoFar"] % 60)
-          strMin  = str(intMin) if intMin >= 10 else "0" + str(intMin)
-          strSec  = str(intSec) if intSec >= 10 else "0" + str(intSec)
-          earningsStr = "{:.2f}".format(entry["earnings"])
-          earningsStr += " "*(7 - len(earningsStr)) if ((7 - len(earningsStr)) > 0) else earningsStr
-
-          inputStr = "{}-{}-{} {}\t{}:{}:{}\t${}\t{:.1f}%\n".format(entry["year"],
-                                                                        monStr,
-                                                                        dayStr,
-                                                                        wDayStr,
-                                                                        intHr,
-                                                                        strMin,
-                                                                        strSec,
-                                                                        earningsStr,
-                                                                        entry["percent"])
-          self.text.insert(END, inputStr)
-      else:
+      self.text.tag_configure("today", foreground = MoneyTimer.BAR_LINE_COLOR)
+      self.keys = array("l")
+      self.version = None
+      self.today = None
+      self.refresh()
+
+    def show(self):
+      self.refresh()
+      self.update_today()
+      self.deiconify()
+      self.lift()
+
+    def hide(self):
+      self.withdraw()
+      self.master.historyOpen = False
+
+    ########
+    # refresh: brings the text up to date with master's history
+    def refresh(self):
+      master = self.master
+      table = master.get_history()
+      if self.version == master.historyVersion:
+        return
+      spans = master.history_changes_since(self.version)
+      self.text.config(state = NORMAL)
+      if self.today == None:
+        self.today = history.format_row(master.today_row())
+        self.text.insert("1.0", self.today, "today")
+      if len(self.keys) == 0: # drop the "no history" note
+        self.text.delete("2.0", END)
+      if spans == None: # too far behind; start over
+        spans = [(None, None)]
+        self.text.delete("2.0", END)
+        del self.keys[:]
+      for start, end in spans:
+        self.render_span(table, start, end)
+        if self.heatmap != None:
+          self.heatmap.update_days(table, start, end)
+        if self.trendChart != None:
+          self.trendChart.update_days(table, start, end)
+      if len(self.keys) == 0:
         self.text.insert(END, "No history recorded.")
+      self.text.config(state = DISABLED)
+      self.version = master.historyVersion
+
+    ########
+    # toggle_heatmap: shows or hides the calendar heatmap, building and drawing it
+    # the first time; until then the window never spends time or memory on it
+    def toggle_heatmap(self):
+      if self.heatmap == None:
+        from heatmap import CalendarHeatmap, PERCENT
+        # clicked to switch between goal percent and hours
+        self.heatmapFrame = Frame(self)
+        self.heatmapScrollbar = Scrollbar(self.heatmapFrame)
+        self.heatmapScrollbar.pack(side = "right", fill = Y)
+        self.heatmap = CalendarHeatmap(self.heatmapFrame,
+                                       metric = PERCENT,
+                                       highColor = MoneyTimer.BAR_LINE_COLOR,
+                                       yscrollcommand = self.heatmapScrollbar.set)
+        self.heatmap.pack(side = "left")
+        self.heatmapScrollbar.config(command = self.heatmap.yview)
+        self.heatmap.bind("<Motion>", self.on_heatmap_motion)
+        self.heatmap.bind("<Button-1>", self.on_heatmap_click)
+        self.heatmapVar = StringVar(self)
+        self.heatmapLabel = Label(self, textvariable = self.heatmapVar)
+        self.heatmap.draw(self.master.get_history())
+      if self.heatmapShown:
+        self.heatmapFrame.pack_forget()
+        self.heatmapLabel.pack_forget()
+        self.heatmapButton.config(relief = GROOVE)
+      else:
+        self.heatmapFrame.pack(side = "top", after = self.chartBar)
+        self.heatmapLabel.pack(side = "top", after = self.heatmapFrame)
+        self.heatmapButton.config(relief = SUNKEN)
+      self.heatmapShown = not self.heatmapShown
+
+    ########
+    # toggle_trend: shows or hides the earnings and hours chart, building its LTTB
+    # pyramids from history the first time
+    def toggle_trend(self):
+      if self.trendChart == None:
+        from heatmap import CalendarHeatmap
+        from trendchart import TrendChart
+        self.trendChart = TrendChart(self,
+                                     width = 54 * CalendarHeatmap.CELL, # as wide as the heatmap
+                                     earningsColor = MoneyTimer.BAR_FILL_COLOR)
+        self.trendChart.set_history(self.master.get_history())
+      if self.trendShown:
+        self.trendChart.pack_forget()
+        self.trendButton.config(relief = GROOVE)
+      else:
+        self.trendChart.pack(side = "top", before = self.scrollbar)
+        self.trendButton.config(relief = SUNKEN)
+      self.trendShown = not self.trendShown
 
+    ########
+    # on_heatmap_motion: names the day under the pointer and its value
+    def on_heatmap_motion(self, event):
+      from heatmap import HOURS
+      day = self.heatmap.day_at(self.heatmap.canvasx(event.x), self.heatmap.canvasy(event.y))
+      if day == None:
+        self.heatmapVar.set("")
+        return
+      rec = self.master.get_history().get(day)
+      if rec == None:
+        self.heatmapVar.set(day.isoformat())
+      elif self.heatmap.metric == HOURS:
+        self.heatmapVar.set("{} {}: {:.1f} hrs".format(day.isoformat(), rec.wday, rec.secSoFar / 3600))
+      else:
+        self.heatmapVar.set("{} {}: {:.1f}%".format(day.isoformat(), rec.wday, rec.percent))
+
+    ########
+    # on_heatmap_click: switches the heatmap between goal percent and hours
+    def on_heatmap_click(self, event):
+      from heatmap import HOURS, PERCENT
+      self.heatmap.metric = HOURS if self.heatmap.metric == PERCENT else PERCENT
+      self.heatmap.draw(self.master.get_history())
+
+    ########
+    # update_today: patches the live row in place when what it shows has changed,
+    # leaving the rest of the text alone
+    def update_today(self):
+      line = history.format_row(self.master.today_row())
+      if line == self.today:
+        return
+      self.text.config(state = NORMAL)
+      self.text.delete("1.0", "2.0")
+      self.text.insert("1.0", line, "today")
       self.text.config(state = DISABLED)
+      self.today = line
+
+    ########
+    # render_span: replaces the lines of the days from start to end (inclusive
+    # (year, mon, day) tuples, None for open-ended) with those in table
+    def render_span(self, table, start, end):
+      a = 0 if end == None else bisect_left(self.keys, -history.date_key(*end))
+      b = len(self.keys) if start == None else bisect_right(self.keys, -history.date_key(*start))
+      if b > a:
+        self.text.delete("{}.0".format(a + 2), "{}.0".format(b + 2))
+        del self.keys[a:b]
+      lo, hi = table.span(start, end)
+      for i in range(lo, hi, MoneyTimer.HistoryWindow.CHUNK_ROWS): # bounded memory per insert
+        rows = list(table.iter_rows(i, min(hi, i + MoneyTimer.HistoryWindow.CHUNK_ROWS)))
+        at = a + i - lo
+        self.text.insert("{}.0".format(at + 2), "".join(map(history.format_row, rows)))
+        self.keys[at:at] = array("l", (-history.date_key(row[0], row[1], row[2]) for row in rows))
 
     def destroy(self):
       self.master.historyOpen = False
+      self.master.historyWindow = None
       super().destroy()
+  # HistoryWindow
+  ################
 
 
   ########
-  # __init__: sets up MoneyTimer class, creates a SetupWindow to get start time
-  def __init__(self, root):
+  # __init__: sets up MoneyTimer class, creates a SetupWindow to get start time;
+  # clock and scheduler may be injected, e.g. for simulations
+  def __init__(self, root, clock = None, scheduler = None):
     Frame.__init__(self, root)
-    self.settings = self.load_settings()
+    self.clock = clock if clock != None else SystemClock()
+    self.scheduler = scheduler if scheduler != None else TkScheduler(self)
+    self.settings = None # see init_settings
     self.paused = False
+    self.nextUpdate = None
     self.settingsOpen = False
     self.historyOpen  = False
+    self.settingsWindow = None
+    self.historyWindow  = None
+    self.settingsVersion = 0
+    self.historyVersion  = 0
+    self.historyChanges  = []
     self.credits = None
-    if self.settings["autoLunchEnabled"]:
-      self.startLunchEvt, self.endLunchEvt = self.make_lunch_events()
-    else:
-      self.startLunchEvt = None
-      self.endLunchEvt   = None
+    self.history = None
+    self.historySince = None
+    self.historyStore = None
+    self.intervalLog = None
+    self.dayStats = None
+    self.columns = None
+    self.historySync = None
+    self.compactor = None
+    self.compactTask = None
+    self.profiler = Profiler(os.path.dirname(os.path.abspath(MoneyTimer.SETTINGS_FILE)))
+    self.startLunchEvt = None
+    self.endLunchEvt   = None
 
     # menubar
     self.menuBar = {}
     self.menuBar["frame"] = Frame(self)
-    self.menuBar["settingsIcon"]   = PhotoImage(file = "settings.gif")
     self.menuBar["settingsButton"] = Button(self.menuBar["frame"],
-                                            image    = self.menuBar["settingsIcon"],
                                             text     = "Settings",
                                             compound = LEFT,
                                             relief   = GROOVE,
                                             command  = self.on_settings_click)
     self.menuBar["settingsButton"].pack(side = "left", fill = Y)
-    self.menuBar["historyIcon"]    = PhotoImage(file = "history.gif")
     self.menuBar["historyButton"]  = Button(self.menuBar["frame"],
-                                            image    = self.menuBar["historyIcon"],
                                             text     = "History",
                                             compound = LEFT,
                                             relief   = GROOVE,
                                             command  = self.on_history_click)
     self.menuBar["historyButton"].pack(side = "right", fill = Y)
-    self.menuBar["stopwatchIcon"] = PhotoImage(file = "stopwatch.gif")
     self.menuBar["stopwatchButton"] = Button(self.menuBar["frame"],
-                                             image   = self.menuBar["stopwatchIcon"],
+                                             text    = "Credits",
                                              relief  = GROOVE,
                                              command = self.on_credits_click)
     self.menuBar["stopwatchButton"].pack(side = "top", fill = BOTH, expand = 1)
@@ -576,6 +862,8 @@ Mateo Zlatar\
     self.bind("<Control-S>", self.on_settings_click)
     self.bind("<Control-h>", self.on_history_click)
     self.bind("<Control-H>", self.on_history_click)
+    self.bind("<Control-p>", self.toggle_profiling)
+    self.bind("<Control-P>", self.toggle_profiling)
     self.focus_set()
 
     # time and pause button
@@ -591,11 +879,8 @@ Mateo Zlatar\
     self.spacerLabel2.pack(side = "left")
     self.pauseButton = Button(self.upperFrame,
                               command = self.toggle_pause)
-    self.pauseButtonVar           = StringVar(self.pauseButton,"Pause")
-    self.pauseButton.pauseImage   = PhotoImage(file = "pause.gif")
-    self.pauseButton.unpauseImage = PhotoImage(file = "unpause.gif")
-    self.pauseButton.config(image = self.pauseButton.pauseImage,
-                            textvariable = self.pauseButtonVar,
+    self.pauseButtonVar = StringVar(self.pauseButton,"Pause")
+    self.pauseButton.config(textvariable = self.pauseButtonVar,
                             compound = LEFT)
     self.pauseButton.pack(side = "right")
     self.upperFrame.pack(side = "top", fill = X)
@@ -622,6 +907,34 @@ Mateo Zlatar\
 
     self.setup()
 
+  ########
+  # init_settings: loads settings and schedules today's lunch events. Nothing needs
+  # settings for the first paint, so main runs this after it, keeping json out of
+  # startup; complete_setup and on_settings_click run it if nobody has yet
+  def init_settings(self):
+    if self.settings != None:
+      return
+    self.settings = self.load_settings()
+    if self.settings["autoLunchEnabled"]:
+      self.startLunchEvt, self.endLunchEvt = self.make_lunch_events()
+
+  ########
+  # get_icon: returns the PhotoImage for an icon file in ASSET_DIR, decoding it on first use
+  def get_icon(self, fileName):
+    return ImageCache.for_widget(self).get(os.path.join(MoneyTimer.ASSET_DIR, fileName))
+
+  ########
+  # load_icons: decorates buttons with their icons; icons are not needed for the
+  # first paint, so this is left to the caller to run once the window is up
+  def load_icons(self):
+    self.menuBar["settingsButton"].config(image = self.get_icon("settings.gif"))
+    self.menuBar["historyButton"].config(image = self.get_icon("history.gif"))
+    self.menuBar["stopwatchButton"].config(image = self.get_icon("stopwatch.gif"))
+    if self.paused:
+      self.pauseButton.config(image = self.get_icon("unpause.gif"))
+    else:
+      self.pauseButton.config(image = self.get_icon("pause.gif"))
+
   ########
   # setup: creates a SetupWindow to input start time
   def setup(self):
@@ -630,16 +943,15 @@ Mateo Zlatar\
   ########
   # complete_setup: completes setup and begins updates
   def complete_setup(self, secSoFar):
+    self.init_settings()
     self.secSoFar = secSoFar
-    currTime = localtime()
+    currTime = self.clock.localtime()
     self.startDay = MoneyTimer.DAYS[currTime.tm_wday]
     self.startDate = [currTime.tm_year, currTime.tm_mon, currTime.tm_mday]
     self.todaysGoal = self.settings[self.startDay]
-
-    # has to be done after startDay and startDate are initialized
-    self.history = self.load_history()
-    for entry in self.history:
-      entry["percent"] = (entry["percent"] * 100 // 1) / 100
+    self.dayRates = self.make_day_rates()
+    self.mark_interval(True, -secSoFar) # work began secSoFar ago
+    self.compactTask = self.scheduler.after(MoneyTimer.COMPACT_DELAY, self.compact_history)
 
     self.update()
     del self.setupWindow
@@ -660,23 +972,39 @@ Mateo Zlatar\
   # toggle_pause: toggles whether time is tracked or not
   def toggle_pause(self):
     if self.paused:
-      self.pauseButton.config(image = self.pauseButton.pauseImage)
+      self.pauseButton.config(image = self.get_icon("pause.gif"))
       self.pauseButtonVar.set("Pause")
       self.paused = False
+      self.mark_interval(True)
+      if self.nextUpdate != None: # update reschedules itself; never run two chains
+        self.scheduler.after_cancel(self.nextUpdate)
       self.update()
+    elif self.nextUpdate != None: # nothing to pause until setup has started updates
+      self.scheduler.after_cancel(self.nextUpdate)
+      self.nextUpdate = None
+      self.pauseButton.config(image = self.get_icon("unpause.gif"))
+      self.pauseButtonVar.set("Unpause")
+      self.paused = True
+      self.mark_interval(False)
+
+  ########
+  # mark_interval: begins (working = True) or ends a work interval in the interval log,
+  # stamped with wall-clock and monotonic time offset by the given seconds
+  def mark_interval(self, working, offset = 0.0):
+    wall = self.clock.time() + offset
+    mono = self.clock.monotonic() + offset
+    if self.intervalLog == None:
+      import intervals
+      self.intervalLog = intervals.IntervalLog(MoneyTimer.INTERVALS_FILE)
+    if working:
+      self.intervalLog.begin(wall, mono)
     else:
-      try:
-        self.after_cancel(self.nextUpdate)
-        self.pauseButton.config(image = self.pauseButton.unpauseImage)
-        self.pauseButtonVar.set("Unpause")
-        self.paused = True
-      except Exception:
-        pass
+      self.intervalLog.end(wall, mono)
 
   ########
   # update: updates secSoFar and GUI elements
   def update(self):
-    self.secSoFar += MoneyTimer.AFTER_TIME_SEC
+    self.secSoFar += self.AFTER_TIME_SEC
 
     # calculate hour, min, sec, and earnings; put times in strings
     displayHr  = int(self.secSoFar // 3600)
@@ -684,7 +1012,7 @@ Mateo Zlatar\
     displayMin = str(displayMin) if displayMin >= 10 else "0" + str(displayMin)
     displaySec = int(self.secSoFar %  60)
     displaySec = str(displaySec) if displaySec >= 10 else "0" + str(displaySec)
-    earnings = self.secSoFar / 3600 * self.settings["hourlyRate"] * MoneyTimer.PERCENT_EARN
+    earnings = self.dayRates.earnings(self.secSoFar)
     
     # update text
     labelStr = "{}:{}:{}\n${:.2f}".format(displayHr, displayMin, displaySec, earnings)
@@ -707,37 +1035,47 @@ Mateo Zlatar\
                               MoneyTimer.BAR_WIDTH, MoneyTimer.BAR_HEIGHT / 2 + 3)
     self.progressBar.itemconfig(self.progressBarPct,
                                 text = "{:.0f}%".format(pct * 100))
+    if self.historyOpen:
+      self.historyWindow.update_today()
+
+    self.nextUpdate = self.scheduler.after(self.AFTER_TIME, self.update)
 
-    self.nextUpdate = self.after(MoneyTimer.AFTER_TIME, self.update)
+  ########
+  # make_day_rates: compiles today's rate schedule so update only has to look up
+  # the current segment; keys missing from the settings take their defaults
+  def make_day_rates(self):
+    schedule = dict(MoneyTimer.DEFAULT_SETTINGS["rateSchedule"], **self.settings["rateSchedule"])
+    return rates.DayRates(self.settings["hourlyRate"], self.todaysGoal, self.startDay, schedule)
 
   ########
   # make_lunch_events: sets up auto pause/unpause events if needed
   def make_lunch_events(self):
-    currTime = localtime()
+    currTime = self.clock.localtime()
     ctSec = currTime.tm_hour * 3600 + currTime.tm_min * 60 + currTime.tm_sec
     breakStart = self.settings["autoLunchStartTime"][0] * 3600 + self.settings["autoLunchStartTime"][1] * 60
     breakEnd   = self.settings["autoLunchStopTime"][0]  * 3600 + self.settings["autoLunchStopTime"][1] * 60
 
     # make events if they haven't occured yet today
     if breakStart - ctSec > 0:
-      startAfterEvt = self.after(1000 * (breakStart - ctSec), self.auto_pause)
+      startAfterEvt = self.scheduler.after(1000 * (breakStart - ctSec), self.auto_pause)
     else:
       startAfterEvt = None
     if breakEnd - ctSec > 0:
-      endAfterEvt   = self.after(1000 * (breakEnd - ctSec), self.auto_unpause)
+      endAfterEvt   = self.scheduler.after(1000 * (breakEnd - ctSec), self.auto_unpause)
     else:
       endAfterEvt = None
 
     return startAfterEvt, endAfterEvt
 
   ########
-  # on_settings_click: opens an SettingsWindow for configuration
+  # on_settings_click: opens the SettingsWindow for configuration, building it on first use
   def on_settings_click(self, *args):
-    if not self.settingsOpen:
+    self.init_settings()
+    if self.settingsWindow == None:
       self.settingsWindow = MoneyTimer.SettingsWindow(self)
-      self.settingsOpen = True
     else:
-      self.settingsWindow.lift()
+      self.settingsWindow.show()
+    self.settingsOpen = True
 
   ########
   # configure: called from SettingsWindow; commits configuration
@@ -745,17 +1083,23 @@ Mateo Zlatar\
     for key in config.keys():
       self.settings[key] = config[key]
     self.todaysGoal = self.settings[self.startDay]
+    self.dayRates = self.make_day_rates()
+    # the old events go either way, or a disabled lunch break would still pause
+    if self.startLunchEvt != None:
+      self.scheduler.after_cancel(self.startLunchEvt)
+    if self.endLunchEvt != None:
+      self.scheduler.after_cancel(self.endLunchEvt)
     if self.settings["autoLunchEnabled"]:
-      if self.startLunchEvt != None:
-        self.after_cancel(self.startLunchEvt)
-      if self.endLunchEvt != None:
-        self.after_cancel(self.endLunchEvt)
       self.startLunchEvt, self.endLunchEvt = self.make_lunch_events()
-    del self.settingsWindow
+    else:
+      self.startLunchEvt = None
+      self.endLunchEvt   = None
+    self.settingsVersion += 1
 
   ########
   # load_settings: gets settings from file, else to default
   def load_settings(self):
+    import json
     try:
       f = open(MoneyTimer.SETTINGS_FILE, "r")
       s = f.read()
@@ -773,6 +1117,9 @@ Mateo Zlatar\
   ########
   # save_settings: saves settings to file
   def save_settings(self):
+    if self.settings == None: # never loaded, so nothing changed
+      return
+    import json
     s = json.dumps(self.settings)
 
     f = open(MoneyTimer.SETTINGS_FILE, "w")
@@ -780,79 +1127,280 @@ Mateo Zlatar\
     f.close()
 
   ########
-  # on_history_click: opens a HistoryWindow to display past recorded time/earnings
+  # on_history_click: opens the HistoryWindow to display past recorded time/earnings,
+  # building it on first use
   def on_history_click(self, *args):
-    if not self.historyOpen:
+    if self.historyWindow == None:
       self.historyWindow = MoneyTimer.HistoryWindow(self)
-      self.historyOpen = True
     else:
-      self.historyWindow.lift()
+      self.historyWindow.show()
+    self.historyOpen = True
+
+  ########
+  # toggle_profiling: starts or stops a profiling capture; reports are written on stop
+  def toggle_profiling(self, *args):
+    self.profiler.toggle()
+    if self.profiler.active:
+      self.master.title("Money Timer [profiling]")
+    else:
+      self.master.title("Money Timer")
+
+  ########
+  # get_history: returns history, loading it on first use; has to be called
+  # after startDate is initialized. Given a (year, mon, day), only the days on
+  # or after it are needed, and a store with recent() (the block file) reads
+  # just those; older days are read once a caller needs all of history
+  def get_history(self, since = None):
+    if self.history != None:
+      if self.historySince == None or (since != None and since >= self.historySince):
+        return self.history
+    if not hasattr(self.get_history_store(), "recent"):
+      since = None
+    loaded = self.history
+    self.history = self.load_history(since)
+    self.historySince = since
+    if loaded != None: # keep today as saved; loading leaves it out
+      today = loaded.get(tuple(self.startDate))
+      if today != None:
+        self.history.put(today)
+    self.note_history_change()
+    return self.history
+
+  ########
+  # recent_history_start: the first day of the history read at startup
+  def recent_history_start(self):
+    start = date(*self.startDate) - timedelta(days = MoneyTimer.RECENT_HISTORY_DAYS)
+    return (start.year, start.month, start.day)
+
+  ########
+  # note_history_change: bumps historyVersion, remembering which days changed;
+  # start and end are inclusive (year, mon, day) tuples, None for open-ended
+  def note_history_change(self, start = None, end = None):
+    self.historyVersion += 1
+    self.historyChanges.append((self.historyVersion, start, end))
+    del self.historyChanges[:-MoneyTimer.HISTORY_CHANGES_KEPT]
+
+  ########
+  # history_changes_since: gets the (start, end) spans changed after a historyVersion,
+  # oldest first, or None if they are no longer all remembered
+  def history_changes_since(self, version):
+    if version == None:
+      return None
+    if version == self.historyVersion:
+      return []
+    if len(self.historyChanges) == 0 or self.historyChanges[0][0] > version + 1:
+      return None
+    return [(start, end) for v, start, end in self.historyChanges if v > version]
+
+  ########
+  # get_history_store: opens the history store named by the historyBackend setting;
+  # a new SQLite database or block file starts out with the contents of the JSON history
+  def get_history_store(self):
+    if self.historyStore == None:
+      backend = self.settings["historyBackend"]
+      if backend == "sqlite":
+        from historydb import SqliteHistoryStore
+        self.historyStore = SqliteHistoryStore(MoneyTimer.HISTORY_DB,
+                                               importFrom = MoneyTimer.HISTORY_FILE)
+      elif backend in ("gzip", "lzma"):
+        from historyblocks import BlockHistoryStore
+        self.historyStore = BlockHistoryStore(MoneyTimer.HISTORY_BLOCKS, backend,
+                                              importFrom = MoneyTimer.HISTORY_FILE)
+      else:
+        self.historyStore = history.JsonHistoryStore(MoneyTimer.HISTORY_FILE)
+    return self.historyStore
+
+  ########
+  # get_day_stats: returns the typical-day statistics, loading them on first use;
+  # without a stats file they are built from history once setup has given a date
+  def get_day_stats(self):
+    if self.dayStats == None:
+      import sketches
+      stats = sketches.DayStats.load(MoneyTimer.STATS_FILE)
+      if not hasattr(self, "startDate"):
+        return stats if stats != None else sketches.DayStats()
+      if stats == None:
+        stats = sketches.DayStats.from_history(self.get_history())
+      else:
+        since = self.recent_history_start()
+        if stats.pending != None:
+          since = min(since, tuple(stats.pending["date"]))
+        stats.refresh_pending(self.get_history(since))
+      self.dayStats = stats
+    return self.dayStats
 
   ########
-  # load_history: loads history from file
-  def load_history(self):
+  # get_history_sync: returns the HistorySync pushing to the syncUrl setting, starting
+  # it on first use, or None if sync is off; a new outbox is seeded with all of history
+  # once, after which only changes are pushed. The sync thread does the seeding, from
+  # a copy of history, as it only knows whether the outbox is new once it has loaded it
+  def get_history_sync(self):
+    if self.historySync == None and self.settings["syncUrl"]:
+      import sync
+      try:
+        self.historySync = sync.HistorySync(self.settings["syncUrl"], MoneyTimer.SYNC_FILE)
+      except ValueError:
+        return None
+      self.historySync.seed(self.get_history().between())
+    return self.historySync
+
+  ########
+  # load_history: loads history from the store into a HistoryTable, leaving out the
+  # current day, or only the days on or after since from a store with recent(); with
+  # the JSON store, bad records are quarantined next to the file instead of
+  # discarding the whole history
+  def load_history(self, since = None):
     try:
-      f = open(MoneyTimer.HISTORY_FILE, "r")
-      s = f.read()
-      f.close()
-      temp = json.loads(s)
-      currTime = localtime()
-      toDel = None
-      for i in range(len(temp)): # if current day in file, forget it
-        if (temp[i]["year"] == currTime.tm_year and
-            temp[i]["mon"]  == currTime.tm_mon and
-            temp[i]["day"]  == currTime.tm_mday):
-          toDel = i
-          continue
-        for key in MoneyTimer.HISTORY_FORMAT.keys(): # validate entries
-          if not isinstance(temp[i][key], MoneyTimer.HISTORY_FORMAT[key]):
-            return []
-      if toDel != None:
-        del temp[toDel]
-      return temp
+      store = self.get_history_store()
+      if since == None:
+        return store.load(tuple(self.startDate))
+      table = store.recent(since)
+      i = table.find(self.startDate)
+      if i >= 0:
+        del table[i]
+      return table
     except Exception:
-      return []
+      return history.HistoryTable()
 
   ########
-  # save_history: saves history to file
-  def save_history(self):
-    earnings = self.secSoFar / 3600 * self.settings["hourlyRate"] * MoneyTimer.PERCENT_EARN
+  # today_row: the current day so far as a (year, mon, day, wday, secSoFar, earnings,
+  # percent) tuple, rounded as it would be saved
+  def today_row(self):
+    earnings = self.dayRates.earnings(self.secSoFar)
     if self.todaysGoal != 0:
       pct = self.secSoFar / (self.todaysGoal * 3600)
     else:
       pct = 1.0
-    currentDayStats = {"year": self.startDate[0],
-                       "mon" : self.startDate[1],
-                       "day" : self.startDate[2],
-                       "wday": self.startDay,
-                       "secSoFar": self.secSoFar,
-                       "earnings": (earnings * 100 // 1) / 100, # clip to cents
-                       "percent" : (pct * 10000 // 1) / 100 } # clip to 2 decimals
-    self.history.insert(0, currentDayStats)
-    s = json.dumps(self.history)
-
-    f = open(MoneyTimer.HISTORY_FILE, "w")
-    f.write(s)
-    f.close()
+    return (self.startDate[0], self.startDate[1], self.startDate[2], self.startDay,
+            self.secSoFar,
+            (earnings * 100 // 1) / 100, # clip to cents
+            (pct * 10000 // 1) / 100)    # clip to 2 decimals
+
+  ########
+  # save_history: records the current day in the history store
+  def save_history(self):
+    currentDayStats = dict(zip(history.FIELDS, self.today_row()))
+    currentDayStats["bands"] = self.dayRates.breakdown(self.secSoFar)
+    store = self.get_history_store()
+    if self.history == None and hasattr(store, "recent"): # the recent blocks will do
+      self.get_history(self.recent_history_start())
+    self.history = store.save_day(currentDayStats, self.history)
+    self.note_history_change(tuple(self.startDate), tuple(self.startDate))
+    stats = self.get_day_stats()
+    stats.add_day(currentDayStats)
+    stats.save(MoneyTimer.STATS_FILE) # only written once a new day changes the sketches
+    self.sync_columns(currentDayStats)
+    if self.get_history_sync() != None:
+      self.historySync.note_change(self.startDate, self.startDate, [currentDayStats])
+
+  ########
+  # sync_columns: if the columnsExport setting is on, appends a saved day to the
+  # .npy history columns in COLUMNS_DIR, exporting all of history instead on first
+  # use, when the day cannot simply be appended, or when the columns' row count no
+  # longer matches the days in history; the columns are only a copy, so failing to
+  # write them never stops a save
+  def sync_columns(self, rec = None):
+    if not self.settings["columnsExport"]:
+      return
+    try:
+      import npycolumns
+      if self.columns == None:
+        directory = MoneyTimer.COLUMNS_DIR
+        if directory == None:
+          directory = os.path.splitext(MoneyTimer.HISTORY_FILE)[0] + ".columns"
+        self.columns = npycolumns.NpyColumns(directory)
+      table = self.get_history()
+      if rec != None and self.columns.rows > 0 and self.columns.append_day(rec) and \
+         self.columns.rows == npycolumns.count_days(table):
+        return
+      if rec != None and table.get((rec["year"], rec["mon"], rec["day"])) == None:
+        table.put(rec)
+      self.columns.export(table)
+    except OSError:
+      self.columns = None
+
+  ########
+  # compact_history: applies the retention setting to a copy of history a few periods
+  # at a time, rescheduling itself until done; the copy replaces history and the store
+  # is rewritten once at the end. Does nothing unless the setting keeps some tier for a
+  # limited time
+  def compact_history(self):
+    if self.compactor == None:
+      import retention
+      self.get_history_sync() # picks up changes a previous run could not push
+      policy = dict(retention.DEFAULT_POLICY, **self.settings["retention"])
+      if policy["dailyDays"] <= 0 and policy["weeklyDays"] <= 0:
+        self.compactTask = None
+        return
+      # a copy, so history stays whole if the app closes part-way
+      self.compactor = retention.Compactor(self.get_history().between(), date(*self.startDate),
+                                           policy["dailyDays"], policy["weeklyDays"])
+    if self.compactor.step():
+      self.compactTask = self.scheduler.after(MoneyTimer.COMPACT_INTERVAL, self.compact_history)
+      return
+    self.compactTask = None
+    if self.compactor.changed:
+      try:
+        self.backup_history()
+      except OSError: # never compact without a backup; the next run tries again
+        return
+      table = self.compactor.table
+      today = self.history.get(tuple(self.startDate)) # saved since the copy was taken
+      if today != None:
+        table.put(today)
+      self.history = table
+      self.get_history_store().rewrite(self.history)
+      self.note_history_change()
+      self.sync_columns()
+      if self.get_history_sync() != None:
+        start, end = self.compactor.start, self.compactor.end
+        self.historySync.note_change(start, end, self.history.between(
+          (start.year, start.month, start.day), (end.year, end.month, end.day)).iter_dicts())
 
   ########
-  # on_credits_click: displays credits
+  # backup_history: before compaction rewrites history, saves the history as the
+  # store still has it, uncompacted, as a plain JSON history to
+  # <HISTORY_FILE stem>.pre-compaction.<YYYYmmdd-HHMMSS>.json; each compaction
+  # gets its own file, so earlier backups are never overwritten
+  def backup_history(self):
+    stamp = strftime("%Y%m%d-%H%M%S", self.clock.localtime())
+    path = "{}.pre-compaction.{}.json".format(os.path.splitext(MoneyTimer.HISTORY_FILE)[0], stamp)
+    history.write_history_file(path + ".tmp", self.get_history_store().load())
+    os.replace(path + ".tmp", path)
+
+  ########
+  # on_credits_click: displays credits; the window is built once, and closing it
+  # only hides it
   def on_credits_click(self):
-    if self.credits != None:
-      self.credits.destroy()
-    self.credits = Toplevel(self)
-    self.credits.title("Credits [Money Timer]")
-    self.credits.text = Text(self.credits,
-                             width = 50)
-    self.credits.text.insert(END, MoneyTimer.CREDITS_TEXT)
-    self.credits.text.config(state = DISABLED)
-    self.credits.text.pack(side = "top", fill = BOTH)
+    if self.credits == None:
+      self.credits = Toplevel(self)
+      self.credits.title("Credits [Money Timer]")
+      self.credits.protocol("WM_DELETE_WINDOW", self.credits.withdraw)
+      self.credits.text = Text(self.credits,
+                               width = 50)
+      self.credits.text.insert(END, MoneyTimer.CREDITS_TEXT)
+      self.credits.text.config(state = DISABLED)
+      self.credits.text.pack(side = "top", fill = BOTH)
+    else:
+      self.credits.deiconify()
+    self.credits.lift()
 
   ########
   # destroy: modified to save configurations and recorded time/earnings
   def destroy(self):
     self.save_settings()
+    if self.compactTask != None: # the partly compacted copy is dropped
+      self.scheduler.after_cancel(self.compactTask)
+      self.compactTask = None
+      self.compactor = None
     self.save_history()
+    self.mark_interval(False)
+    if self.historyStore != None:
+      self.historyStore.close()
+      self.historyStore = None
+    if self.historySync != None:
+      self.historySync.close()
+      self.historySync = None
     super().destroy()
 # MoneyTimer
 ################
@@ -861,14 +1409,31 @@ Mateo Zlatar\
 ########
 # main: if you need a description for this, I cannot help you
 def main():
+  startup = StartupTimer()
   root = Tk()
   root.title("Money Timer")
   root.lift()
-  cf = ClockFace(root, size = 100, smooth = True, bg = PhotoImage(file = "art.gif"), handcolor = "#000000", markcolor = "#000000")
+  startup.mark("tk")
+  cf = ClockFace(root, size = 100, smooth = True, handcolor = "#000000", markcolor = "#000000")
   cf.pack(side = "left")
+  startup.mark("clock face")
   mt = MoneyTimer(root)
   mt.pack(side = "left")
-
+  startup.mark("timer")
+  root.update() # first paint, before decoding anything non-critical
+  startup.mark("first paint")
+  mt.init_settings()
+  startup.mark("settings")
+  mt.load_icons()
+  cf.config(bg = ImageCache.for_widget(root).get(os.path.join(MoneyTimer.ASSET_DIR, "art.gif")))
+  startup.mark("deferred assets")
+  if StartupTimer.enabled_by_env():
+    print(startup.report())
+
+  if Profiler.enabled_by_env():
+    mt.profiler.start()
   root.mainloop()
+  mt.profiler.stop()
 
-main()
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,195 @@
+################################
+# npycolumns.py
+# ------------------------------
+# History kept as one .npy file per column (dates, seconds, earnings,
+# percent), oldest day first, for analysis scripts to open with
+# np.load(path, mmap_mode="r"): no JSON parsing and no copying. The files
+# are written directly in the NPY 1.0 format, so numpy is not needed here.
+# Each header is padded to a fixed size, which lets a new day be appended
+# by writing its values at the end of each file and then patching the row
+# count in the header in place.
+################################
+
+# imports
+import ast
+import os
+import struct
+import sys
+from array import array
+from datetime import date
+
+from history import DAYS
+
+MAGIC = b"\x93NUMPY\x01\x00"
+HEADER_SIZE = 128 # bytes before the data, a multiple of 64 as numpy prefers
+EPOCH = date(1970, 1, 1).toordinal()
+
+# column file name -> (NPY dtype, array typecode)
+COLUMNS = {"dates"   : ("<M8[D]", "q"), # datetime64 days since 1970-01-01
+           "seconds" : ("<f8", "d"),
+           "earnings": ("<f8", "d"),
+           "percent" : ("<f8", "d")}
+
+
+########
+# Makes the header of a one-dimensional NPY file.
+#   Params:
+#     descr : NPY dtype string.
+#     rows  : Number of rows.
+#   Returns: HEADER_SIZE bytes.
+def npy_header(descr, rows):
+  text = "{{'descr': '{}', 'fortran_order': False, 'shape': ({},), }}".format(descr, rows)
+  text = text.ljust(HEADER_SIZE - len(MAGIC) - 2 - 1) + "\n"
+  return MAGIC + struct.pack("<H", len(text)) + text.encode("latin1")
+
+########
+# Reads the header of an NPY file.
+#   Params:
+#     f : File open for binary reading, at the start.
+#   Returns: (descr, rows, data offset).
+def read_npy_header(f):
+  if f.read(len(MAGIC)) != MAGIC:
+    raise ValueError("not an NPY 1.0 file")
+  length = struct.unpack("<H", f.read(2))[0]
+  header = ast.literal_eval(f.read(length).decode("latin1"))
+  if header["fortran_order"] or len(header["shape"]) != 1:
+    raise ValueError("not a one-dimensional NPY file")
+  return header["descr"], header["shape"][0], len(MAGIC) + 2 + length
+
+########
+# Gets a record's column values, or None for weekly/monthly summaries.
+def _values(rec):
+  if rec["wday"] not in DAYS:
+    return None
+  return {"dates"   : date(rec["year"], rec["mon"], rec["day"]).toordinal() - EPOCH,
+          "seconds" : rec["secSoFar"],
+          "earnings": rec["earnings"],
+          "percent" : rec["percent"]}
+
+########
+# Puts an array in the files' byte order, in place.
+def _little_endian(col):
+  if sys.byteorder != "little":
+    col.byteswap()
+  return col
+
+
+########
+# Counts the records export writes out of a table: the daily ones.
+#   Params:
+#     table : HistoryTable.
+def count_days(table):
+  days = set(DAYS)
+  return sum(1 for row in table.iter_rows() if row[3] in days)
+
+
+################
+# NpyColumns: a directory of column files mirroring the daily records of
+# history. Weekly and monthly summaries are left out.
+#   Members:
+#     directory : where the .npy files are
+#     rows      : number of days in the files
+#     lastDate  : dates value of the newest day, or None
+#   Methods:
+#     path      : path of a column file
+#     export    : rewrites all files from records
+#     append_day: adds or replaces the newest day in place
+class NpyColumns:
+
+  ########
+  # Opens a column directory, creating it if needed. Files left uneven by
+  # an interrupted append are cut back to the rows all of them have.
+  #   Params:
+  #     directory : Directory of the column files.
+  def __init__(self, directory):
+    self.directory = directory
+    self.rows = 0
+    self.lastDate = None
+    os.makedirs(directory, exist_ok = True)
+    if all(os.path.exists(self.path(name)) for name in COLUMNS):
+      try:
+        self._open()
+      except (OSError, ValueError, KeyError, SyntaxError):
+        self.rows = 0
+        self.lastDate = None
+
+  def path(self, name):
+    return os.path.join(self.directory, name + ".npy")
+
+  def _open(self):
+    counts = {}
+    for name, (descr, typecode) in COLUMNS.items():
+      with open(self.path(name), "rb") as f:
+        fileDescr, rows, offset = read_npy_header(f)
+      if fileDescr != descr or offset != HEADER_SIZE:
+        raise ValueError("{} is not a column written here".format(self.path(name)))
+      counts[name] = min(rows, (os.path.getsize(self.path(name)) - HEADER_SIZE) // array(typecode).itemsize)
+    self.rows = min(counts.values())
+    for name in COLUMNS:
+      if counts[name] != self.rows or os.path.getsize(self.path(name)) != self._size(name, self.rows):
+        with open(self.path(name), "r+b") as f:
+          f.truncate(self._size(name, self.rows))
+          f.seek(0)
+          f.write(npy_header(COLUMNS[name][0], self.rows))
+    self.lastDate = self._read_value("dates", self.rows - 1) if self.rows > 0 else None
+
+  def _size(self, name, rows):
+    return HEADER_SIZE + rows * array(COLUMNS[name][1]).itemsize
+
+  def _read_value(self, name, i):
+    col = array(COLUMNS[name][1])
+    with open(self.path(name), "rb") as f:
+      f.seek(HEADER_SIZE + i * col.itemsize)
+      col.frombytes(f.read(col.itemsize))
+    return _little_endian(col)[0]
+
+  ########
+  # Rewrites every column from records, replacing each file only once its
+  # new version is complete.
+  #   Params:
+  #     records : Iterable of HistoryRecords or dicts, in any order.
+  def export(self, records):
+    cols = {name: array(typecode) for name, (descr, typecode) in COLUMNS.items()}
+    values = [v for v in map(_values, records) if v != None]
+    values.sort(key = lambda v: v["dates"])
+    for v in values:
+      for name, col in cols.items():
+        col.append(v[name])
+    for name, col in cols.items():
+      _little_endian(col)
+      tmpPath = self.path(name) + ".tmp"
+      with open(tmpPath, "wb") as f:
+        f.write(npy_header(COLUMNS[name][0], len(values)))
+        col.tofile(f)
+      os.replace(tmpPath, self.path(name))
+    self.rows = len(values)
+    self.lastDate = values[-1]["dates"] if values else None
+
+  ########
+  # Records a saved day. The newest day is overwritten if it is the same
+  # day again, a newer day is appended, and an older one (only possible if
+  # another process saved it) is left for the next export.
+  #   Params:
+  #     rec : HistoryRecord or dict in HISTORY_FORMAT.
+  #   Returns: False if the day was older than the newest one and not written.
+  def append_day(self, rec):
+    v = _values(rec)
+    if v == None:
+      return True
+    if self.lastDate != None and v["dates"] < self.lastDate:
+      return False
+    i = self.rows - 1 if v["dates"] == self.lastDate else self.rows
+    rows = i + 1
+    for name, (descr, typecode) in COLUMNS.items():
+      col = _little_endian(array(typecode, [v[name]]))
+      mode = "r+b" if os.path.exists(self.path(name)) else "w+b"
+      with open(self.path(name), mode) as f:
+        f.seek(HEADER_SIZE + i * col.itemsize)
+        col.tofile(f)
+        f.seek(0)
+        f.write(npy_header(descr, rows)) # the row only counts once the header says so
+    self.rows = rows
+    self.lastDate = v["dates"]
+    return True
+# NpyColumns
+################
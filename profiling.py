@@ -0,0 +1,153 @@
+################################
+# profiling.py
+# ------------------------------
+# On-demand cProfile and tracemalloc capture for Money Timer, plus a
+# phase timer for startup. Nothing is imported or hooked until a capture
+# is started, so an idle Profiler costs nothing.
+################################
+
+# imports
+import os
+from time import perf_counter, strftime
+
+
+################
+# Profiler: starts/stops cProfile and tracemalloc sampling and writes
+# timestamped reports to a given directory.
+#   Class members:
+#     ENV_VAR         : environment variable that enables profiling at startup
+#     FILE_PREFIX     : prefix for all written report files
+#     TOP_FUNCTIONS   : number of functions listed in the text stats report
+#     TOP_ALLOCATIONS : number of allocation sites listed in the allocation report
+#     TRACE_FRAMES    : number of frames tracemalloc stores per allocation
+#   Members:
+#     outDir : directory reports are written to
+#     active : True while a capture is running
+#   Methods:
+#     enabled_by_env : checks ENV_VAR
+#     start          : begins a capture
+#     stop           : ends a capture and writes reports
+#     toggle         : starts or stops, whichever applies
+class Profiler:
+
+  ENV_VAR = "MONEY_TIMER_PROFILE"
+  FILE_PREFIX = "money_timer_profile"
+  TOP_FUNCTIONS = 40
+  TOP_ALLOCATIONS = 25
+  TRACE_FRAMES = 5
+
+  ########
+  # Sets up an inactive profiler.
+  #   Params:
+  #     outDir : Directory reports are written to.
+  def __init__(self, outDir = "."):
+    self.outDir = outDir
+    self.active = False
+    self._profile = None
+    self._startedTracemalloc = False
+
+  ########
+  # Checks whether profiling was requested through the environment.
+  #   Returns: True if ENV_VAR is set to a non-empty value other than "0".
+  @staticmethod
+  def enabled_by_env():
+    return os.environ.get(Profiler.ENV_VAR, "") not in ("", "0")
+
+  ########
+  # Begins a capture. Does nothing if one is already running.
+  def start(self):
+    if self.active:
+      return
+    import cProfile
+    import tracemalloc
+
+    self._startedTracemalloc = not tracemalloc.is_tracing()
+    if self._startedTracemalloc:
+      tracemalloc.start(Profiler.TRACE_FRAMES)
+    self._profile = cProfile.Profile()
+    self._profile.enable()
+    self.active = True
+
+  ########
+  # Ends a capture and writes the reports.
+  #   Returns: List of written file paths, empty if no capture was running.
+  def stop(self):
+    if not self.active:
+      return []
+    import pstats
+    import tracemalloc
+
+    self._profile.disable()
+    snapshot = tracemalloc.take_snapshot()
+    if self._startedTracemalloc:
+      tracemalloc.stop()
+    self.active = False
+
+    base = os.path.join(self.outDir,
+                        "{}_{}".format(Profiler.FILE_PREFIX, strftime("%Y%m%d-%H%M%S")))
+    paths = [base + ".prof", base + "_stats.txt", base + "_alloc.txt"]
+
+    self._profile.dump_stats(paths[0])
+    with open(paths[1], "w") as f:
+      stats = pstats.Stats(self._profile, stream = f)
+      stats.sort_stats("cumulative").print_stats(Profiler.TOP_FUNCTIONS)
+    with open(paths[2], "w") as f:
+      snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+      for stat in snapshot.statistics("lineno")[:Profiler.TOP_ALLOCATIONS]:
+        f.write("{}\n".format(stat))
+
+    self._profile = None
+    return paths
+
+  ########
+  # Starts a capture if none is running, otherwise stops it.
+  #   Returns: Written file paths when stopping, else empty list.
+  def toggle(self, *args):
+    if self.active:
+      return self.stop()
+    self.start()
+    return []
+# Profiler
+################
+
+
+################
+# StartupTimer: records how long each startup phase took.
+#   Class members:
+#     ENV_VAR : environment variable that asks for the report to be printed
+#   Members:
+#     phases : list of (name, seconds) in the order they were marked
+#   Methods:
+#     enabled_by_env : checks ENV_VAR
+#     mark           : ends the current phase under the given name
+#     total          : seconds since creation up to the last mark
+#     report         : formatted breakdown
+class StartupTimer:
+
+  ENV_VAR = "MONEY_TIMER_STARTUP_REPORT"
+
+  def __init__(self):
+    self.phases = []
+    self._start = perf_counter()
+    self._last = self._start
+
+  @staticmethod
+  def enabled_by_env():
+    return os.environ.get(StartupTimer.ENV_VAR, "") not in ("", "0")
+
+  def mark(self, name):
+    now = perf_counter()
+    self.phases.append((name, now - self._last))
+    self._last = now
+
+  def total(self):
+    return self._last - self._start
+
+  def report(self):
+    lines = ["startup phases:"]
+    for name, sec in self.phases:
+      lines.append("  {:<18}{:>8.1f} ms".format(name, sec * 1000))
+    lines.append("  {:<18}{:>8.1f} ms".format("total", self.total() * 1000))
+    return "\n".join(lines)
+# StartupTimer
+################
@@ -0,0 +1,136 @@
+################################
+# rates.py
+# ------------------------------
+# Piecewise earnings schedules. A day's schedule (base or weekend rate,
+# overtime past the day's goal, take-home brackets on the day's gross) is
+# compiled once into breakpoints carrying cumulative earnings, so the
+# earnings at any moment are one bisect and one multiply-add away.
+################################
+
+# imports
+from array import array
+from bisect import bisect_right
+
+# schedule keys and the values used when one is missing
+NEUTRAL_SCHEDULE = {"overtimeMultiplier": 1.0,     # applied to time past the day's goal
+                    "weekendMultiplier" : 1.0,     # applied all day on weekendDays
+                    "weekendDays"       : [],
+                    "takeHome"          : [[0.0, 1.0]]} # [gross $ that day, fraction kept above it]
+
+
+################
+# DayRates: one day's rate schedule compiled into segments. Segment i starts
+# at starts[i] seconds worked, with gross[i]/net[i] earned before it, and
+# pays rates[i] $/hr gross of which keeps[i] is taken home.
+#   Members:
+#     starts, gross, net, rates, keeps : per-segment arrays
+#     bands                            : per-segment band name
+#   Methods:
+#     earnings    : take-home pay after a number of seconds
+#     gross_pay   : pay before take-home brackets after a number of seconds
+#     breakdown   : time and take-home pay per band after a number of seconds
+class DayRates:
+
+  ########
+  # Compiles the schedule for a day.
+  #   Params:
+  #     hourlyRate : Base $/hr.
+  #     goalHours  : The day's goal; time past it is overtime. 0 means no overtime.
+  #     wday       : Weekday name, e.g. "Sat".
+  #     schedule   : Dict with the keys of NEUTRAL_SCHEDULE; missing keys are neutral.
+  def __init__(self, hourlyRate, goalHours, wday, schedule = None):
+    schedule = dict(NEUTRAL_SCHEDULE, **(schedule or {}))
+
+    # time bands, in seconds worked
+    if wday in schedule["weekendDays"]:
+      base, rate = "weekend", hourlyRate * schedule["weekendMultiplier"]
+    else:
+      base, rate = "regular", hourlyRate
+    timeBands = [(0.0, base, rate)]
+    if goalHours > 0:
+      timeBands.append((goalHours * 3600, "overtime", rate * schedule["overtimeMultiplier"]))
+
+    # take-home brackets, in gross dollars; untaxed below the first one
+    brackets = sorted((float(b[0]), float(b[1])) for b in schedule["takeHome"])
+    if len(brackets) == 0 or brackets[0][0] > 0:
+      brackets.insert(0, (0.0, 1.0))
+
+    self.starts, self.gross, self.net = array("d"), array("d"), array("d")
+    self.rates, self.keeps = array("d"), array("d")
+    self.bands = []
+
+    sec = gross = net = 0.0
+    ti = bi = 0
+    while True:
+      while bi + 1 < len(brackets) and brackets[bi + 1][0] <= gross:
+        bi += 1
+      band, rate = timeBands[ti][1], timeBands[ti][2]
+      keep = brackets[bi][1]
+      if len(self.starts) > 0 and self.starts[-1] == sec: # zero-length segment
+        self._pop()
+      self._push(sec, gross, net, rate, keep, band)
+
+      nextTime = timeBands[ti + 1][0] if ti + 1 < len(timeBands) else None
+      nextBracket = None
+      if bi + 1 < len(brackets) and rate > 0:
+        nextBracket = sec + (brackets[bi + 1][0] - gross) / rate * 3600
+      if nextTime == None and nextBracket == None:
+        break
+      nxt = min(t for t in (nextTime, nextBracket) if t != None)
+      gross += (nxt - sec) / 3600 * rate
+      net += (nxt - sec) / 3600 * rate * keep
+      if nxt == nextBracket: # land exactly on the threshold despite rounding
+        gross = brackets[bi + 1][0]
+      if nxt == nextTime:
+        ti += 1
+      sec = nxt
+
+  def _push(self, sec, gross, net, rate, keep, band):
+    self.starts.append(sec)
+    self.gross.append(gross)
+    self.net.append(net)
+    self.rates.append(rate)
+    self.keeps.append(keep)
+    self.bands.append(band)
+
+  def _pop(self):
+    for col in (self.starts, self.gross, self.net, self.rates, self.keeps, self.bands):
+      col.pop()
+
+  ########
+  # Take-home pay after working a number of seconds.
+  def earnings(self, sec):
+    i = bisect_right(self.starts, sec) - 1
+    if i < 0:
+      return 0.0
+    return self.net[i] + (sec - self.starts[i]) / 3600 * self.rates[i] * self.keeps[i]
+
+  ########
+  # Gross pay after working a number of seconds.
+  def gross_pay(self, sec):
+    i = bisect_right(self.starts, sec) - 1
+    if i < 0:
+      return 0.0
+    return self.gross[i] + (sec - self.starts[i]) / 3600 * self.rates[i]
+
+  ########
+  # Splits the time worked and take-home pay by band.
+  #   Params:
+  #     sec : Seconds worked.
+  #   Returns: Dict of band name -> {"secSoFar": seconds, "earnings": dollars},
+  #            with earnings clipped to cents.
+  def breakdown(self, sec):
+    ret = {}
+    last = bisect_right(self.starts, sec) - 1
+    for i in range(last + 1):
+      end = sec if i == last else self.starts[i + 1]
+      spent = end - self.starts[i]
+      earned = (self.net[i + 1] if i < last else self.earnings(sec)) - self.net[i]
+      band = ret.setdefault(self.bands[i], {"secSoFar": 0.0, "earnings": 0.0})
+      band["secSoFar"] += spent
+      band["earnings"] += earned
+    for band in ret.values():
+      band["earnings"] = (band["earnings"] * 100 // 1) / 100
+    return ret
+# DayRates
+################
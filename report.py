@@ -0,0 +1,217 @@
+################################
+# report.py
+# ------------------------------
+# Batch report over many users' history files, e.g. the
+# money_timer_history.json collected from every workstation. Files are
+# parsed and summarized in parallel worker processes; each worker sends
+# back only small per-user, per-weekday and per-month totals, which are
+# merged into one report. Each history file is read together with its
+# journal, so the newest days count too, even before the first fold.
+#
+# Usage:
+#   python report.py histories/ [--workers 8] [--json]
+################################
+
+# imports
+import argparse
+import fnmatch
+import json
+import os
+import sys
+from time import perf_counter
+
+import history
+from history import WEEK, MONTH
+
+# totals kept per user, weekday and month: [records, seconds, earnings, goals met]
+RECORDS, SECONDS, EARNINGS, GOALS_MET = range(4)
+DEFAULT_PATTERN = "*history*.json"
+DEFAULT_NAME = "money_timer_history" # MoneyTimer.HISTORY_FILE without the extension
+JOURNAL_EXT = ".journal" # see history.HistoryJournal
+# middle parts of the names of the app's side files, e.g.
+# money_timer_history.stats.json, which aren't histories of their own
+SIDE_FILES = frozenset(("pre-compaction", "stats", "settings", "sync", "intervals", "quarantine"))
+
+
+########
+# Finds the history files under a directory. A journal without its history
+# file (fewer saves than a fold takes) stands for the history file.
+#   Params:
+#     root    : Directory to search, or a single file.
+#     pattern : fnmatch pattern of file names to include.
+#   Returns: Sorted list of history file paths, which may not all exist.
+def find_history_files(root, pattern = DEFAULT_PATTERN):
+  if os.path.isfile(root):
+    return [root[:-len(JOURNAL_EXT)] if root.endswith(JOURNAL_EXT) else root]
+  paths = set()
+  for dirPath, dirNames, fileNames in os.walk(root):
+    for name in fileNames:
+      if name.endswith(JOURNAL_EXT):
+        name = name[:-len(JOURNAL_EXT)]
+      if fnmatch.fnmatch(name, pattern) and not is_side_file(name):
+        paths.add(os.path.join(dirPath, name))
+  return sorted(paths)
+
+########
+# Tells whether a file name is one of the app's side files rather than a
+# history, e.g. money_timer_history.pre-compaction.20240101-120000.json.
+def is_side_file(name):
+  return not SIDE_FILES.isdisjoint(name.split(".")[1:-1])
+
+########
+# Names the user a history file belongs to: its path under the report's
+# root without the extension, or just its directory for files that kept
+# the default name.
+def user_name(path, root):
+  rel = os.path.relpath(path, root) if os.path.isdir(root) else os.path.basename(path)
+  stem, name = os.path.split(os.path.splitext(rel)[0])
+  if name == DEFAULT_NAME and stem:
+    return stem
+  return os.path.join(stem, name) if stem else name
+
+########
+# Summarizes one history file, merged with its journal; runs in a worker
+# process. Week and month summaries left by retention add their time and
+# earnings to the user and month totals, but aren't counted as records,
+# weekdays or goals met, since they stand for an unknown number of days.
+#   Params:
+#     job : (path, user name).
+#   Returns: Partial report, see new_report.
+def summarize_file(job):
+  path, user = job
+  report = new_report()
+  report["files"] = 1
+  bad = [0]
+  def on_bad(entry, reason):
+    bad[0] += 1
+
+  users, wdays, months = report["users"], report["wday"], report["month"]
+  userTotals = users[user] = [0, 0.0, 0.0, 0]
+  try:
+    for rec in history.stream_history(path, on_bad):
+      monthKey = "{}-{:02d}".format(rec.year, rec.mon)
+      monthTotals = months.get(monthKey) or months.setdefault(monthKey, [0, 0.0, 0.0, 0])
+      if rec.wday == WEEK or rec.wday == MONTH:
+        report["summaries"] += 1
+        for totals in (userTotals, monthTotals):
+          totals[SECONDS] += rec.secSoFar
+          totals[EARNINGS] += rec.earnings
+        continue
+      met = 1 if rec.percent >= 100 else 0
+      for totals in (userTotals, monthTotals,
+                     wdays.get(rec.wday) or wdays.setdefault(rec.wday, [0, 0.0, 0.0, 0])):
+        totals[RECORDS] += 1
+        totals[SECONDS] += rec.secSoFar
+        totals[EARNINGS] += rec.earnings
+        totals[GOALS_MET] += met
+  except (OSError, ValueError) as e:
+    report["errors"].append("{}: {}".format(path, e))
+  report["bad"] = bad[0]
+  return report
+
+########
+# Makes an empty report.
+#   Returns: Dict of "files", "bad" (records skipped) and "summaries" (week
+#            and month summary records) counts, "errors" (unreadable files),
+#            and "users", "wday" and "month" dicts of
+#            name -> [records, seconds, earnings, goals met].
+def new_report():
+  return {"files": 0, "bad": 0, "summaries": 0, "errors": [], "users": {}, "wday": {}, "month": {}}
+
+########
+# Adds a partial report into another.
+def merge_reports(into, part):
+  into["files"] += part["files"]
+  into["bad"] += part["bad"]
+  into["summaries"] += part["summaries"]
+  into["errors"].extend(part["errors"])
+  for key in ("users", "wday", "month"):
+    dest = into[key]
+    for name, totals in part[key].items():
+      mine = dest.get(name)
+      if mine == None:
+        dest[name] = list(totals)
+      else:
+        for i in range(len(totals)):
+          mine[i] += totals[i]
+  return into
+
+########
+# Summarizes many history files.
+#   Params:
+#     paths   : History files.
+#     root    : Directory the user names are relative to.
+#     workers : Worker processes; 1 summarizes in this process.
+#   Returns: Merged report, see new_report.
+def build_report(paths, root, workers = None):
+  workers = workers or os.cpu_count() or 1
+  jobs = [(path, user_name(path, root)) for path in paths]
+  report = new_report()
+  if workers <= 1 or len(jobs) <= 1:
+    for job in jobs:
+      merge_reports(report, summarize_file(job))
+    return report
+
+  from concurrent.futures import ProcessPoolExecutor
+  # a few chunks per worker: little pickling overhead, still balanced at the end
+  chunk = max(1, len(jobs) // (workers * 4))
+  with ProcessPoolExecutor(max_workers = workers) as pool:
+    for part in pool.map(summarize_file, jobs, chunksize = chunk):
+      merge_reports(report, part)
+  return report
+
+########
+# Formats a report as text tables.
+def format_report(report):
+  lines = []
+  def table(title, rows):
+    lines.append("")
+    lines.append("{:<24}{:>9}{:>11}{:>14}{:>9}".format(title, "records", "hours", "earnings", "goal %"))
+    for name, totals in rows:
+      met = 100 * totals[GOALS_MET] / totals[RECORDS] if totals[RECORDS] else 0.0
+      lines.append("{:<24}{:>9}{:>11.1f}{:>14.2f}{:>9.1f}".format(name, totals[RECORDS],
+                                                                 totals[SECONDS] / 3600,
+                                                                 totals[EARNINGS], met))
+
+  total = [0, 0.0, 0.0, 0]
+  for totals in report["users"].values():
+    for i in range(len(total)):
+      total[i] += totals[i]
+  lines.append("{} files, {} users, {} bad records skipped".format(report["files"],
+                                                                   len(report["users"]),
+                                                                   report["bad"]))
+  if report["summaries"]:
+    lines.append("{} week/month summaries counted in hours and earnings only".format(report["summaries"]))
+  order = {name: i for i, name in enumerate(history.DAYS)}
+  table("weekday", sorted(report["wday"].items(), key = lambda kv: (order.get(kv[0], len(order)), kv[0])))
+  table("month", sorted(report["month"].items()))
+  table("user", sorted(report["users"].items()))
+  table("total", [("all", total)])
+  for error in report["errors"]:
+    lines.append("error: " + error)
+  return "\n".join(lines)
+
+########
+# main: command line entry point
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Report on a directory of Money Timer history files")
+  parser.add_argument("root", help = "directory of history files, or one file")
+  parser.add_argument("--pattern", default = DEFAULT_PATTERN, help = "file names to include")
+  parser.add_argument("--workers", type = int, default = None,
+                      help = "worker processes (default: one per CPU)")
+  parser.add_argument("--json", action = "store_true", help = "print the report as JSON")
+  args = parser.parse_args(argv)
+
+  startTime = perf_counter()
+  paths = find_history_files(args.root, args.pattern)
+  report = build_report(paths, args.root, args.workers)
+  if args.json:
+    json.dump(report, sys.stdout, indent = 1, sort_keys = True)
+    print()
+  else:
+    print(format_report(report))
+    print("\nreported {} files in {:.2f}s".format(len(paths), perf_counter() - startTime))
+  return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,150 @@
+################################
+# retention.py
+# ------------------------------
+# Tiered history retention. Recent days stay as they are; days older than
+# a few months are rolled into one summary record per week, and older
+# still into one per month, so a decade of use stays a few hundred
+# records. Compaction works a few groups at a time so it can run in the
+# background between timer updates. It cannot be undone, so it is off
+# unless the retention setting turns it on, and MoneyTimer keeps a copy of
+# the history before each compaction (see backup_history).
+################################
+
+# imports
+from datetime import date
+
+from history import BANDS, WEEK, MONTH, clip_percent, month_end, week_start
+
+# settings defaults; 0 keeps that tier forever, so by default nothing is compacted
+DEFAULT_POLICY = {"dailyDays" : 0, # days older than this become weekly summaries, e.g. 180
+                  "weeklyDays": 0} # days and weeks older than this become monthly summaries, e.g. 730
+
+
+########
+# Rolls records up into one summary record.
+#   Params:
+#     records : HistoryRecords or dicts of the period.
+#     kind    : WEEK or MONTH.
+#     start   : datetime.date of the period's first day.
+#   Returns: Dict in HISTORY_FORMAT. secSoFar and earnings are totals; percent
+#            is total time over total goal, the goal of each record being
+#            recovered from its own time and percent.
+def summarize(records, kind, start):
+  sec = earnings = goalSec = 0.0
+  bands = {}
+  for rec in records:
+    sec += rec["secSoFar"]
+    earnings += rec["earnings"]
+    if rec["percent"] > 0:
+      goalSec += rec["secSoFar"] * 100 / rec["percent"]
+    for name, band in (rec.get(BANDS) or {}).items():
+      total = bands.setdefault(name, {"secSoFar": 0.0, "earnings": 0.0})
+      total["secSoFar"] += band["secSoFar"]
+      total["earnings"] += band["earnings"]
+  for band in bands.values():
+    band["earnings"] = round(band["earnings"], 2)
+  ret = {"year": start.year,
+         "mon" : start.month,
+         "day" : start.day,
+         "wday": kind,
+         "secSoFar": sec,
+         "earnings": round(earnings, 2),
+         "percent" : clip_percent(sec / goalSec * 100) if goalSec > 0 else 0.0}
+  if bands:
+    ret[BANDS] = bands
+  return ret
+
+
+################
+# Compactor: incrementally applies a retention policy to a HistoryTable,
+# from the oldest record towards the newest.
+#   Class members:
+#     GROUPS_PER_STEP : summaries made per step by default
+#   Members:
+#     table   : HistoryTable being compacted in place
+#     changed : True once any records were replaced
+#     start   : first day of the earliest period summarized, or None
+#     end     : last day of the latest period summarized, or None
+#   Methods:
+#     step : does a bounded amount of work
+class Compactor:
+
+  GROUPS_PER_STEP = 16
+
+  ########
+  # Prepares to compact a table.
+  #   Params:
+  #     table      : HistoryTable, newest first.
+  #     today      : datetime.date ages are measured from.
+  #     dailyDays  : Age in days after which days are rolled into weeks; 0 to never.
+  #     weeklyDays : Age in days after which days and weeks are rolled into months; 0 to never.
+  def __init__(self, table, today, dailyDays = DEFAULT_POLICY["dailyDays"],
+               weeklyDays = DEFAULT_POLICY["weeklyDays"]):
+    self.table = table
+    self.changed = False
+    self.start = None
+    self.end = None
+    self._dailyCut = today.toordinal() - dailyDays if dailyDays > 0 else None
+    self._monthCut = today.toordinal() - weeklyDays if weeklyDays > 0 else None
+    # nothing on or after this day can be compacted
+    self._stop = max(c for c in (self._dailyCut, self._monthCut, 0) if c != None)
+    self._i = len(table) - 1 # oldest record not yet looked at
+    table.span() # builds the date index, putting the table in date order if it isn't
+
+  ########
+  # Summarizes up to a number of periods.
+  #   Params:
+  #     groups : Most summaries to make in this step.
+  #   Returns: True if there is more to do.
+  def step(self, groups = GROUPS_PER_STEP):
+    table = self.table
+    while groups > 0 and self._i >= 0:
+      i = self._i
+      rec = table.record(i)
+      day = date(rec.year, rec.mon, rec.day)
+      if day.toordinal() >= self._stop:
+        self._i = -1
+        break
+      target = self._target(rec, day)
+      if target == None:
+        self._i -= 1
+        continue
+
+      # the period's records are adjacent, running towards the newer end
+      members = [rec]
+      j = i - 1
+      while j >= 0:
+        other = table.record(j)
+        if self._target(other, date(other.year, other.mon, other.day)) != target:
+          break
+        members.append(other)
+        j -= 1
+      if len(members) == 1 and rec.wday == target[0]: # already summarized
+        self._i = j
+        continue
+
+      del table[j + 1:i + 1]
+      table.insert(j + 1, summarize(members, *target))
+      self.changed = True
+      kind, first = target
+      last = month_end(first) if kind == MONTH else date.fromordinal(first.toordinal() + 6)
+      self.start = min(self.start or first, first)
+      self.end = max(self.end or last, last)
+      self._i = j
+      groups -= 1
+    return self._i >= 0
+
+  ########
+  # Gets the (kind, first day) of the summary a record belongs in, or None
+  # if it is to be kept as it is.
+  def _target(self, rec, day):
+    if self._monthCut != None and month_end(day).toordinal() < self._monthCut:
+      return (MONTH, date(day.year, day.month, 1))
+    if rec.wday == MONTH:
+      return None
+    monday = week_start(day)
+    if self._dailyCut != None and monday.toordinal() + 6 < self._dailyCut:
+      return (WEEK, monday)
+    return None
+# Compactor
+################
@@ -0,0 +1,195 @@
+################################
+# simulate.py
+# ------------------------------
+# Fast-forwards MoneyTimer through whole workdays on a virtual clock.
+# Each day runs the real app code (setup, lunch events, pauses, updates,
+# save on exit) against headless.FakeRoot, so a day replays in
+# milliseconds and years of realistic history can be generated quickly.
+#
+# Usage:
+#   python simulate.py --days 730 [--history history.json]
+# Without --history, the files are written to a new temporary directory,
+# which is printed at the end.
+################################
+
+# imports
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+from time import mktime, perf_counter
+
+from headless import FakeRoot
+from timesource import VirtualClock, VirtualScheduler
+
+# defaults
+DEFAULT_TICK_MS = 60000 # virtual ms between MoneyTimer updates
+
+
+################
+# WorkDay: description of one simulated day, times in seconds after midnight
+#   Members:
+#     day    : datetime.date of the day
+#     arrive : time the app is started
+#     leave  : time the app is closed; may pass midnight
+#     pauses : list of (start, end) manual pauses
+class WorkDay:
+
+  def __init__(self, day, arrive, leave, pauses = ()):
+    self.day = day
+    self.arrive = arrive
+    self.leave = leave
+    self.pauses = list(pauses)
+
+  ########
+  # Converts seconds after this day's midnight to seconds since the epoch.
+  def epoch(self, sec):
+    return mktime((self.day.year, self.day.month, self.day.day, 0, 0, 0, 0, 0, -1)) + sec
+# WorkDay
+################
+
+
+########
+# simulate_day: runs MoneyTimer from arrival to departure of a WorkDay.
+# Settings, history and work intervals are read from and saved to
+# MoneyTimer.SETTINGS_FILE, HISTORY_FILE (or HISTORY_DB, HISTORY_BLOCKS),
+# INTERVALS_FILE, STATS_FILE, COLUMNS_DIR and SYNC_FILE as in a real session.
+#   Params:
+#     workDay   : WorkDay to replay.
+#     tickMs    : Virtual milliseconds between updates.
+#     withClock : Also runs a smooth ClockFace on the same virtual clock.
+#   Returns: The MoneyTimer after it has been destroyed.
+def simulate_day(workDay, tickMs = DEFAULT_TICK_MS, withClock = False):
+  from money_timer import MoneyTimer
+  from clockface import ClockFace
+
+  root = FakeRoot()
+  clock = VirtualClock(workDay.epoch(workDay.arrive))
+  scheduler = VirtualScheduler(clock)
+  if withClock:
+    ClockFace(root, clock = clock, scheduler = scheduler, size = 100, smooth = True)
+
+  timer = MoneyTimer(root, clock, scheduler)
+  timer.AFTER_TIME = tickMs
+  timer.AFTER_TIME_SEC = tickMs / 1000
+  timer.setupWindow.inputVar.set("") # start now
+  timer.setupWindow.destroy()
+
+  for start, end in workDay.pauses:
+    scheduler.after(1000 * (start - workDay.arrive), timer.auto_pause)
+    scheduler.after(1000 * (end - workDay.arrive), timer.auto_unpause)
+
+  scheduler.run_until(workDay.epoch(workDay.leave))
+  timer.destroy()
+  root.destroy()
+  return timer
+
+########
+# make_work_days: generates a realistic schedule of workdays
+#   Params:
+#     start    : First datetime.date.
+#     days     : Number of calendar days.
+#     settings : Settings dict; weekday goals and lunch times shape each day.
+#     seed     : Random seed.
+#   Returns: List of WorkDay, skipping days the app would not be run.
+def make_work_days(start, days, settings, seed = 0):
+  from money_timer import MoneyTimer
+  rng = random.Random(seed)
+  ret = []
+  for i in range(days):
+    day = start + timedelta(days = i)
+    goal = settings[MoneyTimer.DAYS[day.weekday()]]
+    if goal <= 0 and rng.random() > 0.05: # the odd weekend shift
+      continue
+    if rng.random() < 0.04: # sick days and holidays
+      continue
+    if goal <= 0:
+      goal = rng.choice([2.0, 4.0])
+
+    arrive = int(rng.gauss(8.5 * 3600, 1200))
+    leave = arrive + goal * 3600 + rng.gauss(0, 1800)
+    if settings["autoLunchEnabled"]:
+      leave += (settings["autoLunchStopTime"][0] - settings["autoLunchStartTime"][0]) * 3600
+      leave += (settings["autoLunchStopTime"][1] - settings["autoLunchStartTime"][1]) * 60
+    if rng.random() < 0.01: # crunch night, past midnight
+      leave = 24 * 3600 + rng.randint(0, 7200)
+
+    pauses = []
+    if rng.random() < 0.3:
+      pStart = rng.randint(arrive + 1800, max(arrive + 1800, int(leave) - 3600))
+      pauses.append((pStart, pStart + rng.randint(600, 1200)))
+    ret.append(WorkDay(day, arrive, int(max(leave, arrive + 60)), pauses))
+  return ret
+
+########
+# simulate_history: replays many days into a history file
+#   Params:
+#     historyFile  : Path of the history file to create/extend; work intervals
+#                    go next to it in <stem>.intervals.bin.
+#     settingsFile : Path of the settings file used during the run.
+#     start, days  : Calendar range to replay.
+#     seed         : Random seed.
+#     tickMs       : Virtual milliseconds between updates.
+#   Returns: Number of days replayed.
+def simulate_history(historyFile, settingsFile, start, days, seed = 0, tickMs = DEFAULT_TICK_MS):
+  from money_timer import MoneyTimer
+
+  oldFiles = (MoneyTimer.SETTINGS_FILE, MoneyTimer.HISTORY_FILE, MoneyTimer.HISTORY_DB,
+              MoneyTimer.HISTORY_BLOCKS, MoneyTimer.INTERVALS_FILE, MoneyTimer.STATS_FILE,
+              MoneyTimer.COLUMNS_DIR, MoneyTimer.SYNC_FILE)
+  MoneyTimer.SETTINGS_FILE, MoneyTimer.HISTORY_FILE = settingsFile, historyFile
+  MoneyTimer.HISTORY_DB = os.path.splitext(historyFile)[0] + ".db"
+  MoneyTimer.HISTORY_BLOCKS = os.path.splitext(historyFile)[0] + ".mthb"
+  MoneyTimer.INTERVALS_FILE = os.path.splitext(historyFile)[0] + ".intervals.bin"
+  MoneyTimer.STATS_FILE = os.path.splitext(historyFile)[0] + ".stats.json"
+  MoneyTimer.COLUMNS_DIR = os.path.splitext(historyFile)[0] + ".columns"
+  MoneyTimer.SYNC_FILE = os.path.splitext(historyFile)[0] + ".sync.json"
+  try:
+    if not os.path.exists(settingsFile):
+      settings = dict(MoneyTimer.DEFAULT_SETTINGS)
+      settings["autoLunchEnabled"] = True
+      with open(settingsFile, "w") as f:
+        json.dump(settings, f)
+    with open(settingsFile, "r") as f:
+      settings = json.load(f)
+
+    workDays = make_work_days(start, days, settings, seed)
+    for workDay in workDays:
+      simulate_day(workDay, tickMs)
+  finally:
+    (MoneyTimer.SETTINGS_FILE, MoneyTimer.HISTORY_FILE, MoneyTimer.HISTORY_DB,
+     MoneyTimer.HISTORY_BLOCKS, MoneyTimer.INTERVALS_FILE, MoneyTimer.STATS_FILE,
+     MoneyTimer.COLUMNS_DIR, MoneyTimer.SYNC_FILE) = oldFiles
+  return len(workDays)
+
+########
+# main: command line entry point
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Generate Money Timer history by simulation")
+  parser.add_argument("--days", type = int, default = 365, help = "calendar days to replay")
+  parser.add_argument("--start", default = "2024-01-01", help = "first day, YYYY-MM-DD")
+  parser.add_argument("--history", help = "history file to write; default in a new temporary directory")
+  parser.add_argument("--settings", help = "settings file to use; default beside the history file")
+  parser.add_argument("--seed", type = int, default = 0)
+  parser.add_argument("--tick-ms", type = int, default = DEFAULT_TICK_MS,
+                      help = "virtual milliseconds between updates")
+  args = parser.parse_args(argv)
+  if args.history == None:
+    args.history = os.path.join(tempfile.mkdtemp(prefix = "money_timer_sim_"), "money_timer_history.json")
+  if args.settings == None:
+    args.settings = os.path.splitext(args.history)[0] + ".settings.json"
+
+  y, m, d = (int(x) for x in args.start.split("-"))
+  startTime = perf_counter()
+  count = simulate_history(args.history, args.settings, date(y, m, d), args.days, args.seed, args.tick_ms)
+  elapsed = perf_counter() - startTime
+  print("simulated {} workdays in {:.2f}s ({:.2f} ms/day)".format(count, elapsed,
+                                                                  1000 * elapsed / max(count, 1)))
+  print("history written to {}".format(args.history))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,255 @@
+################################
+# sketches.py
+# ------------------------------
+# Constant-memory quantile estimates of what a typical workday looks like.
+# Each metric (hours, earnings, goal percent), overall and per weekday, is
+# kept in a KLL sketch that is updated as days are saved, so medians and
+# percentiles never need a pass over the history.
+################################
+
+# imports
+import json
+import math
+import os
+
+from history import DAYS
+
+METRICS = ("hours", "earnings", "percent")
+
+
+################
+# KLLSketch: KLL quantile sketch. Items live in levels of compactors;
+# a full level is sorted and every other item moves up a level with twice
+# the weight. Rank error is about 1.7 / k, in O(k) memory.
+#   Class members:
+#     DEFAULT_K : accuracy parameter; the top level holds about k items
+#     C         : capacity ratio between adjacent levels
+#   Members:
+#     k : accuracy parameter
+#     n : number of items seen
+#   Methods:
+#     update    : adds an item
+#     quantile  : estimates the value at a rank
+#     to_dict   : JSON-friendly state
+#     from_dict : restores from to_dict
+class KLLSketch:
+
+  DEFAULT_K = 128
+  C = 2 / 3
+
+  def __init__(self, k = DEFAULT_K):
+    self.k = k
+    self.n = 0
+    self._levels = [[]]
+    self._size = 0
+    self._flip = 0 # alternates which half a compaction keeps, instead of a coin
+
+  def _capacity(self, h):
+    return max(2, int(math.ceil(self.k * KLLSketch.C ** (len(self._levels) - h - 1))))
+
+  def update(self, x):
+    self._levels[0].append(float(x))
+    self.n += 1
+    self._size += 1
+    if self._size > sum(self._capacity(h) for h in range(len(self._levels))):
+      self._compress()
+
+  ########
+  # Halves the lowest level that is over capacity.
+  def _compress(self):
+    for h, items in enumerate(self._levels):
+      if len(items) >= self._capacity(h):
+        if h + 1 == len(self._levels):
+          self._levels.append([])
+        items.sort()
+        odd = len(items) % 2
+        self._flip ^= 1
+        promoted = items[self._flip:len(items) - odd:2]
+        self._levels[h + 1].extend(promoted)
+        self._levels[h] = items[len(items) - odd:]
+        self._size -= len(items) - odd - len(promoted)
+        return
+
+  ########
+  # Estimates the value at a rank.
+  #   Params:
+  #     q     : Rank as a fraction, 0 to 1.
+  #     extra : Further items to count in with weight 1.
+  #   Returns: Value, or None if there are no items.
+  def quantile(self, q, extra = ()):
+    weighted = [(x, 1 << h) for h, items in enumerate(self._levels) for x in items]
+    weighted.extend((float(x), 1) for x in extra)
+    if len(weighted) == 0:
+      return None
+    weighted.sort()
+    target = q * sum(w for x, w in weighted)
+    total = 0
+    for x, w in weighted:
+      total += w
+      if total >= target:
+        return x
+    return weighted[-1][0]
+
+  def to_dict(self):
+    return {"k": self.k, "n": self.n, "flip": self._flip, "levels": self._levels}
+
+  @staticmethod
+  def from_dict(d):
+    sketch = KLLSketch(d["k"])
+    sketch.n = d["n"]
+    sketch._flip = d["flip"]
+    sketch._levels = [[float(x) for x in items] for items in d["levels"]] or [[]]
+    sketch._size = sum(len(items) for items in sketch._levels)
+    return sketch
+# KLLSketch
+################
+
+
+################
+# DayStats: KLL sketches of each metric, overall and per weekday. The
+# newest day is held back as pending until a later day arrives, so saving
+# the same day again (a relaunch) replaces it instead of counting it twice.
+#   Class members:
+#     MIN_DAYS  : days a weekday needs before a goal is suggested for it
+#     GOAL_STEP : suggested goals are rounded to this many hours
+#   Members:
+#     pending : newest day, not yet in the sketches
+#     changed : whether the sketches changed since last loaded or saved
+#   Methods:
+#     add_day       : adds a history record
+#     refresh_pending : updates the pending day from a history table
+#     quantile      : estimates a metric's value at a rank
+#     count         : number of days seen
+#     suggest_goals : median hours per weekday, as goal suggestions
+#     from_history  : builds stats from a history table
+#     load / save   : JSON file persistence
+class DayStats:
+
+  MIN_DAYS = 4
+  GOAL_STEP = 0.5
+
+  def __init__(self):
+    self._sketches = {}
+    self.pending = None
+    self.changed = True
+
+  def _sketch(self, metric, wday = None):
+    key = metric if wday == None else "{}:{}".format(metric, wday)
+    if key not in self._sketches:
+      self._sketches[key] = KLLSketch()
+    return self._sketches[key]
+
+  ########
+  # Adds a day. Weekly and monthly summary records are ignored.
+  #   Params:
+  #     rec : Dict in HISTORY_FORMAT or HistoryRecord.
+  def add_day(self, rec):
+    if rec["wday"] not in DAYS:
+      return
+    day = {"date": [rec["year"], rec["mon"], rec["day"]],
+           "wday": rec["wday"],
+           "hours": rec["secSoFar"] / 3600,
+           "earnings": rec["earnings"],
+           "percent": rec["percent"]}
+    if self.pending != None and self.pending["date"] == day["date"]:
+      self.pending = day
+    elif self.pending != None and self.pending["date"] > day["date"]: # an older day, late
+      self._commit(day)
+    else:
+      if self.pending != None:
+        self._commit(self.pending)
+      self.pending = day
+
+  def _commit(self, day):
+    self.changed = True
+    for metric in METRICS:
+      self._sketch(metric).update(day[metric])
+      self._sketch(metric, day["wday"]).update(day[metric])
+
+  ########
+  # Updates the pending day with its record in a history table. save skips
+  # saves that only change the pending day, so the one read by load may be
+  # from an earlier save of that day; history has the latest.
+  #   Params:
+  #     table : HistoryTable.
+  def refresh_pending(self, table):
+    if self.pending != None:
+      rec = table.get(tuple(self.pending["date"]))
+      if rec != None:
+        self.add_day(rec)
+
+  ########
+  # Estimates a metric's value at a rank.
+  #   Params:
+  #     metric : "hours", "earnings" or "percent".
+  #     q      : Rank as a fraction, e.g. 0.5 for the median.
+  #     wday   : Optional weekday name to restrict to.
+  #   Returns: Value, or None if no days have been seen.
+  def quantile(self, metric, q, wday = None):
+    extra = ()
+    if self.pending != None and (wday == None or self.pending["wday"] == wday):
+      extra = (self.pending[metric],)
+    return self._sketch(metric, wday).quantile(q, extra)
+
+  def count(self, wday = None):
+    n = self._sketch("hours", wday).n
+    if self.pending != None and (wday == None or self.pending["wday"] == wday):
+      n += 1
+    return n
+
+  ########
+  # Suggests a goal for each weekday: its median hours, rounded to GOAL_STEP.
+  # Weekdays worked on fewer than MIN_DAYS days get no suggestion.
+  #   Returns: Dict of weekday name -> hours or None.
+  def suggest_goals(self):
+    ret = {}
+    for day in DAYS:
+      median = self.quantile("hours", 0.5, day)
+      if median == None or self.count(day) < DayStats.MIN_DAYS:
+        ret[day] = None
+      else:
+        ret[day] = round(median / DayStats.GOAL_STEP) * DayStats.GOAL_STEP
+    return ret
+
+  ########
+  # Builds stats from a history table, oldest day first.
+  @staticmethod
+  def from_history(table):
+    stats = DayStats()
+    for i in range(len(table) - 1, -1, -1):
+      stats.add_day(table.record(i))
+    return stats
+
+  ########
+  # Reads stats saved by save.
+  #   Returns: DayStats, or None if the file is missing or unreadable.
+  @staticmethod
+  def load(path):
+    try:
+      with open(path, "r") as f:
+        d = json.load(f)
+      stats = DayStats()
+      stats._sketches = {key: KLLSketch.from_dict(s) for key, s in d["sketches"].items()}
+      stats.pending = d["pending"]
+      stats.changed = False
+      return stats
+    except (OSError, ValueError, KeyError, TypeError):
+      return None
+
+  ########
+  # Writes the stats if the sketches changed since they were loaded or last
+  # saved. Re-saving the newest day only changes pending, which history
+  # keeps anyway (see refresh_pending), so that costs no write.
+  #   Returns: True if the file was written.
+  def save(self, path):
+    if not self.changed:
+      return False
+    d = {"sketches": {key: s.to_dict() for key, s in self._sketches.items()},
+         "pending": self.pending}
+    with open(path + ".tmp", "w") as f:
+      json.dump(d, f)
+    os.replace(path + ".tmp", path)
+    self.changed = False
+    return True
+# DayStats
+################
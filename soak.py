@@ -0,0 +1,241 @@
+################################
+# soak.py
+# ------------------------------
+# Soak test: keeps one MoneyTimer running for weeks of virtual time, as
+# users do, while driving it through each day's pauses, settings changes,
+# history views and credits. At the end of every day it records live
+# after handles, Tcl commands and widgets, canvas items and tracemalloc's
+# traced memory. After a warm-up, counts must stop growing and memory may
+# only grow slowly (the interval log legitimately gains a few records a
+# day); otherwise the run fails, listing the allocation sites that grew.
+# It also fails if the app ever runs two update chains at once, or is
+# paused by a lunch break that was switched off. Runs headless against
+# headless.FakeRoot on a virtual clock.
+#
+# Usage:
+#   python soak.py --days 60 [--history-days 365]
+################################
+
+# imports
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import date
+from time import mktime, perf_counter
+
+from headless import FakeRoot
+from timesource import VirtualClock, VirtualScheduler
+
+# defaults
+DEFAULT_DAYS = 42
+DEFAULT_WARMUP = 7          # days before growth is measured
+DEFAULT_TICK_MS = 60000     # virtual ms between MoneyTimer updates
+DEFAULT_HISTORY_DAYS = 180  # days of simulated history to start with
+MAX_KIB_PER_DAY = 2.0       # memory growth allowed once warmed up
+COUNTERS = ("afters", "tclCommands", "widgets", "canvasItems")
+
+
+########
+# Counts live Tk resources and traced memory.
+#   Params:
+#     root      : FakeRoot the app runs on.
+#     scheduler : VirtualScheduler the app schedules on.
+#   Returns: Dict of COUNTERS plus "kib".
+def measure(root, scheduler):
+  tk = root.tk
+  gc.collect()
+  return {"afters"     : scheduler.pending() + len(tk.afters) + len(tk.idles),
+          "tclCommands": len(tk.commands),
+          "widgets"    : len(tk.options),
+          "canvasItems": sum(len(items) for items in tk.items.values()),
+          "kib"        : tracemalloc.get_traced_memory()[0] / 1024}
+
+########
+# Schedules one day of activity, at times in seconds after that day's midnight.
+#   Params:
+#     timer     : Running MoneyTimer.
+#     scheduler : VirtualScheduler.
+#     midnight  : Epoch seconds of the day's midnight.
+#     index     : Day number, varying what is done.
+#     problems  : List collecting (day, description) of misbehavior seen.
+def schedule_day(timer, scheduler, midnight, index, problems):
+  clock = scheduler.clock
+  def at(sec, func):
+    scheduler.after(1000 * (midnight + sec - clock.now), func)
+
+  def change_settings():
+    timer.on_settings_click()
+    window = timer.settingsWindow
+    window.autoLunchBreak["checkboxVar"].set(index % 2) # on every other day
+    window.goals[timer.startDay]["var"].set(str(6 + index % 3))
+    window.on_confirm_click()
+
+  def check_lunch():
+    if not timer.settings["autoLunchEnabled"] and timer.paused:
+      problems.append((index, "paused by a disabled lunch break"))
+
+  def check_updates():
+    chains = scheduler.pending_of(timer.update)
+    if chains != (0 if timer.paused else 1):
+      problems.append((index, "{} update chains while {}".format(chains, "paused" if timer.paused
+                                                                  else "running")))
+
+  def view_history():
+    timer.on_history_click()
+    scheduler.run_for(300) # a few updates with the window open
+    timer.historyWindow.hide()
+
+  def credits():
+    timer.on_credits_click()
+    timer.on_credits_click()
+    timer.credits.withdraw() # closed by the user
+
+  at(8.5 * 3600, timer.auto_unpause)
+  at(10 * 3600, change_settings)
+  at(12.5 * 3600, check_lunch)
+  for sec in (14 * 3600, 14.25 * 3600, 14.5 * 3600, 14.75 * 3600):
+    at(sec, timer.toggle_pause)
+    at(sec + 60, check_updates)
+  at(15 * 3600, view_history)
+  at(16 * 3600, credits)
+  at(17 * 3600, timer.save_history)
+  at(17.5 * 3600, timer.auto_pause)
+
+########
+# Least-squares slope of samples against their index.
+def slope(samples):
+  n = len(samples)
+  if n < 2:
+    return 0.0
+  meanX, meanY = (n - 1) / 2, sum(samples) / n
+  num = sum((i - meanX) * (y - meanY) for i, y in enumerate(samples))
+  return num / sum((i - meanX) ** 2 for i in range(n))
+
+########
+# Judges samples taken after warm-up. Counts in the second half may not
+# exceed those in the first; memory is fitted over the second half only, as
+# allocator free lists and caches take a while to fill.
+#   Params:
+#     samples       : List of measure() dicts, one per day.
+#     maxKibPerDay  : Memory growth allowed per day.
+#   Returns: List of failure descriptions; empty if nothing grew.
+def find_growth(samples, maxKibPerDay = MAX_KIB_PER_DAY):
+  failures = []
+  half = len(samples) // 2
+  for name in COUNTERS:
+    values = [s[name] for s in samples]
+    if max(values[half:]) > max(values[:half]):
+      failures.append("{} grew from {} to {}".format(name, values[0], values[-1]))
+  kibPerDay = slope([s["kib"] for s in samples[half:]])
+  if kibPerDay > maxKibPerDay:
+    failures.append("memory grew {:.2f} KiB/day (limit {:.2f})".format(kibPerDay, maxKibPerDay))
+  return failures
+
+########
+# run_soak: runs the app for many virtual days.
+#   Params:
+#     days         : Days to keep the app running.
+#     warmup       : Days before samples count.
+#     tickMs       : Virtual milliseconds between updates.
+#     historyDays  : Days of history simulated beforehand.
+#     maxKibPerDay : Memory growth allowed per day.
+#     tmpDir       : Directory for the app's files.
+#   Returns: (samples after warm-up, failures, top tracemalloc growth lines).
+def run_soak(days = DEFAULT_DAYS, warmup = DEFAULT_WARMUP, tickMs = DEFAULT_TICK_MS,
+             historyDays = DEFAULT_HISTORY_DAYS, maxKibPerDay = MAX_KIB_PER_DAY, tmpDir = None):
+  from money_timer import MoneyTimer
+  from simulate import simulate_history
+
+  historyFile = os.path.join(tmpDir, "history.json")
+  settingsFile = os.path.join(tmpDir, "settings.json")
+  first = date(2024, 1, 1)
+  if historyDays > 0:
+    simulate_history(historyFile, settingsFile, date.fromordinal(first.toordinal() - historyDays),
+                     historyDays, tickMs = tickMs)
+  oldFiles = (MoneyTimer.SETTINGS_FILE, MoneyTimer.HISTORY_FILE, MoneyTimer.HISTORY_DB,
+              MoneyTimer.HISTORY_BLOCKS, MoneyTimer.INTERVALS_FILE, MoneyTimer.STATS_FILE,
+              MoneyTimer.COLUMNS_DIR, MoneyTimer.SYNC_FILE)
+  stem = os.path.splitext(historyFile)[0]
+  MoneyTimer.SETTINGS_FILE, MoneyTimer.HISTORY_FILE = settingsFile, historyFile
+  MoneyTimer.HISTORY_DB = stem + ".db"
+  MoneyTimer.HISTORY_BLOCKS = stem + ".mthb"
+  MoneyTimer.INTERVALS_FILE = stem + ".intervals.bin"
+  MoneyTimer.STATS_FILE = stem + ".stats.json"
+  MoneyTimer.COLUMNS_DIR = stem + ".columns"
+  MoneyTimer.SYNC_FILE = stem + ".sync.json"
+
+  try:
+    midnight = mktime((first.year, first.month, first.day, 0, 0, 0, 0, 0, -1))
+    root = FakeRoot()
+    clock = VirtualClock(midnight + 8 * 3600)
+    scheduler = VirtualScheduler(clock)
+    timer = MoneyTimer(root, clock, scheduler)
+    timer.AFTER_TIME = tickMs
+    timer.AFTER_TIME_SEC = tickMs / 1000
+    timer.setupWindow.inputVar.set("")
+    timer.setupWindow.destroy()
+
+    tracemalloc.start()
+    samples, problems = [], []
+    baseline = None
+    for i in range(days):
+      dayStart = midnight + i * 86400
+      schedule_day(timer, scheduler, dayStart, i, problems)
+      scheduler.run_until(dayStart + 86400 - 1)
+      if i + 1 == warmup:
+        baseline = tracemalloc.take_snapshot()
+      if i + 1 >= warmup:
+        samples.append(measure(root, scheduler))
+    growth = []
+    if baseline != None:
+      stats = tracemalloc.take_snapshot().compare_to(baseline, "lineno")
+      growth = [str(stat) for stat in stats[:5] if stat.size_diff > 0]
+    tracemalloc.stop()
+
+    timer.destroy()
+    root.destroy()
+    failures = find_growth(samples, maxKibPerDay) if len(samples) >= 4 else ["too few days after warm-up"]
+    for day, problem in problems:
+      failures.append("day {}: {}".format(day, problem))
+  finally:
+    (MoneyTimer.SETTINGS_FILE, MoneyTimer.HISTORY_FILE, MoneyTimer.HISTORY_DB,
+     MoneyTimer.HISTORY_BLOCKS, MoneyTimer.INTERVALS_FILE, MoneyTimer.STATS_FILE,
+     MoneyTimer.COLUMNS_DIR, MoneyTimer.SYNC_FILE) = oldFiles
+  return samples, failures, growth
+
+########
+# main: command line entry point
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Soak test Money Timer over weeks of virtual time")
+  parser.add_argument("--days", type = int, default = DEFAULT_DAYS, help = "days to keep the app running")
+  parser.add_argument("--warmup", type = int, default = DEFAULT_WARMUP, help = "days before growth is measured")
+  parser.add_argument("--tick-ms", type = int, default = DEFAULT_TICK_MS,
+                      help = "virtual milliseconds between updates")
+  parser.add_argument("--history-days", type = int, default = DEFAULT_HISTORY_DAYS,
+                      help = "days of simulated history to start with")
+  parser.add_argument("--max-kib-per-day", type = float, default = MAX_KIB_PER_DAY)
+  args = parser.parse_args(argv)
+
+  startTime = perf_counter()
+  with tempfile.TemporaryDirectory() as tmpDir:
+    samples, failures, growth = run_soak(args.days, args.warmup, args.tick_ms, args.history_days,
+                                         args.max_kib_per_day, tmpDir)
+  print("{:<6}".format("day") + "".join("{:>13}".format(name) for name in COUNTERS) + "{:>11}".format("KiB"))
+  step = max(1, len(samples) // 10)
+  for i in list(range(0, len(samples), step)) + [len(samples) - 1]:
+    s = samples[i]
+    print("{:<6}".format(args.warmup + i) + "".join("{:>13}".format(s[name]) for name in COUNTERS) +
+          "{:>11.1f}".format(s["kib"]))
+  print("soaked {} days in {:.2f}s".format(args.days, perf_counter() - startTime))
+  for failure in failures:
+    print("FAIL " + failure)
+  if failures:
+    for line in growth:
+      print("  " + line)
+  return 1 if failures else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
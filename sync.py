@@ -0,0 +1,371 @@
+################################
+# sync.py
+# ------------------------------
+# Pushes history changes to a central HTTP collector. A change is a date
+# span together with the records history now holds in it; the collector
+# replaces whatever it has in that span, so pushing a change twice is
+# harmless. Changes wait in an outbox file until the collector has taken
+# them, and their sequence numbers are the sync cursor: only changes after
+# the last acknowledged one are ever sent. A background thread posts them
+# as gzipped JSON batches over one kept-alive connection, retrying with
+# exponential backoff. Tk's thread only queues changes in memory; the
+# background thread loads, updates and writes the outbox file.
+#
+# Batch body, POSTed as application/json with Content-Encoding: gzip:
+#   {"user": name, "cursor": last acknowledged seq, "seq": last seq in batch,
+#    "changes": [{"seq": n, "start": "YYYY-MM-DD", "end": "YYYY-MM-DD",
+#                 "records": [history record, ...]}, ...]}
+# A null start or end is open-ended. Any 2xx answer acknowledges the batch.
+#
+# Usage, as a stand-in collector for testing:
+#   python sync.py --port 8765 --output batches.jsonl [--fail-rate 0.3]
+# with "syncUrl": "http://127.0.0.1:8765/history" in money_timer_settings.json.
+################################
+
+# imports
+import argparse
+import getpass
+import gzip
+import http.client
+import json
+import os
+import random
+import socket
+import sys
+import threading
+from urllib.parse import urlsplit
+
+
+########
+# Gets a (year, mon, day) tuple or date as YYYY-MM-DD, keeping None.
+def _iso(day):
+  if day == None:
+    return None
+  if hasattr(day, "year"):
+    day = (day.year, day.month, day.day)
+  return "{:04d}-{:02d}-{:02d}".format(*day)
+
+########
+# Tells whether span a covers span b; spans are (start, end) of ISO dates or None.
+def _covers(a, b):
+  return (a[0] == None or (b[0] != None and a[0] <= b[0])) and \
+         (a[1] == None or (b[1] != None and a[1] >= b[1]))
+
+########
+# Names this user for the collector.
+def default_user():
+  try:
+    user = getpass.getuser()
+  except Exception:
+    user = "unknown"
+  return "{}@{}".format(user, socket.gethostname())
+
+
+################
+# HistorySync: outbox of history changes and the thread pushing them
+#   Class members:
+#     BATCH_CHANGES : most changes per request
+#     BACKOFF_MIN   : seconds before the first retry
+#     BACKOFF_MAX   : longest wait between retries, in seconds
+#     TIMEOUT       : socket timeout of a request, in seconds
+#   Members:
+#     url        : collector URL
+#     outboxFile : JSON file the outbox and cursor are kept in
+#     user       : name sent with each batch
+#     cursor     : seq of the last change the collector acknowledged
+#     seq        : seq of the last change added
+#     outbox     : [[seq, start, end, records], ...] not yet acknowledged
+#     failures   : pushes failed in a row
+#     lastError  : description of the last failed push, or None
+#   Methods:
+#     note_change : queues a change for the outbox; does no I/O
+#     seed        : queues all of a table, a year per change, if the outbox is new
+#     pending     : number of changes not yet acknowledged, queued ones included
+#     push_once   : posts one batch; used by the thread
+#     close       : stops the thread
+class HistorySync:
+
+  BATCH_CHANGES = 32
+  BACKOFF_MIN = 1.0
+  BACKOFF_MAX = 300.0
+  TIMEOUT = 10.0
+
+  ########
+  # Starts pushing; the thread loads the outbox before anything else. An
+  # outbox kept for another URL is dropped, and so starts over from seq 0.
+  #   Params:
+  #     url        : Collector URL, http:// or https://.
+  #     outboxFile : File keeping the outbox between runs.
+  #     user       : Name sent with each batch; default_user() if None.
+  #     start      : False to not start the thread, e.g. to call push_once directly.
+  def __init__(self, url, outboxFile, user = None, start = True):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+      raise ValueError("not an http(s) URL: {}".format(url))
+    self.url = url
+    self.outboxFile = outboxFile
+    self.user = user or default_user()
+    self.cursor = 0
+    self.seq = 0
+    self.outbox = []
+    self.failures = 0
+    self.lastError = None
+    self._retryAfter = None
+    self._parts = parts
+    self._conn = None
+    self._lock = threading.Condition()
+    self._stopping = False
+    self._queue = [] # ("change", start, end, records) or ("seed", table), not yet in the outbox
+    self._loaded = False
+    self._thread = None
+    if start:
+      self._thread = threading.Thread(target = self._run, name = "history-sync", daemon = True)
+      self._thread.start()
+
+  # called on the sync thread, without the lock
+  def _load(self):
+    try:
+      with open(self.outboxFile, "r") as f:
+        state = json.load(f)
+      if state["url"] == self.url:
+        with self._lock:
+          self.cursor, self.seq, self.outbox = state["cursor"], state["seq"], state["outbox"]
+    except (OSError, ValueError, KeyError, TypeError):
+      pass
+    self._loaded = True
+
+  # called on the sync thread, without the lock; only the file write is outside it
+  def _save(self):
+    with self._lock:
+      state = {"url": self.url, "cursor": self.cursor, "seq": self.seq, "outbox": list(self.outbox)}
+    tmpPath = self.outboxFile + ".tmp"
+    try:
+      with open(tmpPath, "w") as f:
+        json.dump(state, f, separators = (",", ":"))
+      os.replace(tmpPath, self.outboxFile)
+    except OSError:
+      pass # kept in memory; the next save writes it out
+
+  ########
+  # Queues a change; the sync thread adds it to the outbox, replacing any
+  # waiting change whose span it covers.
+  #   Params:
+  #     start, end : Inclusive (year, mon, day) tuples or dates; None for open-ended.
+  #     records    : Dicts in HISTORY_FORMAT now in the span, or e.g. a
+  #                  HistoryTable's iter_dicts(); read on the sync thread,
+  #                  so they must not change afterwards.
+  def note_change(self, start, end, records):
+    self._enqueue(("change", _iso(start), _iso(end), records))
+
+  ########
+  # Queues every record of a table, one change per calendar year, to be
+  # added only if the outbox has never had a change, i.e. for a new
+  # collector.
+  #   Params:
+  #     table : HistoryTable; read on the sync thread, so pass a copy
+  #             (e.g. HistoryTable.between()) of one that will change.
+  def seed(self, table):
+    self._enqueue(("seed", table))
+
+  def _enqueue(self, item):
+    with self._lock:
+      self._queue.append(item)
+      self._lock.notify()
+
+  ########
+  # Moves queued changes into the outbox and writes it out, loading it
+  # first if this is the first time; runs on the sync thread.
+  def _drain(self):
+    if not self._loaded:
+      self._load()
+    with self._lock:
+      queue, self._queue = self._queue, []
+    if not queue:
+      return
+    changes = []
+    for item in queue:
+      if item[0] == "change":
+        changes.append((item[1], item[2], list(item[3])))
+      elif self.seq == 0 and not changes:
+        years = {}
+        for rec in item[1].iter_dicts():
+          years.setdefault(rec["year"], []).append(rec)
+        changes.extend(("{:04d}-01-01".format(year), "{:04d}-12-31".format(year), recs)
+                       for year, recs in sorted(years.items()))
+    with self._lock:
+      for start, end, records in changes:
+        self.seq += 1
+        self.outbox = [c for c in self.outbox if not _covers((start, end), (c[1], c[2]))]
+        self.outbox.append([self.seq, start, end, records])
+    self._save()
+
+  def pending(self):
+    with self._lock:
+      return len(self.outbox) + len(self._queue)
+
+  ########
+  # Posts the oldest waiting changes as one batch.
+  #   Returns: True if the collector acknowledged them or nothing was waiting.
+  def push_once(self):
+    self._drain()
+    with self._lock:
+      batch = self.outbox[:HistorySync.BATCH_CHANGES]
+      cursor = self.cursor
+    if not batch:
+      return True
+    body = gzip.compress(json.dumps({"user": self.user, "cursor": cursor, "seq": batch[-1][0],
+                                     "changes": [{"seq": seq, "start": start, "end": end,
+                                                  "records": records}
+                                                 for seq, start, end, records in batch]},
+                                    separators = (",", ":")).encode("utf-8"))
+    try:
+      status, retryAfter = self._post(body)
+    except (OSError, http.client.HTTPException) as e:
+      self._disconnect()
+      return self._failed("{}: {}".format(type(e).__name__, e))
+    if status // 100 != 2:
+      return self._failed("HTTP {}".format(status), retryAfter)
+
+    with self._lock:
+      self.cursor = batch[-1][0]
+      self.outbox = [c for c in self.outbox if c[0] > self.cursor]
+      self.failures = 0
+      self.lastError = None
+    self._save()
+    return True
+
+  def _failed(self, error, retryAfter = None):
+    self.failures += 1
+    self.lastError = error
+    self._retryAfter = retryAfter
+    return False
+
+  ########
+  # Sends one request on the kept-alive connection, opening it if needed.
+  #   Returns: (status, Retry-After seconds or None).
+  def _post(self, body):
+    parts = self._parts
+    if self._conn == None:
+      connClass = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+      self._conn = connClass(parts.hostname, parts.port, timeout = HistorySync.TIMEOUT)
+    path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+    self._conn.request("POST", path, body, {"Content-Type": "application/json",
+                                            "Content-Encoding": "gzip"})
+    response = self._conn.getresponse()
+    response.read() # the connection can only be reused once the response is read
+    if response.will_close:
+      self._disconnect()
+    try:
+      retryAfter = float(response.getheader("Retry-After"))
+    except (TypeError, ValueError):
+      retryAfter = None
+    return response.status, retryAfter
+
+  def _disconnect(self):
+    if self._conn != None:
+      self._conn.close()
+      self._conn = None
+
+  ########
+  # Gets the wait before the next retry: doubling from BACKOFF_MIN up to
+  # BACKOFF_MAX, jittered so many clients do not retry in step, and never
+  # less than a Retry-After the collector asked for.
+  def _backoff(self):
+    delay = min(HistorySync.BACKOFF_MAX, HistorySync.BACKOFF_MIN * 2 ** min(self.failures - 1, 20))
+    delay *= 0.5 + random.random() / 2
+    return max(delay, min(self._retryAfter or 0, HistorySync.BACKOFF_MAX))
+
+  def _run(self):
+    self._drain()
+    while True:
+      with self._lock:
+        self._lock.wait_for(lambda: self.outbox or self._queue or self._stopping)
+        if self._stopping:
+          break
+      if not self.push_once():
+        with self._lock:
+          self._lock.wait_for(lambda: self._stopping, self._backoff())
+    self._drain() # changes queued since the last push wait in the file for next time
+    self._disconnect()
+
+  ########
+  # Stops the thread, waiting at most timeout seconds for a push in
+  # progress; changes still waiting stay in the outbox file for next time.
+  def close(self, timeout = 1.0):
+    with self._lock:
+      self._stopping = True
+      self._lock.notify()
+    if self._thread != None:
+      self._thread.join(timeout)
+      self._thread = None
+    else:
+      self._drain()
+      self._disconnect()
+# HistorySync
+################
+
+
+########
+# Makes the request handler of the stand-in collector.
+#   Params:
+#     out      : Text file each received batch is written to as a JSON line.
+#     failRate : Fraction of requests answered 503, to exercise retries.
+def make_collector_handler(out, failRate = 0.0):
+  from http.server import BaseHTTPRequestHandler
+
+  class CollectorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, as HistorySync expects
+
+    def do_POST(self):
+      body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+      if random.random() < failRate:
+        self._reply(503)
+        return
+      try:
+        if self.headers.get("Content-Encoding") == "gzip":
+          body = gzip.decompress(body)
+        batch = json.loads(body)
+      except (OSError, ValueError):
+        self._reply(400)
+        return
+      out.write(json.dumps(batch, separators = (",", ":")) + "\n")
+      out.flush()
+      self._reply(204)
+
+    def _reply(self, status):
+      self.send_response(status)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+
+    def log_message(self, format, *args):
+      sys.stderr.write("{} {}\n".format(self.address_string(), format % args))
+
+  return CollectorHandler
+
+########
+# main: runs the stand-in collector
+def main(argv = None):
+  from http.server import ThreadingHTTPServer
+
+  parser = argparse.ArgumentParser(description = "Stand-in history collector for testing Money Timer sync")
+  parser.add_argument("--host", default = "127.0.0.1")
+  parser.add_argument("--port", type = int, default = 8765)
+  parser.add_argument("--output", default = "-", help = "JSON lines file of received batches, - for stdout")
+  parser.add_argument("--fail-rate", type = float, default = 0.0, help = "fraction of requests to answer 503")
+  args = parser.parse_args(argv)
+
+  out = sys.stdout if args.output == "-" else open(args.output, "a")
+  server = ThreadingHTTPServer((args.host, args.port), make_collector_handler(out, args.fail_rate))
+  sys.stderr.write("collecting on http://{}:{}/\n".format(args.host, server.server_port))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    if out is not sys.stdout:
+      out.close()
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,30 @@
+################################
+# conftest.py
+# ------------------------------
+# Shared setup for the tests: the modules live at the repository root,
+# which is put on sys.path so they import as the app imports them.
+################################
+
+# imports
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+  sys.path.insert(0, ROOT)
+
+import pytest
+
+
+########
+# Points all of MoneyTimer's files into a temporary directory.
+#   Returns: The directory, as a pathlib.Path.
+@pytest.fixture
+def app_files(tmp_path, monkeypatch):
+  from money_timer import MoneyTimer
+  for name, fileName in (("SETTINGS_FILE", "settings.json"), ("HISTORY_FILE", "history.json"),
+                         ("HISTORY_DB", "history.db"), ("HISTORY_BLOCKS", "history.mthb"),
+                         ("INTERVALS_FILE", "intervals.bin"), ("STATS_FILE", "stats.json"),
+                         ("COLUMNS_DIR", "columns"), ("SYNC_FILE", "sync.json")):
+    monkeypatch.setattr(MoneyTimer, name, str(tmp_path / fileName))
+  return tmp_path
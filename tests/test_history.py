@@ -0,0 +1,19 @@
+################################
+# test_history.py
+# ------------------------------
+# Tests of the history record helpers.
+################################
+
+# imports
+from datetime import date
+
+from history import month_end, week_start
+
+
+def test_week_start_is_monday():
+  assert week_start(date(2024, 3, 7)) == date(2024, 3, 4)
+  assert week_start(date(2024, 3, 4)) == date(2024, 3, 4)
+
+def test_month_end():
+  assert month_end(date(2024, 2, 10)) == date(2024, 2, 29)
+  assert month_end(date(2023, 12, 1)) == date(2023, 12, 31)
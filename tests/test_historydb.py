@@ -0,0 +1,41 @@
+################################
+# test_historydb.py
+# ------------------------------
+# Tests of the SQLite history backend.
+################################
+
+# imports
+import os
+
+from history import JsonHistoryStore
+from historydb import SqliteHistoryStore
+
+
+def make_rec(day, secSoFar = 3600.0):
+  return {"year": 2024, "mon": 1, "day": day, "wday": "Mon",
+          "secSoFar": secSoFar, "earnings": 10.0, "percent": 50.0}
+
+def test_save_day_without_table_returns_loaded_history(tmp_path):
+  store = SqliteHistoryStore(str(tmp_path / "h.db"))
+  store.save_day(make_rec(1))
+  table = store.save_day(make_rec(2))
+  assert table != None
+  assert [(rec.day, rec.secSoFar) for rec in table] == [(2, 3600.0), (1, 3600.0)]
+  store.close()
+
+def test_save_day_keeps_better_record(tmp_path):
+  store = SqliteHistoryStore(str(tmp_path / "h.db"))
+  store.save_day(make_rec(1, 7200.0))
+  table = store.save_day(make_rec(1, 60.0))
+  assert [rec.secSoFar for rec in table] == [7200.0]
+  store.close()
+
+def test_import_includes_journal(tmp_path):
+  jsonPath = str(tmp_path / "h.json")
+  json = JsonHistoryStore(jsonPath)
+  for day in range(1, 11):
+    json.save_day(make_rec(day))
+  assert not os.path.exists(jsonPath) # all still in the journal
+  store = SqliteHistoryStore(str(tmp_path / "h.db"), importFrom = jsonPath)
+  assert len(store.load()) == 10
+  store.close()
@@ -0,0 +1,42 @@
+################################
+# test_npycolumns.py
+# ------------------------------
+# Tests of the .npy column mirror of history.
+################################
+
+# imports
+import json
+import os
+from datetime import date
+
+import simulate
+from history import HistoryTable
+from npycolumns import NpyColumns, count_days
+
+
+def write_settings(path, **changes):
+  from money_timer import MoneyTimer
+  settings = dict(MoneyTimer.DEFAULT_SETTINGS, **changes)
+  with open(path, "w") as f:
+    json.dump(settings, f)
+
+def test_count_days_leaves_out_summaries():
+  table = HistoryTable.from_records([
+    {"year": 2024, "mon": 3, "day": 4, "wday": "Mon", "secSoFar": 1.0, "earnings": 1.0, "percent": 1.0},
+    {"year": 2024, "mon": 2, "day": 26, "wday": "Week", "secSoFar": 1.0, "earnings": 1.0, "percent": 1.0},
+    {"year": 2024, "mon": 1, "day": 1, "wday": "Month", "secSoFar": 1.0, "earnings": 1.0, "percent": 1.0}])
+  assert count_days(table) == 1
+
+def test_columns_match_sqlite_history(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  settingsPath = str(tmp_path / "s.json")
+  write_settings(settingsPath, historyBackend = "sqlite", columnsExport = True)
+  days = simulate.simulate_history(str(tmp_path / "h.json"), settingsPath, date(2024, 1, 1), 3)
+  assert NpyColumns(str(tmp_path / "h.columns")).rows == days
+
+def test_columns_off_by_default(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  settingsPath = str(tmp_path / "s.json")
+  write_settings(settingsPath)
+  simulate.simulate_history(str(tmp_path / "h.json"), settingsPath, date(2024, 1, 1), 2)
+  assert not os.path.exists(str(tmp_path / "h.columns"))
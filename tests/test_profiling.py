@@ -0,0 +1,43 @@
+################################
+# test_profiling.py
+# ------------------------------
+# Tests of the on-demand Profiler and the StartupTimer.
+################################
+
+# imports
+import os
+
+from profiling import Profiler, StartupTimer
+
+
+def test_toggle_writes_reports(tmp_path):
+  profiler = Profiler(str(tmp_path))
+  assert profiler.toggle() == []
+  assert profiler.active
+  sum(i * i for i in range(1000))
+  paths = profiler.toggle()
+  assert not profiler.active
+  assert len(paths) == 3
+  for path in paths:
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.getsize(path) > 0
+
+def test_stop_without_start_writes_nothing(tmp_path):
+  assert Profiler(str(tmp_path)).stop() == []
+  assert os.listdir(str(tmp_path)) == []
+
+def test_enabled_by_env(monkeypatch):
+  monkeypatch.delenv(Profiler.ENV_VAR, raising = False)
+  assert not Profiler.enabled_by_env()
+  monkeypatch.setenv(Profiler.ENV_VAR, "0")
+  assert not Profiler.enabled_by_env()
+  monkeypatch.setenv(Profiler.ENV_VAR, "1")
+  assert Profiler.enabled_by_env()
+
+def test_startup_timer_phases():
+  timer = StartupTimer()
+  timer.mark("first")
+  timer.mark("second")
+  assert [name for name, sec in timer.phases] == ["first", "second"]
+  assert timer.total() >= 0
+  assert "total" in timer.report()
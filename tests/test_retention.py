@@ -0,0 +1,79 @@
+################################
+# test_retention.py
+# ------------------------------
+# Tests of history compaction, on its own and as MoneyTimer runs it.
+################################
+
+# imports
+import json
+from datetime import date, timedelta
+from time import mktime
+
+import history
+from headless import FakeRoot
+from retention import Compactor, WEEK
+from timesource import VirtualClock, VirtualScheduler
+
+TODAY = date(2024, 6, 3)
+
+
+def make_history(days):
+  recs = []
+  for i in range(1, days + 1):
+    d = TODAY - timedelta(days = i)
+    recs.append({"year": d.year, "mon": d.month, "day": d.day, "wday": history.DAYS[d.weekday()],
+                 "secSoFar": 3600.0, "earnings": 10.0, "percent": 50.0})
+  return history.HistoryTable.from_records(recs)
+
+def start_timer(app_files, dailyDays):
+  from money_timer import MoneyTimer
+  history.write_history_file(MoneyTimer.HISTORY_FILE, make_history(300))
+  with open(MoneyTimer.SETTINGS_FILE, "w") as f:
+    json.dump(dict(MoneyTimer.DEFAULT_SETTINGS, retention = {"dailyDays": dailyDays, "weeklyDays": 0}), f)
+  start = mktime((TODAY.year, TODAY.month, TODAY.day, 9, 0, 0, 0, 0, -1))
+  clock = VirtualClock(start)
+  scheduler = VirtualScheduler(clock)
+  root = FakeRoot()
+  timer = MoneyTimer(root, clock, scheduler)
+  timer.setupWindow.inputVar.set("")
+  timer.setupWindow.destroy()
+  return root, timer, scheduler, start
+
+def count_summaries(table):
+  return sum(1 for rec in table if rec.wday == WEEK)
+
+def test_compactor_rolls_old_days_into_weeks():
+  table = make_history(60)
+  compactor = Compactor(table, TODAY, 14, 0)
+  while compactor.step():
+    pass
+  assert compactor.changed
+  assert count_summaries(table) > 0
+  assert len(table) < 60
+
+def test_off_by_default(app_files):
+  from money_timer import MoneyTimer
+  assert MoneyTimer.DEFAULT_SETTINGS["retention"] == {"dailyDays": 0, "weeklyDays": 0}
+
+def test_closing_mid_compaction_keeps_history_whole(app_files):
+  from money_timer import MoneyTimer
+  root, timer, scheduler, start = start_timer(app_files, 14)
+  scheduler.run_until(start + MoneyTimer.COMPACT_DELAY / 1000 + 0.05) # one step
+  assert timer.compactor != None and timer.compactTask != None
+  timer.destroy()
+  root.destroy()
+  assert count_summaries(timer.history) == 0
+  saved = history.JsonHistoryStore(MoneyTimer.HISTORY_FILE).load()
+  assert len(saved) == 301 and count_summaries(saved) == 0
+
+def test_finished_compaction_replaces_history(app_files):
+  from money_timer import MoneyTimer
+  root, timer, scheduler, start = start_timer(app_files, 14)
+  scheduler.run_until(start + 60)
+  assert timer.compactTask == None
+  timer.destroy()
+  root.destroy()
+  saved = history.JsonHistoryStore(MoneyTimer.HISTORY_FILE).load()
+  assert count_summaries(saved) > 0
+  assert saved.get((TODAY.year, TODAY.month, TODAY.day)) != None
+  assert len(list(app_files.glob("history.pre-compaction.*.json"))) == 1
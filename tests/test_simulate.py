@@ -0,0 +1,32 @@
+################################
+# test_simulate.py
+# ------------------------------
+# Tests of the virtual-clock day simulation.
+################################
+
+# imports
+import json
+import os
+from datetime import date
+
+import pytest
+
+import simulate
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "gzip", "lzma"])
+def test_simulation_leaves_working_directory_alone(tmp_path, monkeypatch, backend):
+  from money_timer import MoneyTimer
+  cwd = tmp_path / "cwd"
+  cwd.mkdir()
+  monkeypatch.chdir(cwd)
+  out = tmp_path / "out"
+  out.mkdir()
+  settingsPath = str(out / "s.json")
+  with open(settingsPath, "w") as f:
+    json.dump(dict(MoneyTimer.DEFAULT_SETTINGS, historyBackend = backend, columnsExport = True), f)
+
+  days = simulate.simulate_history(str(out / "h.json"), settingsPath, date(2024, 1, 1), 3)
+  assert days > 0
+  assert os.listdir(str(cwd)) == []
+  assert os.listdir(str(out)) != ["s.json"]
@@ -0,0 +1,149 @@
+################################
+# timesource.py
+# ------------------------------
+# Clocks and schedulers injected into MoneyTimer and ClockFace.
+# The system versions wrap time.localtime() and Tk's after(); the virtual
+# versions let simulations fast-forward through days deterministically.
+################################
+
+# imports
+import heapq
+import time
+
+
+################
+# SystemClock: wall clock backed by the time module.
+class SystemClock:
+
+  def localtime(self):
+    return time.localtime()
+
+  def time(self):
+    return time.time()
+
+  def monotonic(self):
+    return time.monotonic()
+# SystemClock
+################
+
+
+################
+# TkScheduler: schedules callbacks through a Tkinter widget's event loop.
+#   Members:
+#     widget : widget whose after() methods are used
+class TkScheduler:
+
+  def __init__(self, widget):
+    self.widget = widget
+
+  def after(self, ms, func, *args):
+    return self.widget.after(ms, func, *args)
+
+  def after_idle(self, func, *args):
+    return self.widget.after_idle(func, *args)
+
+  def after_cancel(self, afterId):
+    self.widget.after_cancel(afterId)
+# TkScheduler
+################
+
+
+################
+# VirtualClock: clock that only moves when told to.
+#   Members:
+#     now : current time as seconds since the epoch
+#   Methods:
+#     localtime : struct_time for now, in local time
+#     time      : now
+#     monotonic : seconds since the clock was created
+#     advance   : moves now forward
+class VirtualClock:
+
+  ########
+  # Initializes the clock.
+  #   Params:
+  #     start : Starting time in seconds since the epoch; defaults to the real time.
+  def __init__(self, start = None):
+    self.now = time.time() if start is None else start
+    self._start = self.now
+
+  def localtime(self):
+    return time.localtime(self.now)
+
+  def time(self):
+    return self.now
+
+  def monotonic(self):
+    return self.now - self._start
+
+  def advance(self, sec):
+    self.now += sec
+# VirtualClock
+################
+
+
+################
+# VirtualScheduler: after()-compatible scheduler driven by a VirtualClock.
+# Callbacks run in due order (ties in scheduling order) only when run_until
+# or run_for is called.
+#   Members:
+#     clock : VirtualClock advanced as callbacks run
+#   Methods:
+#     after        : schedules func after ms virtual milliseconds
+#     after_idle   : schedules func at the current virtual time
+#     after_cancel : cancels a scheduled callback
+#     pending      : number of scheduled, uncancelled callbacks
+#     pending_of   : number of those that call a given function
+#     run_until    : runs callbacks due up to a time and sets the clock to it
+#     run_for      : run_until relative to the current time
+class VirtualScheduler:
+
+  def __init__(self, clock):
+    self.clock = clock
+    self._heap = []
+    self._live = {}
+    self._seq = 0
+
+  def after(self, ms, func, *args):
+    self._seq += 1
+    afterId = "vafter#{}".format(self._seq)
+    self._live[afterId] = (func, args)
+    heapq.heappush(self._heap, (self.clock.now + ms / 1000, self._seq, afterId))
+    return afterId
+
+  def after_idle(self, func, *args):
+    return self.after(0, func, *args)
+
+  def after_cancel(self, afterId):
+    self._live.pop(afterId, None)
+
+  def pending(self):
+    return len(self._live)
+
+  def pending_of(self, func):
+    return sum(1 for f, args in self._live.values() if f == func)
+
+  ########
+  # Runs callbacks in order until none are due before the given time.
+  #   Params:
+  #     when : Time in seconds since the epoch.
+  #   Returns: Number of callbacks run.
+  def run_until(self, when):
+    count = 0
+    while self._heap and self._heap[0][0] <= when:
+      due, seq, afterId = heapq.heappop(self._heap)
+      entry = self._live.pop(afterId, None)
+      if entry is None: # cancelled
+        continue
+      if due > self.clock.now:
+        self.clock.now = due
+      entry[0](*entry[1])
+      count += 1
+    if when > self.clock.now:
+      self.clock.now = when
+    return count
+
+  def run_for(self, sec):
+    return self.run_until(self.clock.now + sec)
+# VirtualScheduler
+################
@@ -0,0 +1,317 @@
+################################
+# trendchart.py
+# ------------------------------
+# Daily earnings and hours plotted over time. However long the history,
+# only about one point per horizontal pixel is drawn: each series keeps a
+# pyramid of Largest-Triangle-Three-Buckets (LTTB) decimations, each level
+# half the size of the one below, and a view picks the coarsest level that
+# still has enough points in range before decimating that slice to the
+# chart width. Zoom and pan never go back to the raw history, and a newly
+# saved day only redoes the end of each level.
+################################
+
+# imports
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from tkinter import Canvas
+
+from history import DAYS, WEEK, month_end
+
+
+########
+# Picks the points that best keep the shape of a series (LTTB). The first
+# and last points are always kept; each bucket in between keeps the point
+# forming the largest triangle with the last kept point and the next
+# bucket's average.
+#   Params:
+#     xs, ys    : Series, xs ascending.
+#     lo, hi    : Index range to decimate.
+#     threshold : Number of points wanted.
+#   Returns: List of indices into xs/ys, ascending.
+def lttb(xs, ys, lo, hi, threshold):
+  n = hi - lo
+  if threshold >= n or threshold < 3:
+    return list(range(lo, hi))
+  every = (n - 2) / (threshold - 2)
+  picked = [lo]
+  a = lo
+  for i in range(threshold - 2):
+    start = lo + int(i * every) + 1
+    end = lo + int((i + 1) * every) + 1
+    nextStart, nextEnd = end, min(lo + int((i + 2) * every) + 1, hi)
+    count = nextEnd - nextStart
+    avgX = sum(xs[nextStart:nextEnd]) / count
+    avgY = sum(ys[nextStart:nextEnd]) / count
+    ax, ay = xs[a], ys[a]
+    best, bestArea = start, -1.0
+    for j in range(start, end):
+      area = abs((ax - avgX) * (ys[j] - ay) - (ax - xs[j]) * (avgY - ay))
+      if area > bestArea:
+        best, bestArea = j, area
+    picked.append(best)
+    a = best
+  picked.append(hi - 1)
+  return picked
+
+
+################
+# TrendPyramid: a series and its successively halved LTTB decimations.
+# Each level is cut into chunks of CHUNK points and every chunk is
+# decimated on its own into half as many points of the level above, so a
+# change near the end of the series only redoes the last chunk of each
+# level.
+#   Class members:
+#     CHUNK      : points per independently decimated chunk of a level
+#     MIN_POINTS : levels stop halving below this many points
+#     OVERSAMPLE : a level is fine enough for a view if it has this many
+#                  points per pixel in range
+#   Members:
+#     levels : list of (xs, ys) array pairs, full resolution first
+#   Methods:
+#     replace_tail : replaces the series from an index on
+#     view         : points of an x range decimated to a width
+class TrendPyramid:
+
+  CHUNK = 64
+  MIN_POINTS = 256
+  OVERSAMPLE = 2
+
+  ########
+  # Builds the pyramid.
+  #   Params:
+  #     xs, ys : Series, xs ascending.
+  def __init__(self, xs, ys):
+    self.levels = [(array("d", xs), array("d", ys))]
+    self._rebuild_from(0)
+
+  ########
+  # Replaces the points from an index on, e.g. with a newly saved day.
+  #   Params:
+  #     i      : First index of level 0 to replace.
+  #     xs, ys : New points from i on, xs ascending.
+  def replace_tail(self, i, xs, ys):
+    levelXs, levelYs = self.levels[0]
+    del levelXs[i:]
+    del levelYs[i:]
+    levelXs.extend(xs)
+    levelYs.extend(ys)
+    self._rebuild_from(i)
+
+  ########
+  # Redoes the decimations that depend on level 0 from index i on.
+  def _rebuild_from(self, i):
+    half = TrendPyramid.CHUNK // 2
+    k = 0
+    while len(self.levels[k][0]) > TrendPyramid.MIN_POINTS:
+      xs, ys = self.levels[k]
+      chunk = i // TrendPyramid.CHUNK
+      if k + 1 == len(self.levels):
+        self.levels.append((array("d"), array("d")))
+        chunk = 0
+      upXs, upYs = self.levels[k + 1]
+      del upXs[chunk * half:]
+      del upYs[chunk * half:]
+      for lo in range(chunk * TrendPyramid.CHUNK, len(xs), TrendPyramid.CHUNK):
+        for j in lttb(xs, ys, lo, min(lo + TrendPyramid.CHUNK, len(xs)), half):
+          upXs.append(xs[j])
+          upYs.append(ys[j])
+      i = chunk * half
+      k += 1
+    del self.levels[k + 1:]
+
+  ########
+  # Gets the points in an x range, decimated to about a number of points.
+  # The points just outside the range are included so lines run to the edges.
+  #   Params:
+  #     x0, x1 : Range of x.
+  #     width  : Points wanted, e.g. the chart width in pixels.
+  #   Returns: (xs, ys) lists.
+  def view(self, x0, x1, width):
+    for xs, ys in reversed(self.levels): # coarsest first
+      lo = max(0, bisect_left(xs, x0) - 1)
+      hi = min(len(xs), bisect_right(xs, x1) + 1)
+      if hi - lo >= width * TrendPyramid.OVERSAMPLE:
+        break
+    else:
+      xs, ys = self.levels[0]
+      lo = max(0, bisect_left(xs, x0) - 1)
+      hi = min(len(xs), bisect_right(xs, x1) + 1)
+    picked = lttb(xs, ys, lo, hi, width)
+    return [xs[i] for i in picked], [ys[i] for i in picked]
+
+  def __len__(self):
+    return len(self.levels[0][0])
+# TrendPyramid
+################
+
+
+################
+# TrendChart: earnings and hours per day over time; derivative of Canvas.
+# The mouse wheel zooms around the pointer, dragging pans and a double
+# click shows everything again. Each series is a single line item.
+#   Class members:
+#     PAD : pixels kept clear around the plot for labels
+#   Members:
+#     earnings, hours : TrendPyramid of each series, x being date ordinals
+#     x0, x1          : date ordinals in view
+#   Methods:
+#     set_history : rebuilds the series from a HistoryTable
+#     update_days : updates the series after days of a HistoryTable changed
+#     set_view    : shows a range of days
+#     redraw      : redraws the lines for the current view
+class TrendChart(Canvas):
+
+  PAD = 14
+
+  ########
+  # Creates an empty chart.
+  #   Params:
+  #     master        : Parent widget.
+  #     width, height : Size in pixels.
+  #     earningsColor : Line color of earnings.
+  #     hoursColor    : Line color of hours.
+  #     kwargs        : Passed to Canvas.
+  def __init__(self, master, width = 480, height = 120, earningsColor = "#00CC00",
+               hoursColor = "#0000EE", **kwargs):
+    Canvas.__init__(self, master, width = width, height = height, highlightthickness = 0,
+                    background = "#FFFFFF", **kwargs)
+    self.chartWidth, self.chartHeight = width, height
+    self.earnings = self.hours = None
+    self.x0 = self.x1 = 0
+    self._dragX = None
+    self._earningsLine = self.create_line(0, 0, 0, 0, fill = earningsColor)
+    self._hoursLine = self.create_line(0, 0, 0, 0, fill = hoursColor)
+    font = ("Arial", -9)
+    self._firstLabel = self.create_text(TrendChart.PAD, height - 2, anchor = "sw", font = font)
+    self._lastLabel = self.create_text(width - TrendChart.PAD, height - 2, anchor = "se", font = font)
+    self._earningsLabel = self.create_text(2, 2, anchor = "nw", font = font, fill = earningsColor)
+    self._hoursLabel = self.create_text(width - 2, 2, anchor = "ne", font = font, fill = hoursColor)
+    self.bind("<MouseWheel>", self._on_wheel)
+    self.bind("<Button-4>", self._on_wheel)
+    self.bind("<Button-5>", self._on_wheel)
+    self.bind("<ButtonPress-1>", self._on_press)
+    self.bind("<B1-Motion>", self._on_drag)
+    self.bind("<Double-Button-1>", self._on_reset)
+
+  ########
+  # Rebuilds both series from history, keeping the view if it still fits.
+  # Weekly and monthly summaries become one point of their per-day average.
+  #   Params:
+  #     table : HistoryTable, newest first.
+  def set_history(self, table):
+    xs, earnings, hours = _series(table, 0, len(table))
+    wasAll = self.earnings == None or (self.x0 <= self._first() and self.x1 >= self._last())
+    self.earnings = TrendPyramid(xs, earnings)
+    self.hours = TrendPyramid(xs, hours)
+    if wasAll or self.x1 < self._first() or self.x0 > self._last():
+      self.set_view(self._first(), self._last())
+    else:
+      self.redraw()
+
+  ########
+  # Updates the series after the days in a date range changed, redoing only
+  # the points from the first of them on.
+  #   Params:
+  #     table      : HistoryTable, newest first.
+  #     start, end : Inclusive (year, mon, day) tuples; None for everything.
+  def update_days(self, table, start, end):
+    if self.earnings == None or start == None:
+      self.set_history(table)
+      return
+    i = bisect_left(self.earnings.levels[0][0], date(*start).toordinal())
+    lo, hi = table.span(start, None)
+    xs, earnings, hours = _series(table, lo, hi)
+    self.earnings.replace_tail(i, xs, earnings)
+    self.hours.replace_tail(i, xs, hours)
+    self.redraw()
+
+  ########
+  # Shows the days from ordinal x0 to x1.
+  def set_view(self, x0, x1):
+    if self.earnings != None and x1 - x0 > self._last() - self._first(): # no further out than everything
+      x0, x1 = self._first(), self._last()
+    if x1 - x0 < 7: # no closer than a week
+      mid = (x0 + x1) / 2
+      x0, x1 = mid - 3.5, mid + 3.5
+    self.x0, self.x1 = x0, x1
+    self.redraw()
+
+  ########
+  # Redraws both lines and the labels for the current view.
+  def redraw(self):
+    pad = TrendChart.PAD
+    plotWidth = self.chartWidth - 2 * pad
+    if self.earnings == None or len(self.earnings) == 0 or plotWidth <= 0:
+      return
+    scale = plotWidth / (self.x1 - self.x0)
+    for pyramid, line, label, fmt in ((self.earnings, self._earningsLine, self._earningsLabel, "${:.0f}"),
+                                      (self.hours, self._hoursLine, self._hoursLabel, "{:.1f} hrs")):
+      xs, ys = pyramid.view(self.x0, self.x1, plotWidth)
+      top = max(ys) if len(ys) > 0 and max(ys) > 0 else 1.0
+      yScale = (self.chartHeight - 2 * pad) / top
+      coords = []
+      for x, y in zip(xs, ys):
+        coords.append(pad + (x - self.x0) * scale)
+        coords.append(self.chartHeight - pad - y * yScale)
+      if len(coords) < 4: # a line needs two points
+        coords = coords * 2 if len(coords) == 2 else [0, 0, 0, 0]
+      self.coords(line, *coords)
+      self.itemconfig(label, text = fmt.format(top))
+    self.itemconfig(self._firstLabel, text = date.fromordinal(max(1, int(self.x0))).isoformat())
+    self.itemconfig(self._lastLabel, text = date.fromordinal(max(1, int(self.x1))).isoformat())
+
+  def _first(self):
+    xs = self.earnings.levels[0][0]
+    return xs[0] if len(xs) > 0 else date.today().toordinal()
+
+  def _last(self):
+    xs = self.earnings.levels[0][0]
+    return xs[-1] if len(xs) > 0 else date.today().toordinal()
+
+  def _x_at(self, px):
+    return self.x0 + (px - TrendChart.PAD) / (self.chartWidth - 2 * TrendChart.PAD) * (self.x1 - self.x0)
+
+  def _on_wheel(self, event):
+    zoomIn = event.num == 4 or getattr(event, "delta", 0) > 0
+    factor = 0.8 if zoomIn else 1.25
+    x = self._x_at(event.x)
+    self.set_view(x - (x - self.x0) * factor, x + (self.x1 - x) * factor)
+
+  def _on_press(self, event):
+    self._dragX = event.x
+
+  def _on_drag(self, event):
+    if self._dragX == None:
+      return
+    shift = (self._x_at(self._dragX) - self._x_at(event.x))
+    self._dragX = event.x
+    self.set_view(self.x0 + shift, self.x1 + shift)
+
+  def _on_reset(self, event):
+    if self.earnings != None:
+      self.set_view(self._first(), self._last())
+# TrendChart
+################
+
+
+########
+# Gets the points of a table's rows [lo, hi), oldest first. Weekly and
+# monthly summaries become one point of their per-day average.
+#   Returns: (date ordinals, earnings, hours) arrays.
+def _series(table, lo, hi):
+  xs, earnings, hours = array("d"), array("d"), array("d")
+  for year, mon, day, wday, sec, earned, percent in table.iter_rows(lo, hi):
+    first = date(year, mon, day)
+    if wday in DAYS:
+      days = 1
+    elif wday == WEEK:
+      days = 7
+    else:
+      days = (month_end(first) - first).days + 1
+    xs.append(first.toordinal())
+    earnings.append(earned / days)
+    hours.append(sec / 3600 / days)
+  for col in (xs, earnings, hours):
+    col.reverse()
+  return xs, earnings, hours